@@ -0,0 +1,38 @@
+from typing import List, Optional
+import numpy as np
+from sklearn.cluster import Birch
+from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
+
+class BirchClustering(ClusteringAlgorithm):
+    '''
+        BIRCH: 增量构建 CF 树, 叶子子簇个数有上界, 适合流式数据
+
+        n_clusters 为 None 时每个叶子子簇就是一个符号;
+        否则在子簇中心上再做一次全局聚类得到 n_clusters 个簇
+    '''
+
+    def __init__(self, threshold: float = 0.5, n_clusters: Optional[int] = None,
+                 branching_factor: int = 50):
+        self.model = Birch(
+            threshold=threshold,
+            n_clusters=n_clusters,
+            branching_factor=branching_factor
+        )
+
+    def fit(self, X: List[List[float]]) -> None:
+        self.model.fit(X)
+
+    @property
+    def supports_partial_fit(self) -> bool:
+        return True
+
+    def partial_fit(self, X: List[List[float]]) -> None:
+        if len(X):
+            self.model.partial_fit(X)
+
+    def predict(self, X: List[List[float]]) -> List[int]:
+        return self.predict_batch(X).tolist()
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=self.model.subcluster_centers_.dtype)
+        return self.model.predict(X)
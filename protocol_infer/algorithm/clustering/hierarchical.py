@@ -1,8 +1,16 @@
 from typing import List
+import numpy as np
 from sklearn.cluster import AgglomerativeClustering
 from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
+from protocol_infer.algorithm.clustering.nearest import centroids_of, nearest_centroid
 
 class HierarchicalClustering(ClusteringAlgorithm):
+    '''
+        层次聚类
+
+        AgglomerativeClustering 本身不能对新样本预测, 训练后保存每个簇的中心,
+        predict 时把样本分配给最近的簇中心
+    '''
 
     def __init__(self, distance_threshold: float):
         self.model = AgglomerativeClustering(
@@ -12,6 +20,10 @@ class HierarchicalClustering(ClusteringAlgorithm):
 
     def fit(self, X: List[List[float]]) -> None:
         self.labels_ = self.model.fit_predict(X)
+        self.centroids_ = centroids_of(X, self.labels_, self.model.n_clusters_)
 
     def predict(self, X: List[List[float]]) -> List[int]:
-        return self.labels_.tolist()
+        return self.predict_batch(X).tolist()
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        return nearest_centroid(X, self.centroids_)
@@ -1,14 +1,20 @@
-from typing import List
+from typing import List, Optional
+import numpy as np
 from sklearn.cluster import KMeans
 from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
 
 class KMeansClustering(ClusteringAlgorithm):
 
-    def __init__(self, n_clusters: int):
-        self.model = KMeans(n_clusters=n_clusters)
+    def __init__(self, n_clusters: int, random_state: Optional[int] = None):
+        self.model = KMeans(n_clusters=n_clusters, random_state=random_state)
 
     def fit(self, X: List[List[float]]) -> None:
         self.model.fit(X)
 
     def predict(self, X: List[List[float]]) -> List[int]:
-        return self.model.predict(X).tolist()
+        return self.predict_batch(X).tolist()
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        # 与训练数据保持相同的 dtype (float32 特征矩阵训练后, sklearn 不接受 float64 输入)
+        X = np.asarray(X, dtype=self.model.cluster_centers_.dtype)
+        return self.model.predict(X)
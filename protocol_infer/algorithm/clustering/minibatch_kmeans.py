@@ -0,0 +1,60 @@
+from typing import List, Optional
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
+
+class MiniBatchKMeansClustering(ClusteringAlgorithm):
+    '''
+        小批量 KMeans, 每次只用 batch_size 个样本更新中心, 内存与数据量无关
+
+        partial_fit 可以按块流式训练; 第一次更新至少需要 n_clusters 个样本,
+        不足时先缓存, 攒够后再训练. 整个流都不足 n_clusters 个样本时,
+        第一次预测前用缓存的样本训练, 簇数降为样本数
+    '''
+
+    def __init__(self, n_clusters: int, batch_size: int = 4096,
+                 random_state: Optional[int] = None):
+        self.n_clusters = n_clusters
+        self.model = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=batch_size,
+            random_state=random_state,
+            n_init=3
+        )
+        self._warmup: List[np.ndarray] = []
+
+    def fit(self, X: List[List[float]]) -> None:
+        self.model.fit(X)
+
+    @property
+    def supports_partial_fit(self) -> bool:
+        return True
+
+    def partial_fit(self, X: List[List[float]]) -> None:
+        X = np.asarray(X, dtype=np.float32)
+        if not hasattr(self.model, "cluster_centers_"):
+            self._warmup.append(X)
+            if sum(len(x) for x in self._warmup) < self.n_clusters:
+                return
+            X = np.concatenate(self._warmup)
+            self._warmup = []
+        if len(X):
+            self.model.partial_fit(X)
+
+    def predict(self, X: List[List[float]]) -> List[int]:
+        return self.predict_batch(X).tolist()
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        if not hasattr(self.model, "cluster_centers_"):
+            self._flush()
+        X = np.asarray(X, dtype=self.model.cluster_centers_.dtype)
+        return self.model.predict(X)
+
+    def _flush(self) -> None:
+        # 流结束时缓存的样本仍不足 n_clusters 个
+        if not self._warmup:
+            raise RuntimeError("MiniBatchKMeansClustering has not seen any samples; call fit or partial_fit first")
+        X = np.concatenate(self._warmup)
+        self._warmup = []
+        self.model.set_params(n_clusters=len(X))
+        self.model.partial_fit(X)
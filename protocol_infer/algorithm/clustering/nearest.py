@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def centroids_of(X: np.ndarray, labels: np.ndarray, n_clusters: int) -> np.ndarray:
+    '''
+        每个簇的均值向量, 第 i 行对应标签 i
+    '''
+    X = np.asarray(X, dtype=np.float64)
+    sums = np.zeros((n_clusters, X.shape[1]), dtype=np.float64)
+    np.add.at(sums, labels, X)
+    counts = np.bincount(labels, minlength=n_clusters)
+    return sums / np.maximum(counts, 1)[:, None]
+
+
+def nearest_centroid(X: np.ndarray, centroids: np.ndarray, chunk_size: int = 1 << 16) -> np.ndarray:
+    '''
+        为每一行找到欧氏距离最近的中心, 分块计算以限制距离矩阵的大小
+
+        |x - c|^2 = |x|^2 - 2 x.c + |c|^2, 其中 |x|^2 对 argmin 无影响
+    '''
+    X = np.asarray(X, dtype=np.float64)
+    labels = np.empty(len(X), dtype=np.int64)
+    c_norm = np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(X), chunk_size):
+        block = X[start:start + chunk_size]
+        dist = c_norm[None, :] - 2.0 * (block @ centroids.T)
+        labels[start:start + len(block)] = dist.argmin(axis=1)
+    return labels
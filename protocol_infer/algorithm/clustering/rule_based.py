@@ -1,28 +1,115 @@
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+import numpy as np
 from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
+from protocol_infer.algorithm.clustering.nearest import nearest_centroid
+
+UNKNOWN_POLICIES = ("unknown", "nearest", "new")
 
 class RuleBasedClustering(ClusteringAlgorithm):
     """
     基于规则的聚类
-    
+
+    每个唯一的特征向量视为一个独立的簇, 簇编号按首次出现的顺序分配.
+    特征行被看作定长字节串(void 视图), 用 np.unique / np.searchsorted 批量查找,
+    不逐行构造 tuple.
+
+    未见过的向量按 unknown 策略处理:
+        unknown: 返回 unknown_label
+        nearest: 分配给欧氏距离最近的已知向量所在的簇
+        new:     分配新的簇编号并记录下来(增量更新)
+
     待改进:
     目前仅实现每个唯一的数据向量视为一个独立的簇
     """
 
-    def __init__(self):
-        self.cluster_map = {}
+    def __init__(self, unknown: str = "unknown", unknown_label: int = -1):
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError(f"unknown policy must be one of {UNKNOWN_POLICIES}")
+        self.unknown = unknown
+        self.unknown_label = unknown_label
+
+        self._keys = np.zeros(0, dtype=np.void)         # 已知向量的字节视图, 升序
+        self._ids = np.zeros(0, dtype=np.int64)         # _keys 对应的簇编号
+        self._rows = None                               # 按簇编号排列的已知向量
         self.next_id = 0
 
+    @property
+    def cluster_map(self) -> Dict[Tuple[float, ...], int]:
+        return {tuple(row): i for i, row in enumerate(self._rows.tolist())} if self._rows is not None else {}
+
+    @property
+    def predict_updates_model(self) -> bool:
+        return self.unknown == "new"
+
+    @property
+    def supports_partial_fit(self) -> bool:
+        return True
+
     def fit(self, X: List[List[float]]) -> None:
-        for vec in X:
-            key = tuple(vec)
-            if key not in self.cluster_map:
-                self.cluster_map[key] = self.next_id
-                self.next_id += 1
+        self.partial_fit(X)
+
+    def partial_fit(self, X: List[List[float]]) -> None:
+        rows = self._as_rows(X)
+        if len(rows) == 0:
+            return
+        keys = self._as_keys(rows)
+        uniq, first = np.unique(keys, return_index=True)
+
+        if len(self._keys):
+            pos = np.minimum(np.searchsorted(self._keys, uniq), len(self._keys) - 1)
+            new = self._keys[pos] != uniq
+            uniq, first = uniq[new], first[new]
+        if len(uniq) == 0:
+            return
+
+        # 新簇编号按首次出现的顺序分配
+        appear = np.argsort(first, kind="stable")
+        ids = np.empty(len(uniq), dtype=np.int64)
+        ids[appear] = np.arange(self.next_id, self.next_id + len(uniq))
+        self.next_id += len(uniq)
+
+        new_rows = rows[np.sort(first)]
+        self._rows = new_rows if self._rows is None else np.concatenate([self._rows, new_rows])
+
+        keys = np.concatenate([self._keys, uniq]) if len(self._keys) else uniq
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._ids = np.concatenate([self._ids, ids])[order]
 
     def predict(self, X: List[List[float]]) -> List[int]:
-        labels = []
-        for vec in X:
-            key = tuple(vec)
-            labels.append(self.cluster_map[key])
-        return labels
+        return self.predict_batch(X).tolist()
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        rows = self._as_rows(X)
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        keys = self._as_keys(rows)
+        uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        labels = np.full(len(uniq), self.unknown_label, dtype=np.int64)
+
+        if len(self._keys):
+            pos = np.minimum(np.searchsorted(self._keys, uniq), len(self._keys) - 1)
+            known = self._keys[pos] == uniq
+            labels[known] = self._ids[pos[known]]
+        else:
+            known = np.zeros(len(uniq), dtype=bool)
+
+        missing = np.flatnonzero(~known)
+        if len(missing) and self.unknown == "nearest" and self._rows is not None:
+            labels[missing] = nearest_centroid(rows[first[missing]], self._rows)
+        elif len(missing) and self.unknown == "new":
+            self.partial_fit(rows)
+            return self.predict_batch(rows)
+
+        return labels[inverse.ravel()]
+
+    @staticmethod
+    def _as_rows(X) -> np.ndarray:
+        # 统一为 float64 连续矩阵, +0.0 把 -0.0 规整为 0.0, 保证字节相等即数值相等
+        rows = np.ascontiguousarray(np.asarray(X, dtype=np.float64)) + 0.0
+        return rows.reshape(len(rows), -1)
+
+    @staticmethod
+    def _as_keys(rows: np.ndarray) -> np.ndarray:
+        return np.ascontiguousarray(rows).view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
@@ -1,5 +1,8 @@
+import numpy as np
 from protocol_infer.core.algorithm.state_merge import StateMerger
 from protocol_infer.core.model.fsm import FSM
+from protocol_infer.core.model.merge_engine import MergeEngine
+from protocol_infer.algorithm.states_merging.signatures import SuccessorRows, group_by_label
 
 class KTailStateMerger(StateMerger):
 
@@ -13,29 +16,49 @@ class KTailStateMerger(StateMerger):
             那么这两个状态可以合并
         '''
 
-        # 1.计算每个状态的sig
-        sig_map = {}        # sid->sig
-        
-        for sid in fsm.states:
-            sig_map[sid] = self.signiture_compute(sid, self.k, fsm)
+        # 1.计算每个状态的sig (整数编号)
+        sig = self.signatures(fsm)
 
-        # 2.按照sig分桶
-        group = {}      # sig->List[sid]
+        # 2.按照sig分桶, 桶内按状态编号排序, 第一个状态保留
+        states = np.fromiter(fsm.states, dtype=np.int64, count=len(fsm.states))
+        group = group_by_label(states, sig)
 
-        for sid, sig in sig_map.items():
-            group.setdefault(sig, []).append(sid)
+        # 3.合并每一组, 所有合并记录完之后一次性生成合并后的 FSM
+        engine = MergeEngine(fsm)
+        for group in group:
+            if len(group) > 1:
+                self.merge_group(group.tolist(), engine)
 
+        return engine.materialize()
 
-        # 3.合并每一组
-        for group in group.values():
-            if len(group) > 1:
-                self.merge_group(group, fsm)
+    def signatures(self, fsm: FSM) -> np.ndarray:
+        '''
+            自底向上逐层计算所有状态的 k-tail 签名, 返回 sig[sid] (整数编号)
+
+            第 0 层: END / NONEND
+            第 j 层: 出边 (符号, 后继的第 j-1 层编号) 组成的多重集合
+            每层按出度分组, 把多重集合排序成定长行后做 hash-consing 得到编号
+            (SuccessorRows), 行的总大小为 O(T), 不随最大出度增长;
+            因此每层只需 O(T log T), 与 k 呈线性关系, 也没有递归.
+            与 signiture_compute 给出的等价关系相同.
+        '''
+        n = fsm._next_state_id
+        src, dst, sym = fsm.transition_columns()
+
+        sig = np.zeros(n, dtype=np.int64)
+        sig[fsm.end_states()] = 1
+        if self.k == 0:
+            return sig
+
+        rows = SuccessorRows(n, src, dst, sym)
+        for _ in range(self.k):
+            sig = rows.refine(sig)
 
-        return fsm
+        return sig
 
     def signiture_compute(self, sid: int, k: int, fsm: FSM) ->tuple:
         '''
-            计算状态的 特征签名
+            计算状态的 特征签名 (递归版本, 仅用于调试和对照)
         '''
         state = fsm.states[sid]                    # 当前状态
 
@@ -43,7 +66,7 @@ class KTailStateMerger(StateMerger):
             return ("END" if state.is_end else "NONEND",)
 
         sig = []
-        for symbol, next_sid in sorted(state.next_states.items()):
+        for symbol, next_sid in fsm.successors(sid):
             sig.append(
                 (symbol, self.signiture_compute(next_sid, k - 1, fsm))
             )
@@ -51,12 +74,12 @@ class KTailStateMerger(StateMerger):
         return tuple(sig)
 
 
-    def merge_group(self, group, fsm):
+    def merge_group(self, group, engine: MergeEngine):
         merged_state = group[0]
 
         # 将剩下的状态合并
         for sid in group[1:]:
-            fsm.merge_two_state(merged_state, sid)
+            engine.union(merged_state, sid)
     
 
     
\ No newline at end of file
@@ -0,0 +1,224 @@
+import heapq
+import math
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from protocol_infer.core.algorithm.state_merge import StateMerger
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.core.model.merge_engine import MergeEngine
+
+
+class EDSMStateMerger(StateMerger):
+    '''
+        Blue-fringe 证据驱动状态合并 (EDSM)
+
+        输入必须是前缀树 (PTAInfer 的输出). 以 visit_count 作为证据:
+            - 状态 s 上结束的序列数 = visit_count[s] - 子状态 visit_count 之和
+            - 转移 s -a-> t 的经过次数 = visit_count[t]
+        red 集合初始为起始状态, blue 为 red 状态的非 red 后继(各自是一棵子树).
+        候选合并 (red, blue) 的做法: 把 blue 的父边改指向 red, 再把 blue 子树
+        递归折叠进 red, 折叠过程中的每一对状态都要通过 Hoeffding 相容性检验
+        (结束频率与各符号的转移频率, 显著性 alpha), 分数为各对状态
+        min(visit_count) 之和.
+
+        打分时直接修改工作副本并记录 undo 日志, 打分结束后按日志回滚, 不复制 FSM.
+        候选按分数放入最大堆; FSM 发生过真实合并后, 弹出的候选需要重新打分,
+        分数变化则放回堆中 (惰性更新). 某个 blue 状态没有相容且分数不低于
+        min_score 的候选时, 把它提升为 red.
+
+        最后通过 MergeEngine 一次性生成合并后的 FSM.
+    '''
+
+    def __init__(self, alpha: Optional[float] = 0.05, min_score: int = 1):
+        self.alpha = alpha
+        self.min_score = min_score
+
+    def merge(self, fsm: FSM) -> FSM:
+        self._load(fsm)
+        pairs = self._blue_fringe(fsm.start_state)
+
+        engine = MergeEngine(fsm, merge_end_states=True)
+        for x, c in pairs:
+            engine.union(x, c, force=True)
+        return engine.materialize(fold=True)
+
+    # ---------------- 工作副本 ----------------
+
+    def _load(self, fsm: FSM) -> None:
+        n = fsm._next_state_id
+        src, dst, sym = fsm.transition_columns()
+
+        indegree = np.bincount(dst, minlength=n)
+        if (indegree > 1).any() or (fsm.start_state is not None and indegree[fsm.start_state]):
+            raise ValueError("EDSMStateMerger expects a prefix tree (output of PTAInfer)")
+
+        visits = fsm.visit_counts()
+        child_visits = np.bincount(src, weights=visits[dst], minlength=n).astype(np.int64)
+
+        self.visits: List[int] = visits.tolist()
+        self.endc: List[int] = (visits - child_visits).tolist()
+        self.delta: List[Dict[int, int]] = [{} for _ in range(n)]
+        self.edge_cnt: List[Dict[int, int]] = [{} for _ in range(n)]
+        self.parent: List[Optional[Tuple[int, int]]] = [None] * n
+        for s, d, a, cnt in zip(src.tolist(), dst.tolist(), sym.tolist(), visits[dst].tolist()):
+            self.delta[s][a] = d
+            self.edge_cnt[s][a] = cnt
+            self.parent[d] = (s, a)
+
+        self._bound = math.sqrt(0.5 * math.log(2.0 / self.alpha)) if self.alpha else None
+
+    # ---------------- blue-fringe 主循环 ----------------
+
+    def _blue_fringe(self, start: int) -> List[Tuple[int, int]]:
+        red = {start}
+        red_order = [start]
+        blue = set()
+        heap: List[Tuple[int, int, int, int]] = []      # (-score, blue, red, epoch)
+        viable: Dict[int, int] = {}
+        pending: List[int] = []                         # 待提升为 red 的 blue 状态
+        merged: List[Tuple[int, int]] = []
+        epoch = 0
+
+        def add_candidate(r: int, b: int) -> None:
+            score = self._score(r, b)
+            if score is not None and score >= self.min_score:
+                heapq.heappush(heap, (-score, b, r, epoch))
+                viable[b] = viable.get(b, 0) + 1
+
+        def add_blue(b: int) -> None:
+            blue.add(b)
+            viable[b] = 0
+            for r in red_order:
+                add_candidate(r, b)
+            if not viable[b]:
+                pending.append(b)
+
+        def refresh_fringe() -> None:
+            for r in red_order:
+                for child in self.delta[r].values():
+                    if child not in red and child not in blue:
+                        add_blue(child)
+
+        refresh_fringe()
+        while blue:
+            if pending:
+                # 没有可合并的 red: 提升为 red, 访问次数多的优先
+                b = max(pending, key=lambda s: (self.visits[s], -s))
+                pending.remove(b)
+                if b not in blue or viable[b]:
+                    continue
+                blue.discard(b)
+                red.add(b)
+                red_order.append(b)
+                for other in list(blue):
+                    add_candidate(b, other)
+                refresh_fringe()
+                continue
+
+            if not heap:
+                pending.extend(blue)
+                continue
+
+            neg, b, r, stamp = heapq.heappop(heap)
+            if b not in blue:
+                continue
+            viable[b] -= 1
+            if stamp != epoch:
+                score = self._score(r, b)
+                if score is not None and score >= self.min_score:
+                    viable[b] += 1
+                    if score != -neg:
+                        heapq.heappush(heap, (-score, b, r, epoch))
+                        continue
+                else:
+                    if not viable[b]:
+                        pending.append(b)
+                    continue
+
+            # 真实合并: 不回滚
+            log: List[tuple] = []
+            self._merge(r, b, log, merged)
+            blue.discard(b)
+            epoch += 1
+            refresh_fringe()
+
+        return merged
+
+    # ---------------- 合并 / 打分 / 回滚 ----------------
+
+    def _score(self, r: int, b: int) -> Optional[int]:
+        log: List[tuple] = []
+        score = self._merge(r, b, log, None)
+        self._undo(log)
+        return score
+
+    def _merge(self, r: int, b: int, log: List[tuple], pairs: Optional[List[Tuple[int, int]]]) -> Optional[int]:
+        visits, endc, delta, edge_cnt, parent = self.visits, self.endc, self.delta, self.edge_cnt, self.parent
+
+        p, a = parent[b]
+        log.append(("delta", p, a, b))
+        delta[p][a] = r
+
+        score = 0
+        stack = [(r, b)]
+        while stack:
+            x, c = stack.pop()
+            if not self._compatible(x, c):
+                return None
+            score += min(visits[x], visits[c])
+            if pairs is not None:
+                pairs.append((x, c))
+
+            log.append(("node", x, visits[x], endc[x]))
+            visits[x] += visits[c]
+            endc[x] += endc[c]
+            for a, cc in delta[c].items():
+                xx = delta[x].get(a)
+                if xx is None:
+                    # x 没有该符号的出边: 把 c 的子树直接挂到 x 下
+                    log.append(("delta", x, a, None))
+                    log.append(("parent", cc, parent[cc]))
+                    delta[x][a] = cc
+                    edge_cnt[x][a] = edge_cnt[c][a]
+                    parent[cc] = (x, a)
+                else:
+                    log.append(("count", x, a, edge_cnt[x][a]))
+                    edge_cnt[x][a] += edge_cnt[c][a]
+                    stack.append((xx, cc))
+        return score
+
+    def _undo(self, log: List[tuple]) -> None:
+        for entry in reversed(log):
+            kind = entry[0]
+            if kind == "node":
+                _, x, v, e = entry
+                self.visits[x], self.endc[x] = v, e
+            elif kind == "count":
+                _, x, a, cnt = entry
+                self.edge_cnt[x][a] = cnt
+            elif kind == "parent":
+                _, cc, old = entry
+                self.parent[cc] = old
+            else:
+                _, s, a, old = entry
+                if old is None:
+                    del self.delta[s][a]
+                    self.edge_cnt[s].pop(a, None)
+                else:
+                    self.delta[s][a] = old
+
+    def _compatible(self, x: int, c: int) -> bool:
+        if self._bound is None:
+            return True
+        n1, n2 = self.visits[x], self.visits[c]
+        if self._different(self.endc[x], n1, self.endc[c], n2):
+            return False
+        for a in self.edge_cnt[x].keys() | self.edge_cnt[c].keys():
+            if self._different(self.edge_cnt[x].get(a, 0), n1, self.edge_cnt[c].get(a, 0), n2):
+                return False
+        return True
+
+    def _different(self, f1: int, n1: int, f2: int, n2: int) -> bool:
+        # Hoeffding 界: 两个频率之差超过界限时认为来自不同分布
+        if n1 == 0 or n2 == 0:
+            return False
+        return abs(f1 / n1 - f2 / n2) > self._bound * (1 / math.sqrt(n1) + 1 / math.sqrt(n2))
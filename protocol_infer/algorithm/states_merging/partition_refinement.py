@@ -0,0 +1,164 @@
+from typing import List, Optional
+import numpy as np
+from protocol_infer.core.algorithm.state_merge import StateMerger
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.core.model.merge_engine import MergeEngine
+from protocol_infer.algorithm.states_merging.signatures import SuccessorRows, group_by_label
+
+
+class _RefinablePartition:
+    '''
+        可细化划分 (Valmari & Lehtinen 2008)
+
+        元素 0..n-1 按所在集合连续存放在 elems 中, 集合 s 占据 [first[s], past[s]).
+        mark(e) 把 e 移到所在集合已标记区的末尾, split() 把每个被标记的集合
+        一分为二, 较小的一半成为新集合.
+    '''
+
+    def __init__(self, n: int):
+        self.n_sets = 1 if n else 0
+        self.elems = list(range(n))
+        self.loc = list(range(n))
+        self.set_of = [0] * n
+        self.first = [0] * (n + 1)
+        self.past = [0] * (n + 1)
+        self.past[0] = n
+        self.marked = [0] * (n + 1)
+        self.touched: List[int] = []
+
+    def mark(self, e: int) -> None:
+        s = self.set_of[e]
+        i = self.loc[e]
+        j = self.first[s] + self.marked[s]
+        elems, loc = self.elems, self.loc
+        elems[i] = elems[j]
+        loc[elems[i]] = i
+        elems[j] = e
+        loc[e] = j
+        if not self.marked[s]:
+            self.touched.append(s)
+        self.marked[s] += 1
+
+    def split(self) -> None:
+        first, past, marked = self.first, self.past, self.marked
+        while self.touched:
+            s = self.touched.pop()
+            j = first[s] + marked[s]
+            if j == past[s]:                # 整个集合都被标记, 不需要拆分
+                marked[s] = 0
+                continue
+            z = self.n_sets
+            if marked[s] <= past[s] - j:
+                first[z] = first[s]
+                past[z] = first[s] = j
+            else:
+                past[z] = past[s]
+                first[z] = past[s] = j
+            for i in range(first[z], past[z]):
+                self.set_of[self.elems[i]] = z
+            marked[s] = marked[z] = 0
+            self.n_sets += 1
+
+
+class PartitionRefinementMerger(StateMerger):
+    '''
+        基于划分细化的 FSM 最小化
+
+        k 为 None 时求最粗的同余划分 (初始划分: end / 非 end):
+            - 确定性 FSM (如 PTAInfer 的输出) 使用 Valmari-Lehtinen 的部分 DFA
+              最小化算法, 复杂度 O(|T| log |S|)
+            - 非确定性 FSM 退化为 Moore 迭代直到不动点 (互模拟商)
+        k 为整数时只做 k 轮 Moore 细化, 得到 k-等价划分,
+        即 "未来 k 步内的行为与 end 标记都相同" 的状态合并, 可以代替 K-tails 使用.
+
+        同一块内的状态合并为编号最小的状态. 块内不会同时包含 end 与非 end 状态,
+        end 状态之间允许合并.
+    '''
+
+    def __init__(self, k: Optional[int] = None):
+        self.k = k
+
+    def merge(self, fsm: FSM) -> FSM:
+        block = self.partition(fsm)
+
+        states = np.fromiter(fsm.states, dtype=np.int64, count=len(fsm.states))
+        engine = MergeEngine(fsm, merge_end_states=True)
+        for group in group_by_label(states, block):
+            if len(group) > 1:
+                survivor = int(group[0])
+                for sid in group[1:].tolist():
+                    engine.union(survivor, sid)
+
+        return engine.materialize()
+
+    def partition(self, fsm: FSM) -> np.ndarray:
+        '''
+            返回 block[sid], 同一块的状态等价
+        '''
+        n = fsm._next_state_id
+        src, dst, sym = fsm.transition_columns()
+        is_end = np.zeros(n, dtype=np.int64)
+        is_end[fsm.end_states()] = 1
+
+        deterministic = len(np.unique(src * (int(sym.max()) + 1) + sym)) == len(src) if len(src) else True
+        if self.k is None and deterministic:
+            return self._valmari(n, src, dst, sym, is_end)
+        return self._moore(n, src, dst, sym, is_end)
+
+    def _moore(self, n, src, dst, sym, is_end) -> np.ndarray:
+        rows = SuccessorRows(n, src, dst, sym)
+        block = is_end
+        n_blocks = len(np.unique(block))
+        rounds = 0
+        while self.k is None or rounds < self.k:
+            block = rows.refine(block, with_self=True)
+            rounds += 1
+            count = int(block.max()) + 1 if n else 0
+            if count == n_blocks:           # 细化是单调的, 块数不变即不动点
+                break
+            n_blocks = count
+        return block
+
+    @staticmethod
+    def _valmari(n, src, dst, sym, is_end) -> np.ndarray:
+        blocks = _RefinablePartition(n)
+        for sid in np.flatnonzero(is_end).tolist():
+            blocks.mark(sid)
+        blocks.split()
+
+        # 转移按符号划分为若干 cord
+        m = len(src)
+        cords = _RefinablePartition(m)
+        if m:
+            order = np.argsort(sym, kind="stable")
+            cords.elems = order.tolist()
+            cords.loc = np.argsort(order).tolist()
+            bounds = np.flatnonzero(np.diff(sym[order])) + 1
+            starts, ends = np.r_[0, bounds], np.r_[bounds, m]
+            cords.n_sets = len(starts)
+            cords.first[:len(starts)] = starts.tolist()
+            cords.past[:len(ends)] = ends.tolist()
+            set_of = np.empty(m, dtype=np.int64)
+            set_of[order] = np.repeat(np.arange(len(starts)), ends - starts)
+            cords.set_of = set_of.tolist()
+
+        # 每个状态的入边 (CSR)
+        in_order = np.argsort(dst, kind="stable").tolist()
+        in_offsets = np.r_[0, np.cumsum(np.bincount(dst, minlength=n))].tolist()
+        tails = src.tolist()
+
+        b, c = 1, 0
+        while c < cords.n_sets:
+            for i in range(cords.first[c], cords.past[c]):
+                blocks.mark(tails[cords.elems[i]])
+            blocks.split()
+            c += 1
+            while b < blocks.n_sets:
+                for i in range(blocks.first[b], blocks.past[b]):
+                    s = blocks.elems[i]
+                    for j in range(in_offsets[s], in_offsets[s + 1]):
+                        cords.mark(in_order[j])
+                cords.split()
+                b += 1
+
+        return np.asarray(blocks.set_of, dtype=np.int64)
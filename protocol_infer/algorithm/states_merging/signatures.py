@@ -0,0 +1,71 @@
+from typing import List
+import numpy as np
+
+
+def intern_rows(rows: np.ndarray) -> np.ndarray:
+    '''
+        相同的行得到相同的编号 (hash-consing)
+        比 np.unique(axis=0) 快: 按列 lexsort 后比较相邻行
+    '''
+    if rows.shape[1] == 0:
+        return np.zeros(len(rows), dtype=np.int64)
+    order = np.lexsort(rows.T[::-1])
+    ordered = rows[order]
+    new = np.r_[True, (ordered[1:] != ordered[:-1]).any(axis=1)]
+    ids = np.empty(len(rows), dtype=np.int64)
+    ids[order] = np.cumsum(new) - 1
+    return ids
+
+
+def group_by_label(states: np.ndarray, labels: np.ndarray) -> List[np.ndarray]:
+    '''
+        按 labels[sid] 分组, 组内按状态编号升序 (第一个状态作为合并后保留的状态)
+    '''
+    states = states[np.lexsort((states, labels[states]))]
+    return np.split(states, np.flatnonzero(np.diff(labels[states])) + 1)
+
+
+class SuccessorRows:
+    '''
+        出边按源状态排好序的列, 用于逐层计算签名
+
+        refine(labels) 返回新的编号: 出边 (符号, labels[后继]) 组成的多重集合相同的状态
+        编号相同; with_self=True 时还要求 labels[自身] 相同 (Moore 细化)
+
+        状态按出度分组, 每组的出边片段排序后恰好是 (组内状态数 x 出度) 的定长行,
+        各组分别 hash-consing; 所有组的行合计 T 个元素, 不按最大出度补齐,
+        每层 O(T log T), 循环次数为不同出度的个数.
+    '''
+
+    def __init__(self, n: int, src: np.ndarray, dst: np.ndarray, sym: np.ndarray):
+        order = np.argsort(src, kind="stable")
+        self.n = n
+        self.src, self.dst, self.sym = src[order], dst[order], sym[order]
+        self.n_sym = int(self.sym.max()) + 1 if len(self.sym) else 1
+
+        # 每个状态出边片段的起点, 以及按出度分组的状态
+        degree = np.bincount(self.src, minlength=n)
+        self.starts = np.cumsum(degree) - degree
+        self.by_degree = np.argsort(degree, kind="stable")
+        sorted_degree = degree[self.by_degree]
+        self.degrees = np.unique(sorted_degree)
+        self.bounds = np.r_[np.searchsorted(sorted_degree, self.degrees), n]
+
+    def refine(self, labels: np.ndarray, with_self: bool = False) -> np.ndarray:
+        # (符号, 后继编号) -> 边编号; 边在源状态片段内按编号排序
+        _, pair = np.unique(labels[self.dst] * self.n_sym + self.sym, return_inverse=True)
+        pair = pair.ravel()
+        pair = pair[np.lexsort((pair, self.src))]
+
+        ids = np.empty(self.n, dtype=np.int64)
+        offset = 0
+        for g, d in enumerate(self.degrees.tolist()):
+            states = self.by_degree[self.bounds[g]:self.bounds[g + 1]]
+            rows = np.empty((len(states), d + with_self), dtype=np.int64)
+            if with_self:
+                rows[:, 0] = labels[states]
+            rows[:, with_self:] = pair[self.starts[states][:, None] + np.arange(d)]
+            local = intern_rows(rows)
+            ids[states] = local + offset                # 出度不同的状态签名一定不同
+            offset += int(local.max()) + 1
+        return ids
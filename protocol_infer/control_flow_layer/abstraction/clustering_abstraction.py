@@ -1,8 +1,14 @@
 from protocol_infer.core.interface.message_abstraction import MessageAbstractor
 from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
 from typing import List
+import numpy as np
+
+UNKNOWN_SYMBOL = "UNKNOWN"
 
 class ClusterMessageAbstractor(MessageAbstractor):
+    '''
+        聚类标签 -> 符号 "C{label}", 负标签(未知向量)映射为 UNKNOWN_SYMBOL
+    '''
 
     def __init__(self, algorithm: ClusteringAlgorithm):
         self.algorithm = algorithm
@@ -12,9 +18,32 @@ class ClusterMessageAbstractor(MessageAbstractor):
         self.algorithm.fit(features)
         self._trained = True
 
+    def partial_fit(self, features: List[List[float]]) -> None:
+        # 流式训练, 需要聚类算法支持 partial_fit
+        if not self.algorithm.supports_partial_fit:
+            raise TypeError(f"{type(self.algorithm).__name__} does not support partial_fit")
+        self.algorithm.partial_fit(features)
+        self._trained = True
+
     def abstract(self, feature: List[float]) -> str:
         if not self._trained:
             raise RuntimeError("Abstractor not fitted")
 
         label = self.algorithm.predict([feature])[0]
-        return f"C{label}"
+        return self._symbol(label)
+
+    def abstract_batch(self, features) -> List[str]:
+        if not self._trained:
+            raise RuntimeError("Abstractor not fitted")
+        if len(features) == 0:
+            return []
+
+        # 一次 predict 得到全部标签, 每个不同标签只格式化一次
+        labels = self.algorithm.predict_batch(features)
+        uniq, inverse = np.unique(labels, return_inverse=True)
+        names = [self._symbol(label) for label in uniq.tolist()]
+        return [names[i] for i in inverse.tolist()]
+
+    @staticmethod
+    def _symbol(label: int) -> str:
+        return f"C{label}" if label >= 0 else UNKNOWN_SYMBOL
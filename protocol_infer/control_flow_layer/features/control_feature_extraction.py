@@ -1,26 +1,123 @@
-from typing import List
+from typing import Iterator, List, Optional, Tuple, Union
+import numpy as np
 from protocol_infer.core.interface.feature_extractor import FeatureExtractor
-from protocol_infer.core.datamodel.event import MessageEvent
+from protocol_infer.core.datamodel.event import MessageEvent, Direction
+from protocol_infer.core.datamodel.trace import Trace
+from protocol_infer.core.datamodel.columnar_trace import MAX_CHUNK_BYTES, ColumnarTrace, row_chunks
 
 class ControlFeatureExtraction(FeatureExtractor):
+    '''
+        控制流特征
+
+        基础特征(始终输出): 负载长度, 客户端端口, 服务端端口, 方向
+        可选特征:
+            inter_arrival:       与同一会话上一条消息的时间间隔(秒), 会话首条消息为 0
+            byte_histogram_bins: 负载字节直方图(按负载长度归一化), bins 需整除 256
+            leading_bytes:       负载前 k 个字节的取值, 不足补 -1
+            ngram_buckets:       负载前 ngram_window 个字节中相邻字节对(2-gram)的哈希计数
+    '''
+
+    def __init__(self, inter_arrival: bool = False,
+                 byte_histogram_bins: int = 0,
+                 leading_bytes: int = 0,
+                 ngram_buckets: int = 0,
+                 ngram_window: int = 16,
+                 max_chunk_bytes: int = MAX_CHUNK_BYTES):
+        if byte_histogram_bins and 256 % byte_histogram_bins:
+            raise ValueError("byte_histogram_bins must divide 256")
+        self.inter_arrival = inter_arrival
+        self.byte_histogram_bins = byte_histogram_bins
+        self.leading_bytes = leading_bytes
+        self.ngram_buckets = ngram_buckets
+        self.ngram_window = ngram_window
+        self.max_chunk_bytes = max_chunk_bytes      # 按字节处理时每批的负载上限, 控制临时数组大小
+
+    @property
+    def n_features(self) -> int:
+        return (4 + int(self.inter_arrival) + self.byte_histogram_bins
+                + self.leading_bytes + self.ngram_buckets)
+
     def extract(self, trace: List[MessageEvent]) -> List[List[float]]:
-        features = []
-
-        for event in trace:
-            # 暂时考虑: 负载量, 端口号, 方向
-
-
-            # 处理 payload
-            if event.payload and len(event.payload) > 0:
-                payload_value = float(len(event.payload))  # 使用长度而不是内容
-            else:
-                payload_value = 0.0  # 空负载设为0
-           
-            vec = [
-                float(payload_value),
-                float(event.session_key.port1),
-                float(event.session_key.port2),
-                float(event.direction.to_feature()),
-            ]
-            features.append(vec)
-        return features
\ No newline at end of file
+        return self.extract_batch(ColumnarTrace.from_events(trace)).tolist()
+
+    def extract_batch(self, trace: Union[Trace, ColumnarTrace],
+                      previous: Optional[np.ndarray] = None) -> np.ndarray:
+        '''
+            previous[sid]: 会话 sid 在本批之前最后一条消息的时间戳 (NaN 表示没有),
+                           流式处理时用于计算每个会话本批第一条消息的 inter_arrival
+        '''
+        trace = ColumnarTrace.from_trace(trace)
+        n = len(trace)
+        features = np.zeros((n, self.n_features), dtype=np.float32)
+        if n == 0:
+            return features
+
+        # 暂时考虑: 负载量, 端口号, 方向
+        keys = trace.session_keys
+        port1 = np.fromiter((k.port1 for k in keys), dtype=np.float32, count=len(keys))
+        port2 = np.fromiter((k.port2 for k in keys), dtype=np.float32, count=len(keys))
+
+        features[:, 0] = trace.lengths
+        features[:, 1] = port1[trace.session_ids]
+        features[:, 2] = port2[trace.session_ids]
+        features[:, 3] = trace.directions == Direction.S2C.value
+        col = 4
+
+        if self.inter_arrival:
+            order, starts, sids = trace.session_order()
+            ts = trace.timestamps[order]
+            gaps = np.diff(ts, prepend=ts[0])
+            gaps[starts] = 0.0
+            if previous is not None:
+                last = np.asarray(previous, dtype=np.float64)[sids]
+                known = ~np.isnan(last)
+                gaps[starts[known]] = ts[starts[known]] - last[known]
+            features[order, col] = gaps
+            col += 1
+
+        payload = np.frombuffer(trace.payload, dtype=np.uint8)
+
+        if self.byte_histogram_bins:
+            self._byte_histogram(trace, payload, features[:, col:col + self.byte_histogram_bins])
+            col += self.byte_histogram_bins
+
+        if self.leading_bytes or self.ngram_buckets:
+            width = max(self.leading_bytes, self.ngram_window if self.ngram_buckets else 0)
+            lead = trace.leading(width, max_chunk_bytes=self.max_chunk_bytes)
+            if self.leading_bytes:
+                features[:, col:col + self.leading_bytes] = lead[:, :self.leading_bytes]
+                col += self.leading_bytes
+            if self.ngram_buckets:
+                self._bigrams(lead, features[:, col:col + self.ngram_buckets])
+                col += self.ngram_buckets
+
+        return features
+
+    def _row_chunks(self, lengths: np.ndarray) -> Iterator[Tuple[int, int]]:
+        # 按负载字节数切分行区间
+        return row_chunks(lengths, self.max_chunk_bytes)
+
+    def _byte_histogram(self, trace: ColumnarTrace, payload: np.ndarray, out: np.ndarray) -> None:
+        bins = self.byte_histogram_bins
+        shift = int(np.log2(256 // bins))
+        for start, stop in self._row_chunks(trace.lengths):
+            lengths = trace.lengths[start:stop].astype(np.int64)
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            rows = np.repeat(np.arange(stop - start), lengths)
+            row_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            pos = np.repeat(trace.offsets[start:stop], lengths) + (np.arange(total) - row_start)
+            counts = np.bincount(rows * bins + (payload[pos] >> shift), minlength=(stop - start) * bins)
+            hist = counts.reshape(stop - start, bins).astype(np.float32)
+            out[start:stop] = hist / np.maximum(lengths, 1)[:, None]
+
+    def _bigrams(self, lead: np.ndarray, out: np.ndarray) -> None:
+        buckets = self.ngram_buckets
+        first = lead[:, :-1].astype(np.int64)
+        second = lead[:, 1:].astype(np.int64)
+        valid = second >= 0
+        rows = np.broadcast_to(np.arange(len(lead))[:, None], first.shape)[valid]
+        grams = ((first[valid] << 8) | second[valid]) * 2654435761 % (1 << 32) % buckets
+        counts = np.bincount(rows * buckets + grams, minlength=len(lead) * buckets)
+        out[:] = counts.reshape(len(lead), buckets)
@@ -0,0 +1,222 @@
+import pickle
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from protocol_infer.control_flow_layer.pipeline import ControlFlowPipeline
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.core.datamodel.trace import Trace
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.core.model.merge_engine import MergeEngine
+
+
+@dataclass
+class UpdateReport:
+    sessions: int                   # 本次输入的会话数
+    new_sequences: int              # 之前没有出现过的不同序列数
+    pta_states_added: int           # PTA 新增状态数 (= 新增转移数)
+    affected_states: int            # 重新计算签名的状态数
+    states: int                     # 合并后 FSM 的状态数
+    transitions: int                # 合并后 FSM 的转移数
+    states_added: int               # 与更新前相比合并后 FSM 的状态数变化
+    transitions_added: int          # 与更新前相比合并后 FSM 的转移数变化
+
+
+class IncrementalControlFlowModel:
+    '''
+        可增量更新的控制流模型
+
+        保存已训练的符号化器 (ControlFlowPipeline 的特征提取 + 聚类) 与 PTA 的前缀树计数,
+        新的抓包只做预测和插入, 不重新训练聚类模型, 也不重建 PTA.
+
+        合并使用 K-tails 语义 (与 KTailStateMerger(k) 的结果相同), 每个 PTA 节点
+        各层的签名编号持久保存, 签名表按内容 intern, 编号在多次更新之间保持稳定.
+        插入新序列后只有新节点、end 标记变化的节点以及签名发生变化的节点的
+        k 层以内祖先需要重新计算签名, 其余节点的签名保持不变.
+        子节点索引 (第一个子节点 / 下一个兄弟) 随插入追加, 不重建;
+        更新报告中的状态数与转移数由签名表直接统计, 不生成合并后的 FSM.
+    '''
+
+    def __init__(self, pipeline: Optional[ControlFlowPipeline] = None,
+                 k: Optional[int] = None, compact: bool = True):
+        self.pipeline = pipeline if pipeline is not None else ControlFlowPipeline()
+        self.k = k if k is not None else self.pipeline.merger.k
+        self.compact = compact
+
+        self.tree = PrefixTree()
+        self._sig: List[array] = [array("q", [0]) for _ in range(self.k + 1)]   # _sig[j][node]: 第 j 层签名
+        self._tables: List[Dict[tuple, int]] = [{} for _ in range(self.k + 1)]
+        self._first_child = array("q", [-1])        # 子节点索引: 第一个子节点, -1 表示没有
+        self._next_sibling = array("q", [-1])       # 同一父节点的下一个子节点
+        self._merged_size = (1, 0)                  # 合并后 FSM 的 (状态数, 转移数)
+        self._fsm: Optional[FSM] = None
+        self._sig_root()
+
+    # ---------------- 对外接口 ----------------
+
+    def fit(self, trace: Trace) -> UpdateReport:
+        '''
+            训练聚类模型并用 trace 中的会话建立初始模型
+        '''
+        sequences = self.pipeline.symbolize(trace, fit=True)
+        return self.add_sequences(sequences.values())
+
+    def update(self, trace: Trace) -> UpdateReport:
+        '''
+            用已有的聚类模型符号化新会话并插入模型
+        '''
+        sequences = self.pipeline.symbolize(trace, fit=False)
+        return self.add_sequences(sequences.values())
+
+    def add_sequences(self, sequences: Iterable[Sequence[Hashable]]) -> UpdateReport:
+        tree = self.tree
+        old_size, old_unique = len(tree), tree.n_sequences
+        old_states, old_transitions = self._merged_size
+
+        counts: Dict[tuple, int] = {}
+        for seq in sequences:
+            key = tuple(seq)
+            counts[key] = counts.get(key, 0) + 1
+
+        became_end = []
+        for seq, count in counts.items():
+            node = tree.insert(seq, count)
+            if node < old_size and tree.end_count[node] == count:
+                became_end.append(node)
+
+        affected = self._refresh(old_size, became_end)
+        self._fsm = None
+        self._merged_size = states, transitions = self._count()
+
+        return UpdateReport(
+            sessions=sum(counts.values()),
+            new_sequences=tree.n_sequences - old_unique,
+            pta_states_added=len(tree) - old_size,
+            affected_states=affected,
+            states=states,
+            transitions=transitions,
+            states_added=states - old_states,
+            transitions_added=transitions - old_transitions
+        )
+
+    @property
+    def fsm(self) -> FSM:
+        '''
+            合并后的 FSM, 在下一次更新前缓存
+        '''
+        if self._fsm is None:
+            fsm = self.tree.to_fsm(compact=self.compact)
+            engine = MergeEngine(fsm)
+            engine.assign(self._roots())
+            self._fsm = engine.materialize()
+        return self._fsm
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "IncrementalControlFlowModel":
+        with open(path, "rb") as f:
+            model = pickle.load(f)
+        if not isinstance(model, cls):
+            raise TypeError(f"{path} does not contain an {cls.__name__}")
+        return model
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_fsm"] = None                    # 合并结果可以由前缀树重建, 不保存
+        return state
+
+    # ---------------- 签名维护 ----------------
+
+    def _sig_root(self) -> None:
+        # 根节点的初始签名: 没有子节点, 不是 end
+        for j in range(1, self.k + 1):
+            self._sig[j][0] = self._intern(j, ())
+
+    def _intern(self, level: int, key: tuple) -> int:
+        table = self._tables[level]
+        sid = table.get(key)
+        if sid is None:
+            sid = table[key] = len(table)
+        return sid
+
+    def _refresh(self, old_size: int, became_end: List[int]) -> int:
+        '''
+            重新计算受影响节点的签名, 返回重新计算过的节点数
+
+            第 j 层需要重算的节点: 新节点, 以及第 j-1 层签名发生变化的节点的父节点
+        '''
+        tree = self.tree
+        n = len(tree)
+        parent, sym = tree.parent, tree.sym
+        new_nodes = range(old_size, n)
+
+        first_child, next_sibling = self._first_child, self._next_sibling
+        first_child.extend([-1] * (n - old_size))
+        next_sibling.extend([-1] * (n - old_size))
+        for node in new_nodes:
+            p = parent[node]
+            next_sibling[node] = first_child[p]
+            first_child[p] = node
+
+        sig0 = self._sig[0]
+        sig0.extend([0] * (n - old_size))
+        for node in new_nodes:
+            sig0[node] = 1 if tree.end_count[node] else 0
+        for node in became_end:
+            sig0[node] = 1
+        changed = set(new_nodes)
+        changed.update(became_end)
+        touched = set(changed)
+
+        for j in range(1, self.k + 1):
+            if not changed:
+                break
+            prev, cur = self._sig[j - 1], self._sig[j]
+            cur.extend([-1] * (n - old_size))
+            todo = {parent[node] for node in changed if node}
+            todo.update(new_nodes)
+            changed = set()
+            for node in todo:
+                children = []
+                c = first_child[node]
+                while c >= 0:
+                    children.append((sym[c], prev[c]))
+                    c = next_sibling[c]
+                sid = self._intern(j, tuple(sorted(children)))
+                if sid != cur[node]:
+                    cur[node] = sid
+                    changed.add(node)
+            touched |= todo
+
+        return len(touched)
+
+    def _roots(self) -> np.ndarray:
+        '''
+            与 KTailStateMerger 相同的合并规则: 同一签名的状态并入编号最小的状态,
+            end 状态不参与合并
+        '''
+        n = len(self.tree)
+        sig = np.frombuffer(self._sig[self.k], dtype=np.int64)
+        is_end = np.frombuffer(self.tree.end_count, dtype=np.int64) > 0
+        nodes = np.arange(n, dtype=np.int64)
+
+        first = np.full(int(sig.max()) + 1, n, dtype=np.int64)
+        np.minimum.at(first, sig, nodes)
+        head = first[sig]
+        return np.where(is_end | is_end[head], nodes, head)
+
+    def _count(self) -> Tuple[int, int]:
+        '''
+            合并后 FSM 的 (状态数, 转移数): 代表状态的个数, 以及不同的 (代表(父), 符号, 代表(子)) 个数,
+            与 MergeEngine.materialize 的结果一致
+        '''
+        tree = self.tree
+        root = self._roots()
+        n = len(root)
+        parent = np.frombuffer(tree.parent, dtype=np.int64)[1:]
+        sym = np.frombuffer(tree.sym, dtype=np.int32)[1:].astype(np.int64)
+        edges = (root[parent] * max(len(tree.symbols), 1) + sym) * n + root[1:]
+        return int((root == np.arange(n)).sum()), len(np.unique(edges))
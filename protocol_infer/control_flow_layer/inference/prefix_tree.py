@@ -0,0 +1,110 @@
+from array import array
+from typing import Dict, Hashable, Iterable, List, Sequence
+import numpy as np
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.core.model.compact_fsm import CompactFSM
+
+
+class PrefixTree:
+    '''
+        整数前缀树 (trie)
+
+        节点 0 为根, 其余节点按创建顺序编号, 节点 n 的入边为 (parent[n], sym[n]).
+        相同的序列只插入一次, 出现次数累加到其末尾节点的 end_count,
+        visit_counts() 由 end_count 自底向上求和得到 (每条序列对路径上每个节点计 1 次).
+
+        节点编号与逐条插入序列时 PTA 的状态编号一致, 第 i 条转移的目标为节点 i + 1.
+    '''
+
+    _SYMBOL_BITS = 32
+
+    def __init__(self):
+        self.symbols: List[Hashable] = []
+        self._symbol_ids: Dict[Hashable, int] = {}
+
+        self.parent = array("q", [-1])
+        self.sym = array("i", [-1])
+        self.end_count = array("q", [0])
+        self._children: Dict[int, int] = {}         # (节点 << 32 | 符号编号) -> 子节点
+        self.n_sequences = 0                        # 插入的不同序列个数
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @classmethod
+    def build(cls, sequences: Iterable[Sequence[Hashable]]) -> "PrefixTree":
+        # 先去重并统计出现次数 (dict 保持首次出现的顺序)
+        counts: Dict[tuple, int] = {}
+        for seq in sequences:
+            key = tuple(seq)
+            counts[key] = counts.get(key, 0) + 1
+
+        tree = cls()
+        for seq, count in counts.items():
+            tree.insert(seq, count)
+        return tree
+
+    def insert(self, seq: Sequence[Hashable], count: int = 1) -> int:
+        children, symbol_ids = self._children, self._symbol_ids
+        node = 0
+        for symbol in seq:
+            sid = symbol_ids.get(symbol)
+            if sid is None:
+                sid = symbol_ids[symbol] = len(self.symbols)
+                self.symbols.append(symbol)
+
+            key = (node << self._SYMBOL_BITS) | sid
+            child = children.get(key)
+            if child is None:
+                child = children[key] = len(self.parent)
+                self.parent.append(node)
+                self.sym.append(sid)
+                self.end_count.append(0)
+            node = child
+
+        if not self.end_count[node]:
+            self.n_sequences += 1
+        self.end_count[node] += count
+        return node
+
+    def visit_counts(self) -> np.ndarray:
+        # 子节点编号总是大于父节点: 倒序把计数加到父节点即可
+        visits = self.end_count.tolist()
+        parent = self.parent
+        for node in range(len(visits) - 1, 0, -1):
+            visits[parent[node]] += visits[node]
+        return np.asarray(visits, dtype=np.int64)
+
+    def to_fsm(self, compact: bool = False) -> FSM:
+        '''
+            一次性生成 PTA
+        '''
+        n = len(self)
+        visits = self.visit_counts()
+        is_end = np.frombuffer(self.end_count, dtype=np.int64) > 0
+        parent = np.frombuffer(self.parent, dtype=np.int64)[1:]
+        sym = np.frombuffer(self.sym, dtype=np.int32)[1:]
+
+        if compact:
+            return CompactFSM.from_arrays(
+                symbols=self.symbols,
+                is_end=is_end,
+                visits=visits,
+                src=parent,
+                dst=np.arange(1, n, dtype=np.int64),
+                sym=sym,
+                count=visits[1:],
+                start_state=0
+            )
+
+        fsm = FSM()
+        fsm.start_state = fsm.new_state(is_start=True)
+        for _ in range(1, n):
+            fsm.new_state()
+        for dst, (src, s) in enumerate(zip(parent.tolist(), sym.tolist()), start=1):
+            fsm.add_transition(src, dst, self.symbols[s])
+        for sid, (count, end) in enumerate(zip(visits.tolist(), is_end.tolist())):
+            state = fsm.states[sid]
+            state.visit_count = count
+            state.is_end = end
+        return fsm
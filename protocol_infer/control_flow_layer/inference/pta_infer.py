@@ -1,7 +1,11 @@
+import logging
 from typing import Dict, List
 from protocol_infer.core.interface.fsm_infer import FSMInfer
 from protocol_infer.core.datamodel.session import SessionKey
-from protocol_infer.core.model.fsm import FSM, Transition
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+
+logger = logging.getLogger(__name__)
 
 class PTAInfer(FSMInfer):
     """
@@ -13,65 +17,18 @@ class PTAInfer(FSMInfer):
         sequences: Dict[SessionKey, List[str]]
     Output:
         FSM instance representing the PTA
+        compact=True 时输出 CompactFSM (整数索引的列式存储), 适合大规模 PTA
     """
-    def infer(self, sequences: Dict[SessionKey, List[str]]) -> FSM:
-        fsm = FSM()
-
-        # 创建唯一初始state
-        start = fsm.new_state(is_start=True)
-        fsm.start_state = start
-
-        # For each session's symbol sequence, extend the PTA
-        for session_key, seq in sequences.items():
-            current = fsm.start_state
-
-            # track visited states for this sequence to update visit_count once per sequence
-            visited_states = set()
-            # 避免同一序列重复计数同一状态
-            if current not in visited_states:
-                fsm.states[current].visit()
-                visited_states.add(current)
-
-            for symbol in seq:
-                key = (current, symbol)
-                existing = fsm._by_state_input.get(key)
+    def __init__(self, compact: bool = False):
+        self.compact = compact
 
-                if existing:        # 转移已经存在
-                    # PTA的确定性
-                    tran = existing[0]
-                    dst = tran.dst
-                else:
-                    # create new state and transition
-                    dst = fsm.new_state()
-                    tran = Transition(
-                        id=len(fsm.transitions),        # transition列表的长度递增性直接作为id
-                        src=current,    
-                        dst=dst,
-                        symbol=symbol,
-                        guard=None,
-                        action=None
-                    )
-                    fsm.transitions.append(tran)
-                    fsm._by_state_input.setdefault(key, []).append(tran)
-
-                    # 更新前驱后继
-                    fsm.states[current].next_states[symbol] = dst
-                    fsm.states[dst].prev_states[symbol] = current
-                    fsm.states[current].add_transition(tran)
-
-                current = dst
-
-                if current not in visited_states:
-                    fsm.states[current].visit()
-                    visited_states.add(current)
-
-            # mark accepting (end) state for this sequence
-            fsm.states[current].is_end = True
-            print(f"[PTA] session={session_key} end_state={current}")
-
-            print("check end_states:")
-            for sid, s in fsm.states.items():
-                if s.is_end:
-                    print("end_state:", sid)
-            
-        return fsm
\ No newline at end of file
+    def infer(self, sequences: Dict[SessionKey, List[str]]) -> FSM:
+        # 相同序列去重后批量插入前缀树, 再一次性生成 FSM
+        tree = PrefixTree.build(sequences.values())
+        fsm = tree.to_fsm(compact=self.compact)
+
+        logger.info("[PTA] sessions=%d unique=%d states=%d",
+                    len(sequences), tree.n_sequences, len(tree))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[PTA] end_states=%s", fsm.end_states())
+        return fsm
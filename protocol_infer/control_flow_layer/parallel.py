@@ -0,0 +1,111 @@
+import os
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+import numpy as np
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.interface.feature_extractor import FeatureExtractor
+from protocol_infer.core.interface.message_abstraction import MessageAbstractor
+
+
+def resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    '''
+        None / 0 / 1 表示串行; 负数与 sklearn 相同, -1 表示全部核
+    '''
+    if not n_jobs:
+        return 1
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+    return max(1, n_jobs)
+
+
+def session_batches(starts: np.ndarray, n: int, chunk_size: int) -> List[Tuple[int, int]]:
+    '''
+        按会话边界把 [0, n) 切成若干段, 每段约 chunk_size 行, 会话不会被拆开
+    '''
+    if n == 0:
+        return []
+    bounds = np.r_[starts, n]
+    targets = np.arange(chunk_size, n, chunk_size)
+    cuts = np.unique(np.r_[0, bounds[np.searchsorted(bounds, targets)], n])
+    return list(zip(cuts[:-1].tolist(), cuts[1:].tolist()))
+
+
+class SharedArray:
+    '''
+        放在共享内存中的 ndarray, 工作进程按名字挂载, 读写都不经过 pickle
+
+        创建方负责 unlink; 挂载方只 close
+    '''
+
+    def __init__(self, shape: Tuple[int, ...], dtype, name: Optional[str] = None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self) -> Tuple[str, Tuple[int, ...], str]:
+        return self.shm.name, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec: Tuple[str, Tuple[int, ...], str]) -> "SharedArray":
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self) -> None:
+        self.array = None                       # 先释放对缓冲的引用, 否则 close 会失败
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# ---------------- 工作进程 ----------------
+# 工作进程入口需要是模块级函数才能被 pickle; 共享内存在进程初始化时挂载一次
+
+_worker = {}
+
+
+def init_worker(featureer: Optional[FeatureExtractor], payload_spec, features_spec,
+                abstractor: Optional[MessageAbstractor] = None) -> None:
+    # 只做符号化的进程池不需要特征提取器和负载; 抽象器每个进程只反序列化一次
+    _worker["featureer"] = featureer
+    _worker["abstractor"] = abstractor
+    _worker["payload"] = SharedArray.attach(payload_spec) if payload_spec is not None else None
+    _worker["features"] = SharedArray.attach(features_spec)
+
+
+def shared_features() -> np.ndarray:
+    return _worker["features"].array
+
+
+def extract_task(task) -> None:
+    '''
+        对一段会话批次提取特征, 直接写入共享特征矩阵的 [start, end) 行
+    '''
+    start, end, columns, session_keys = task
+    payload = memoryview(_worker["payload"].shm.buf)
+    trace = ColumnarTrace(*columns, payload, session_keys)
+    _worker["features"].array[start:end] = _worker["featureer"].extract_batch(trace)
+
+
+def symbolize_task(task) -> List[str]:
+    start, end = task
+    return _worker["abstractor"].abstract_batch(shared_features()[start:end])
+
+
+def batch_columns(trace: ColumnarTrace, rows: np.ndarray):
+    '''
+        取出一段行的列数据, 会话编号压缩为批次内编号, 只携带用到的 session_keys
+    '''
+    used, local = np.unique(trace.session_ids[rows], return_inverse=True)
+    columns = (trace.timestamps[rows], local.astype(np.int32), trace.directions[rows],
+               trace.offsets[rows], trace.lengths[rows])
+    return columns, [trace.session_keys[i] for i in used.tolist()]
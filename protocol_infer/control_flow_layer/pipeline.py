@@ -1,56 +1,400 @@
-from collections import defaultdict
+import copy
+import pickle
+from dataclasses import dataclass
+from functools import partial
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
 from protocol_infer.pcap_layer.pipeline import PCAPPipeline
+from protocol_infer.pcap_layer.cache import TraceCache
 from protocol_infer.control_flow_layer.features.control_feature_extraction import ControlFeatureExtraction
 from protocol_infer.control_flow_layer.abstraction.clustering_abstraction import ClusterMessageAbstractor
 from protocol_infer.algorithm.clustering.kmeans import KMeansClustering
+from protocol_infer.algorithm.clustering.minibatch_kmeans import MiniBatchKMeansClustering
+from protocol_infer.core.algorithm.clustering import ClusteringAlgorithm
 from protocol_infer.control_flow_layer.inference.pta_infer import PTAInfer
 from protocol_infer.core.datamodel.trace import Trace
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
 from protocol_infer.core.datamodel.session import SessionKey
 from protocol_infer.core.model.fsm import FSM
 from protocol_infer.algorithm.states_merging.K_tails import KTailStateMerger
+from protocol_infer.algorithm.clustering.nearest import centroids_of
+from protocol_infer.control_flow_layer.parallel import (
+    SharedArray, batch_columns, extract_task, init_worker, resolve_n_jobs, session_batches,
+    shared_features, symbolize_task
+)
+from protocol_infer.control_flow_layer.stage_cache import StageCache
+
+FIT_MODES = ("full", "sample", "stream")
+
+
+@dataclass
+class SweepPoint:
+    n_clusters: int
+    k: int
+    n_symbols: int          # 实际出现的符号数
+    sequences: int          # 不同的符号序列数
+    pta_states: int
+    states: int             # 合并后 FSM 的状态数
+    transitions: int
+    distortion: float       # 特征到所属符号质心的平均平方距离
+
 
 class ControlFlowPipeline:
-    def __init__(self, n_clusters: int = 8, k: int = 4):
+    '''
+        fit_mode 决定聚类模型的训练方式:
+            full:   用全部消息训练 (默认)
+            sample: 按会话分层抽取至多 sample_size 条消息训练, 再对全部消息预测
+            stream: 按会话批次 (约 chunk_size 条消息) 提取特征, 不保存整个特征矩阵:
+                    第一遍逐批 partial_fit, 第二遍用训练完的模型逐批预测;
+                    默认使用 MiniBatchKMeans, 自定义 algorithm 需支持 partial_fit (supports_partial_fit)
+
+        n_jobs > 1 时特征提取与符号化在进程池中并行执行: 会话按 chunk_size 切成
+        批次 (会话不拆开), 负载与特征矩阵放在共享内存中, 聚类模型仍在主进程训练.
+        结果与串行路径完全相同; predict 会修改模型的聚类算法 (predict_updates_model)
+        只并行特征提取. stream 模式逐批串行处理, 不使用进程池.
+
+        trace_cache 为 TraceCache 时, run_from_pcap 复用磁盘上缓存的解析结果.
+        stage_cache 为 StageCache 时, 特征 / 训练好的符号化器与符号序列 / PTA 按上游配置
+        缓存, 多个只改变 n_clusters 或 k 的 pipeline 共享同一个 StageCache 即可复用公共前缀;
+        sweep() 在参数网格上批量评估.
+    '''
+
+    def __init__(self, n_clusters: int = 8, k: int = 4,
+                 fit_mode: str = "full",
+                 sample_size: int = 100000,
+                 chunk_size: int = 65536,
+                 algorithm: Optional[ClusteringAlgorithm] = None,
+                 random_state: Optional[int] = None,
+                 n_jobs: Optional[int] = None,
+                 trace_cache: Optional[TraceCache] = None,
+                 stage_cache: Optional[StageCache] = None):
+        if fit_mode not in FIT_MODES:
+            raise ValueError(f"unknown fit_mode: {fit_mode}")
+        custom_algorithm = algorithm is not None
+        if algorithm is None:
+            algorithm = (MiniBatchKMeansClustering(n_clusters=n_clusters, random_state=random_state)
+                         if fit_mode == "stream" else KMeansClustering(n_clusters=n_clusters, random_state=random_state))
+        if fit_mode == "stream" and not algorithm.supports_partial_fit:
+            raise ValueError(f"fit_mode='stream' requires an algorithm with partial_fit, got {type(algorithm).__name__}")
+
+        self.fit_mode = fit_mode
+        self.sample_size = sample_size
+        self.chunk_size = chunk_size
+        self.n_clusters = n_clusters
+        self.random_state = random_state
+        self._custom_algorithm = custom_algorithm
+        self.n_jobs = resolve_n_jobs(n_jobs)
+        self.trace_cache = trace_cache
+        self.stage_cache = stage_cache
+        self.rng = np.random.default_rng(random_state)
+
         self.featureer = ControlFeatureExtraction()
-        self.abstractor = ClusterMessageAbstractor(KMeansClustering(n_clusters=n_clusters))
+        self.abstractor = ClusterMessageAbstractor(algorithm)
         self.inferer = PTAInfer()
         self.merger = KTailStateMerger(k)
 
     def run_from_pcap(self, pcap_path: str) -> FSM:
-        trace = PCAPPipeline().run(pcap_path)
+        # 有缓存时同一抓包只解析一次, 参数扫描直接读取缓存的 trace
+        pcap_pipeline = PCAPPipeline()
+        if self.trace_cache is not None:
+            trace = self.trace_cache.load_or_parse(pcap_path, pcap_pipeline)
+        else:
+            trace = pcap_pipeline.run(pcap_path)
         return self.run(trace)
 
     def run(self, trace: Trace) -> FSM:
-        # group events by session
-        sessions = defaultdict(list)
-        for ev in trace.events:
-            sessions[ev.session_key].append(ev)     # 将事件按照session_key分桶  session_key -> [事件]
-
-        # sort and extract features per event and collect all features
-        all_features = []
-        sess_features = {}
-        for sk, events in sessions.items():
-
-            features = self.featureer.extract(events)       # 提取特征
-            sess_features[sk] = (events, features)
-            all_features.extend(features)
-
-        # 训练聚类模型
-        if len(all_features) == 0:
-            raise RuntimeError("no events found")
-        self.abstractor.fit(all_features)
-
-        # build sequences
-        sequences = {}
-        for sk, (events, features) in sess_features.items():
-            symbols = [self.abstractor.abstract(f) for f in features]
+        sequences, key = self._symbolize(trace)
+        for symbols in sequences.values():
             print(symbols)
-            sequences[sk] = symbols
 
         # infer FSM
-        fsm = self.inferer.infer(sequences)
+        fsm = self._infer(sequences, key)
         print(fsm)
         # merge FSM
         fsm = self.merger.merge(fsm)
         
         return fsm
+
+    def symbolize(self, trace: Trace, fit: bool = True) -> Dict[SessionKey, List[str]]:
+        '''
+            提取特征并把每个会话转换为符号序列
+
+            fit=False 时沿用已训练的聚类模型, 只做预测 (增量更新时使用)
+        '''
+        return self._symbolize(trace, fit)[0]
+
+    def sweep(self, trace: Trace,
+              n_clusters: Optional[Sequence[int]] = None,
+              k: Optional[Sequence[int]] = None) -> List["SweepPoint"]:
+        '''
+            在 n_clusters x k 网格上训练模型, 返回每个网格点的模型规模与拟合指标
+
+            特征只提取一次; 同一 n_clusters 的聚类、符号化与 PTA 只做一次, 再对每个 k 合并.
+            n_jobs > 1 时不同的 n_clusters 在进程池中并行评估 (特征矩阵放在共享内存中),
+            结果与串行相同. n_clusters 只作用于默认的聚类算法.
+            配置了 stage_cache 时结果写入其中, 否则使用临时缓存, 不修改 self.stage_cache.
+        '''
+        n_clusters = list(n_clusters) if n_clusters is not None else [self.n_clusters]
+        ks = list(k) if k is not None else [self.merger.k]
+        if self._custom_algorithm and n_clusters != [self.n_clusters]:
+            raise ValueError("sweeping n_clusters requires the default clustering algorithm")
+
+        # 没有配置 stage_cache 时用只在本次 sweep 中存在的缓存, 同一 n_clusters 的 PTA 在各 k 之间复用
+        cache = self.stage_cache if self.stage_cache is not None else StageCache()
+        columnar, order, starts, sids = self._group(trace, fit=True)
+        features, features_key = self._features(trace, columnar, order, starts, cache)
+
+        variants = [self._variant(c) for c in n_clusters]
+        if self.n_jobs <= 1 or len(variants) <= 1:
+            results = []
+            for variant in variants:
+                variant.stage_cache = cache
+                results.append(_evaluate(variant, features, features_key, starts, ks))
+        else:
+            with SharedArray(features.shape, features.dtype) as shared:
+                shared.array[:] = features
+                processes = min(self.n_jobs, len(variants))
+                with Pool(processes=processes, initializer=init_worker, initargs=(None, None, shared.spec)) as pool:
+                    # 配置了 stage_cache 时取回工作进程的缓存条目 (键与串行路径相同)
+                    collect = self.stage_cache is not None
+                    tasks = [(variant, features_key, starts, ks, collect) for variant in variants]
+                    outputs = pool.map(_sweep_task, tasks, chunksize=1)
+            results = []
+            for points, items in outputs:
+                results.append(points)
+                cache.update(items)
+
+        return [point for points in results for point in points]
+
+    # ---------------- 各阶段 (带缓存) ----------------
+
+    def _group(self, trace: Trace, fit: bool):
+        columnar = ColumnarTrace.from_trace(trace)
+        order, starts, sids = columnar.session_order()       # 同一会话的事件相邻, 会话内按时间顺序
+        if fit and len(order) == 0:
+            raise RuntimeError("no events found")
+        return columnar, order, starts, sids
+
+    def _symbolize(self, trace: Trace, fit: bool = True) -> Tuple[Dict[SessionKey, List[str]], Optional[str]]:
+        # 返回符号序列和 symbols 阶段的缓存键 (不可缓存时为 None)
+        columnar, order, starts, sids = self._group(trace, fit)
+        if self.fit_mode == "stream":
+            # 特征不缓存, 每一遍按会话批次重新提取
+            features = None
+            features_key = (StageCache.derive(self.stage_cache.trace_key(trace, columnar), self.featureer)
+                            if self.stage_cache is not None else None)
+            batches = partial(self._feature_batches, columnar, order, starts)
+            all_symbols, key = self._symbols(features, features_key, starts, fit, batches)
+        else:
+            features, features_key = self._features(trace, columnar, order, starts)
+            all_symbols, key = self._symbols(features, features_key, starts, fit)
+
+        sequences = {}
+        bounds = np.r_[starts, len(order)]
+        for i, sid in enumerate(sids):
+            sequences[columnar.session_keys[sid]] = all_symbols[bounds[i]:bounds[i + 1]]
+        return sequences, key
+
+    def _features(self, trace: Trace, columnar: ColumnarTrace, order: np.ndarray, starts: np.ndarray,
+                  cache: Optional[StageCache] = None) -> Tuple[np.ndarray, Optional[str]]:
+        # cache 默认为 self.stage_cache
+        cache = cache if cache is not None else self.stage_cache
+        key = None
+        if cache is not None:
+            key = StageCache.derive(cache.trace_key(trace, columnar), self.featureer)
+            features = cache.get("features", key)
+            if features is not None:
+                return features, key
+
+        batches = session_batches(starts, len(order), self.chunk_size)
+        if self.n_jobs > 1 and len(batches) > 1 and hasattr(self.featureer, "n_features"):
+            features = self._extract_parallel(columnar, order, batches)
+        else:
+            # 整个 trace 一次性提取特征, 行顺序与会话分组一致
+            features = self.featureer.extract_batch(columnar)[order]
+
+        if key is not None:
+            cache.put("features", key, features)
+        return features, key
+
+    def _feature_batches(self, columnar: ColumnarTrace, order: np.ndarray,
+                         starts: np.ndarray) -> Iterator[np.ndarray]:
+        # 按会话批次提取特征, 行顺序与会话分组一致
+        for a, b in session_batches(starts, len(order), self.chunk_size):
+            yield self.featureer.extract_batch(columnar.take(order[a:b]))
+
+    def _symbols(self, features: Optional[np.ndarray], features_key: Optional[str], starts: np.ndarray,
+                 fit: bool, batches: Optional[Callable[[], Iterator[np.ndarray]]] = None
+                 ) -> Tuple[List[str], Optional[str]]:
+        # 只缓存训练 + 符号化的结果; fit=False 依赖当前模型, 不缓存
+        # features 为 None 时 (stream 模式) 每一遍调用 batches() 逐批取特征
+        key = None
+        if fit and features_key is not None:
+            key = StageCache.derive(features_key, self.fit_mode, self.sample_size, self.chunk_size,
+                                    self.random_state, self.abstractor)
+            cached = self.stage_cache.get("symbols", key)
+            if cached is not None:
+                abstractor, all_symbols = cached
+                self.abstractor = copy.deepcopy(abstractor)         # 缓存中的模型不被后续训练修改
+                return all_symbols, key
+
+        if features is None:
+            if fit:
+                for batch in batches():
+                    self.abstractor.partial_fit(batch)
+            all_symbols = []
+            for batch in batches():
+                all_symbols.extend(self.abstractor.abstract_batch(batch))
+        else:
+            if fit:
+                self._fit(features, starts)
+            all_symbols = self._abstract(features)
+
+        if key is not None:
+            self.stage_cache.put("symbols", key, (copy.deepcopy(self.abstractor), all_symbols))
+        return all_symbols, key
+
+    def _infer(self, sequences: Dict[SessionKey, List[str]], symbols_key: Optional[str]) -> FSM:
+        # 合并会修改 FSM, 缓存中保存序列化后的 PTA, 每次取出一个新副本
+        if symbols_key is None:
+            return self.inferer.infer(sequences)
+
+        key = StageCache.derive(symbols_key, self.inferer)
+        blob = self.stage_cache.get("pta", key)
+        if blob is None:
+            blob = pickle.dumps(self.inferer.infer(sequences), protocol=pickle.HIGHEST_PROTOCOL)
+            self.stage_cache.put("pta", key, blob)
+        return pickle.loads(blob)
+
+    def _variant(self, n_clusters: int) -> "ControlFlowPipeline":
+        # 只改变 n_clusters 的副本 (共享特征提取器与推断器配置)
+        variant = ControlFlowPipeline(
+            n_clusters=n_clusters, k=self.merger.k, fit_mode=self.fit_mode,
+            sample_size=self.sample_size, chunk_size=self.chunk_size,
+            algorithm=copy.deepcopy(self.abstractor.algorithm) if self._custom_algorithm else None,
+            random_state=self.random_state
+        )
+        variant.featureer = self.featureer
+        variant.inferer = self.inferer
+        return variant
+
+    # ---------------- 并行 ----------------
+
+    def _abstract(self, features: np.ndarray) -> List[str]:
+        # 所有会话的消息一次性符号化, stream 模式分块进行
+        n = len(features)
+        algorithm = getattr(self.abstractor, "algorithm", None)
+        if self.n_jobs > 1 and n > self.chunk_size and not getattr(algorithm, "predict_updates_model", False):
+            return self._abstract_parallel(features)
+
+        if self.fit_mode != "stream":
+            return self.abstractor.abstract_batch(features) if n else []
+        all_symbols = []
+        for i in range(0, n, self.chunk_size):
+            all_symbols.extend(self.abstractor.abstract_batch(features[i:i + self.chunk_size]))
+        return all_symbols
+
+    def _extract_parallel(self, trace: ColumnarTrace, order: np.ndarray,
+                          batches: List[Tuple[int, int]]) -> np.ndarray:
+        payload = np.frombuffer(trace.payload, dtype=np.uint8)
+        with SharedArray(payload.shape, np.uint8) as shared_payload, \
+                SharedArray((len(order), self.featureer.n_features), np.float32) as shared_features:
+            shared_payload.array[:] = payload
+            initargs = (self.featureer, shared_payload.spec, shared_features.spec)
+            with Pool(processes=min(self.n_jobs, len(batches)), initializer=init_worker, initargs=initargs) as pool:
+                # 各批次的特征直接写入共享矩阵, 行顺序与会话分组一致
+                tasks = ((a, b) + batch_columns(trace, order[a:b]) for a, b in batches)
+                for _ in pool.imap_unordered(extract_task, tasks):
+                    pass
+            return shared_features.array.copy()
+
+    def _abstract_parallel(self, features: np.ndarray) -> List[str]:
+        n = len(features)
+        chunks = range(0, n, self.chunk_size)
+        with SharedArray(features.shape, features.dtype) as shared:
+            shared.array[:] = features
+            processes = min(self.n_jobs, len(chunks))
+            initargs = (None, None, shared.spec, self.abstractor)
+            with Pool(processes=processes, initializer=init_worker, initargs=initargs) as pool:
+                tasks = ((a, min(a + self.chunk_size, n)) for a in chunks)
+                all_symbols = []
+                for symbols in pool.imap(symbolize_task, tasks):
+                    all_symbols.extend(symbols)
+                return all_symbols
+
+    def _fit(self, features: np.ndarray, starts: np.ndarray) -> None:
+        if self.fit_mode == "sample" and len(features) > self.sample_size:
+            rows = stratified_sample(starts, len(features), self.sample_size, self.rng)
+            self.abstractor.fit(features[rows])
+        elif self.fit_mode != "stream":
+            self.abstractor.fit(features)
+        else:
+            for i in range(0, len(features), self.chunk_size):
+                self.abstractor.partial_fit(features[i:i + self.chunk_size])
+
+
+def stratified_sample(starts: np.ndarray, n: int, sample_size: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    '''
+        按会话分层抽样, 总数不超过 sample_size
+
+        starts 为各会话在 [0, n) 中的起点(会话连续排列). 每个会话先抽取 1 条,
+        保证短会话中的罕见消息也参与训练, 其余名额按各会话剩余消息数占比分配
+        (最大余数法, 总数恰为 sample_size). 会话数多于 sample_size 时
+        先随机抽取 sample_size 个会话, 每个会话抽 1 条.
+        返回升序的行号
+    '''
+    sizes = np.diff(np.r_[starts, n])
+    if sample_size >= n:
+        return np.arange(n)
+    if len(starts) > sample_size:
+        chosen = rng.choice(len(starts), sample_size, replace=False)
+        return np.sort(starts[chosen] + (rng.random(sample_size) * sizes[chosen]).astype(np.int64))
+
+    budget, rest = sample_size - len(starts), sizes - 1
+    share = rest * budget
+    quota = 1 + share // (n - len(starts))
+    extra = sample_size - int(quota.sum())
+    quota[np.argsort(-(share % (n - len(starts))), kind="stable")[:extra]] += 1
+
+    group = np.repeat(np.arange(len(starts)), sizes)
+    perm = np.lexsort((rng.random(n), group))           # 会话内随机打乱
+    rank = np.arange(n) - starts[group]                 # perm 与 group 同序, 每组起点不变
+    return np.sort(perm[rank < quota[group]])
+
+
+def _evaluate(pipeline: ControlFlowPipeline, features: np.ndarray, features_key: Optional[str],
+              starts: np.ndarray, ks: List[int]) -> List[SweepPoint]:
+    '''
+        一个 n_clusters 取值: 训练并符号化一次, 建一次 PTA, 再对每个 k 合并
+    '''
+    all_symbols, key = pipeline._symbols(features, features_key, starts, fit=True)
+    bounds = np.r_[starts, len(all_symbols)].tolist()
+    sequences = {i: all_symbols[a:b] for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))}
+
+    names, labels = np.unique(np.asarray(all_symbols), return_inverse=True)
+    centroids = centroids_of(features, labels, len(names))
+    distortion = float(((features - centroids[labels]) ** 2).sum(axis=1).mean()) if len(features) else 0.0
+    n_unique = len({tuple(seq) for seq in sequences.values()})
+
+    points = []
+    for k in ks:
+        fsm = pipeline._infer(sequences, key)
+        pta_states = len(fsm.states)
+        fsm = KTailStateMerger(k).merge(fsm)
+        points.append(SweepPoint(
+            n_clusters=pipeline.n_clusters, k=k, n_symbols=len(names), sequences=n_unique,
+            pta_states=pta_states, states=len(fsm.states), transitions=len(fsm.transitions),
+            distortion=distortion
+        ))
+    return points
+
+
+def _sweep_task(task) -> Tuple[List[SweepPoint], list]:
+    # 工作进程入口: 特征矩阵从共享内存读取, 在本进程内缓存 PTA 以便多个 k 复用;
+    # collect 时把 symbols / pta 条目带回主进程
+    pipeline, features_key, starts, ks, collect = task
+    pipeline.stage_cache = StageCache(max_entries=None)
+    points = _evaluate(pipeline, shared_features(), features_key, starts, ks)
+    return points, pipeline.stage_cache.items() if collect else []
@@ -0,0 +1,98 @@
+import hashlib
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.pcap_layer.cache import config_fingerprint
+
+STAGES = ("features", "symbols", "pta")
+
+
+class StageCache:
+    '''
+        ControlFlowPipeline 各阶段中间结果的内存缓存
+
+        features: trace 内容 + 特征提取器配置                  -> 会话分组 + 特征矩阵
+        symbols:  features 的键 + 聚类/训练配置 (训练前)       -> 训练好的 abstractor + 符号序列
+        pta:      symbols 的键 + PTA 推断器配置                -> PTA (序列化的字节串, 每次取出都是新副本)
+
+        下游阶段的键包含上游阶段的键, 只改变 k 时前三个阶段全部命中,
+        只改变 n_clusters 时 features 命中. 每个阶段最多保留 max_entries 个条目 (LRU).
+    '''
+
+    def __init__(self, max_entries: Optional[int] = 16):
+        self.max_entries = max_entries
+        self._entries: Dict[str, "OrderedDict[str, Any]"] = {stage: OrderedDict() for stage in STAGES}
+        self._trace_keys = weakref.WeakKeyDictionary()
+        self.hits = dict.fromkeys(STAGES, 0)
+        self.misses = dict.fromkeys(STAGES, 0)
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        entries = self._entries[stage]
+        value = entries.get(key)
+        if value is None:
+            self.misses[stage] += 1
+            return None
+        entries.move_to_end(key)
+        self.hits[stage] += 1
+        return value
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        entries = self._entries[stage]
+        entries[key] = value
+        entries.move_to_end(key)
+        while self.max_entries is not None and len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def items(self) -> List[Tuple[str, str, Any]]:
+        '''
+            所有条目 (阶段, 键, 值), 每个阶段按最近使用从旧到新排列
+        '''
+        return [(stage, key, value) for stage, entries in self._entries.items() for key, value in entries.items()]
+
+    def update(self, items: Iterable[Tuple[str, str, Any]]) -> None:
+        '''
+            写入另一个缓存的 items(), 例如并行 sweep 中工作进程的结果
+        '''
+        for stage, key, value in items:
+            self.put(stage, key, value)
+
+    def clear(self) -> None:
+        for entries in self._entries.values():
+            entries.clear()
+
+    def trace_key(self, trace, columnar: ColumnarTrace) -> str:
+        '''
+            trace 内容的哈希; 同一个 trace 对象只计算一次
+        '''
+        try:
+            key = self._trace_keys.get(trace)
+        except TypeError:                   # 不可哈希 (例如 dataclass Trace) 时不做记忆
+            key = None
+        if key is not None:
+            return key
+
+        h = hashlib.sha256()
+        for column in (columnar.timestamps, columnar.session_ids, columnar.directions,
+                       columnar.offsets, columnar.lengths):
+            h.update(np.ascontiguousarray(column).tobytes())
+        h.update(columnar.payload)
+        h.update(repr(columnar.session_keys).encode())
+        key = h.hexdigest()
+
+        try:
+            self._trace_keys[trace] = key
+        except TypeError:
+            pass
+        return key
+
+    @staticmethod
+    def derive(parent: str, *configs: Any) -> str:
+        '''
+            下游阶段的键: 上游键 + 本阶段配置的指纹
+        '''
+        h = hashlib.sha256(parent.encode())
+        for config in configs:
+            h.update(config_fingerprint(config).encode())
+        return h.hexdigest()
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from typing import List, Any
+import numpy as np
 
 class ClusteringAlgorithm(ABC):
     """
@@ -35,3 +36,30 @@ class ClusteringAlgorithm(ABC):
         """
         self.fit(X)
         return self.predict(X)
+
+    @property
+    def supports_partial_fit(self) -> bool:
+        """
+        Whether the algorithm provides partial_fit(X) to update the model
+        incrementally with one chunk of samples (online / mini-batch algorithms).
+        Required by fit_mode="stream".
+        """
+        return False
+
+    @property
+    def predict_updates_model(self) -> bool:
+        """
+        Whether predict() changes the model (e.g. assigns ids to unseen samples).
+        Such models must predict in a single process and in input order.
+        """
+        return False
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Vectorized assignment of a whole feature matrix.
+
+        Returns:
+            int array of cluster ids, one per row of X
+        Default implementation wraps predict(); override to avoid list conversion.
+        """
+        return np.asarray(self.predict(X), dtype=np.int64)
@@ -0,0 +1,274 @@
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+from .event import MessageEvent, Direction
+from .session import SessionKey
+from .trace import Trace
+
+MAX_CHUNK_BYTES = 1 << 24
+
+
+def row_chunks(sizes: np.ndarray, max_bytes: int = MAX_CHUNK_BYTES) -> Iterator[Tuple[int, int]]:
+    '''
+        把行切成连续区间, 每个区间的 sizes 之和不超过 max_bytes (单行超过时自成一段)
+    '''
+    bounds = np.cumsum(sizes, dtype=np.int64)
+    start = 0
+    while start < len(sizes):
+        base = bounds[start - 1] if start else 0
+        stop = int(np.searchsorted(bounds, base + max_bytes, side="right"))
+        stop = max(stop, start + 1)
+        yield start, stop
+        start = stop
+
+
+class ColumnarTrace:
+    '''
+        列式存储的 trace
+
+        每个事件占用各列中的一行:
+            timestamps  float64     时间戳
+            session_ids int32       会话编号, 对应 session_keys[id]
+            directions  int8        Direction.value
+            offsets     int64       负载在 payload 缓冲中的起始位置
+            lengths     int32       负载长度
+        所有负载保存在一块连续的 payload 缓冲中, 通过 memoryview 零拷贝切片访问.
+
+        events / 迭代 返回 MessageEvent 视图, 与 Trace 兼容; 其中 payload 复制为 bytes,
+        需要零拷贝访问负载时使用 payload_of (返回 memoryview)
+    '''
+
+    def __init__(self, timestamps, session_ids, directions, offsets, lengths,
+                 payload: Union[bytes, memoryview], session_keys: List[SessionKey]):
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.session_ids = np.asarray(session_ids, dtype=np.int32)
+        self.directions = np.asarray(directions, dtype=np.int8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+        self.payload = payload if isinstance(payload, memoryview) else memoryview(payload)
+        self.session_keys = session_keys
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["payload"] = bytes(self.payload)      # memoryview 不能被 pickle
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.payload = memoryview(state["payload"])
+
+    def __iter__(self) -> Iterator[MessageEvent]:
+        for i in range(len(self)):
+            yield self.event(i)
+
+    @property
+    def events(self) -> "_EventSequence":
+        return _EventSequence(self)
+
+    def payload_of(self, i: int) -> memoryview:
+        off = int(self.offsets[i])
+        return self.payload[off:off + int(self.lengths[i])]
+
+    def event(self, i: int) -> MessageEvent:
+        return MessageEvent(
+            session_key=self.session_keys[self.session_ids[i]],
+            timestamp=float(self.timestamps[i]),
+            payload=bytes(self.payload_of(i)),
+            direction=Direction(int(self.directions[i]))
+        )
+
+    # ---------------- 向量化操作 ----------------
+
+    def take(self, indices: np.ndarray) -> "ColumnarTrace":
+        '''
+            按行号重排 / 选取事件, 负载缓冲共享不复制
+        '''
+        return ColumnarTrace(
+            self.timestamps[indices], self.session_ids[indices], self.directions[indices],
+            self.offsets[indices], self.lengths[indices], self.payload, self.session_keys
+        )
+
+    def sort_by_time(self) -> "ColumnarTrace":
+        return self.take(np.argsort(self.timestamps, kind="stable"))
+
+    def leading(self, width: int, rows: Optional[np.ndarray] = None,
+                max_chunk_bytes: int = MAX_CHUNK_BYTES) -> np.ndarray:
+        '''
+            rows 行 (默认全部) 负载的前 width 个字节, int16, 不足的位置为 -1
+
+            按 row_chunks 分块做花式索引, 每块的 (行 x width) 临时数组不超过 max_chunk_bytes 个元素
+        '''
+        offsets = self.offsets if rows is None else self.offsets[rows]
+        lengths = self.lengths if rows is None else self.lengths[rows]
+        lead = np.full((len(offsets), width), -1, dtype=np.int16)
+        payload = np.frombuffer(self.payload, dtype=np.uint8)
+        if not len(payload) or not width:
+            return lead
+
+        cols = np.arange(width)
+        for start, stop in row_chunks(np.full(len(offsets), width), max_chunk_bytes):
+            mask = cols[None, :] < lengths[start:stop, None]
+            pos = offsets[start:stop, None] + cols[None, :]
+            lead[start:stop][mask] = payload[pos[mask]]
+        return lead
+
+    def session_order(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+            按会话分组
+
+            Returns:
+                order:  行号, 同一会话的事件相邻, 会话内保持 trace 顺序
+                starts: 每个会话在 order 中的起点
+                sids:   每个分组对应的会话编号
+            会话按其第一个事件在 trace 中出现的先后排列
+        '''
+        n = len(self)
+        if n == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty.astype(np.int32)
+
+        first_seen = np.full(len(self.session_keys), n, dtype=np.int64)
+        np.minimum.at(first_seen, self.session_ids, np.arange(n))
+        rank = np.empty(len(first_seen), dtype=np.int64)
+        rank[np.argsort(first_seen, kind="stable")] = np.arange(len(first_seen))
+
+        group = rank[self.session_ids]
+        order = np.argsort(group, kind="stable")
+        sorted_group = group[order]
+        starts = np.flatnonzero(np.r_[True, sorted_group[1:] != sorted_group[:-1]])
+        return order, starts, self.session_ids[order[starts]]
+
+    def group_by_session(self) -> Dict[SessionKey, np.ndarray]:
+        order, starts, sids = self.session_order()
+        bounds = np.r_[starts, len(order)]
+        return {
+            self.session_keys[sid]: order[bounds[i]:bounds[i + 1]]
+            for i, sid in enumerate(sids)
+        }
+
+    # ---------------- 构造 / 转换 ----------------
+
+    @classmethod
+    def from_events(cls, events: Iterable[MessageEvent]) -> "ColumnarTrace":
+        builder = ColumnarTraceBuilder()
+        for ev in events:
+            builder.add(ev.session_key, ev.timestamp, ev.direction, ev.payload)
+        return builder.build()
+
+    @classmethod
+    def from_trace(cls, trace: Union[Trace, "ColumnarTrace"]) -> "ColumnarTrace":
+        if isinstance(trace, ColumnarTrace):
+            return trace
+        return cls.from_events(trace.events)
+
+    @classmethod
+    def concat(cls, traces: List["ColumnarTrace"]) -> "ColumnarTrace":
+        '''
+            拼接多个 trace, 相同的 SessionKey 合并为同一个会话编号
+        '''
+        if not traces:
+            return ColumnarTraceBuilder().build()
+
+        key_ids: Dict[SessionKey, int] = {}
+        session_ids, offsets = [], []
+        base = 0
+        for t in traces:
+            remap = np.array(
+                [key_ids.setdefault(k, len(key_ids)) for k in t.session_keys], dtype=np.int32
+            )
+            session_ids.append(remap[t.session_ids])
+            offsets.append(t.offsets + base)
+            base += len(t.payload)
+
+        return cls(
+            np.concatenate([t.timestamps for t in traces]),
+            np.concatenate(session_ids),
+            np.concatenate([t.directions for t in traces]),
+            np.concatenate(offsets),
+            np.concatenate([t.lengths for t in traces]),
+            b"".join(t.payload for t in traces),
+            list(key_ids)
+        )
+
+    def to_trace(self) -> Trace:
+        return Trace(events=list(self))
+
+
+class ColumnarTraceBuilder:
+    '''
+        逐个追加事件, 最后一次性生成 ColumnarTrace
+    '''
+
+    def __init__(self):
+        self._timestamps = array("d")
+        self._session_ids = array("i")
+        self._directions = array("b")
+        self._offsets = array("q")
+        self._lengths = array("i")
+        self._payload = bytearray()
+        self._key_ids: Dict[SessionKey, int] = {}
+
+    def session_id(self, key: SessionKey) -> int:
+        sid = self._key_ids.get(key)
+        if sid is None:
+            sid = self._key_ids[key] = len(self._key_ids)
+        return sid
+
+    def add(self, key: SessionKey, timestamp: float, direction: Direction, payload: bytes,
+            sid: Optional[int] = None) -> None:
+        self._timestamps.append(timestamp)
+        self._session_ids.append(self.session_id(key) if sid is None else sid)
+        self._directions.append(direction.value)
+        self._offsets.append(len(self._payload))
+        self._lengths.append(len(payload))
+        self._payload += payload
+
+    def add_events(self, key: SessionKey, events: Iterable[MessageEvent]) -> None:
+        # 同一会话的事件只需查找一次会话编号
+        sid = self.session_id(key)
+        for ev in events:
+            self.add(key, ev.timestamp, ev.direction, ev.payload, sid)
+
+    def build(self) -> ColumnarTrace:
+        return ColumnarTrace(
+            np.array(self._timestamps, dtype=np.float64),
+            np.array(self._session_ids, dtype=np.int32),
+            np.array(self._directions, dtype=np.int8),
+            np.array(self._offsets, dtype=np.int64),
+            np.array(self._lengths, dtype=np.int32),
+            bytes(self._payload),
+            list(self._key_ids)
+        )
+
+
+class _EventSequence(Sequence):
+    '''
+        ColumnarTrace 中事件的只读序列视图, 访问时才构造 MessageEvent
+    '''
+
+    def __init__(self, trace: ColumnarTrace):
+        self._trace = trace
+
+    def __len__(self) -> int:
+        return len(self._trace)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._trace.event(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._trace.event(i)
+
+    def __iter__(self) -> Iterator[MessageEvent]:
+        return iter(self._trace)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
@@ -1,5 +1,12 @@
 from dataclasses import dataclass
 
+# TCP 标志位
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
 @dataclass(frozen=True)         # 只读数据
 class Rawpacket:
     timestamp: float
@@ -8,4 +15,6 @@ class Rawpacket:
     src_port: int
     dst_port: int
     protocol: str      # TCP / UDP
-    payload: bytes
\ No newline at end of file
+    payload: bytes
+    tcp_flags: int = 0          # UDP 恒为 0
+    seq: int = 0                # TCP 序列号, UDP 恒为 0
@@ -4,6 +4,7 @@ from typing import List
 
 @dataclass(frozen=True)
 class SessionKey:
+    # 双向会话中 ip1/port1 为客户端, ip2/port2 为服务端
     ip1: str
     port1: int
     ip2: str
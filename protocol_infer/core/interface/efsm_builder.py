@@ -0,0 +1,20 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Sequence
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.model.efsm import EFSM
+from protocol_infer.core.model.fsm import FSM
+
+
+class EFSMBuilder(ABC):
+    '''
+        在已推断的 FSM 上, 根据经过每条转移的消息内容挖掘 guard 与 action
+    '''
+
+    @abstractmethod
+    def build(self, fsm: FSM, trace, sequences: Dict[SessionKey, Sequence[str]]) -> EFSM:
+        '''
+            trace:     推断 fsm 所用的抓包 (Trace / ColumnarTrace)
+            sequences: ControlFlowPipeline.symbolize(trace) 的输出
+            返回带 guard / action 的 EFSM, fsm 本身不被修改
+        '''
+        pass
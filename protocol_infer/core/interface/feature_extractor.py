@@ -1,8 +1,11 @@
 # protocol_infer/core/interface/feature_extractor.py
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Union
+import numpy as np
 from protocol_infer.core.datamodel.event import MessageEvent
+from protocol_infer.core.datamodel.trace import Trace
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
 
 class FeatureExtractor(ABC):
     """
@@ -13,3 +16,10 @@ class FeatureExtractor(ABC):
     def extract(self, trace: List[MessageEvent]) -> List[List[float]]:
         
         pass
+
+    def extract_batch(self, trace: Union[Trace, ColumnarTrace]) -> np.ndarray:
+        """
+        整个 trace 一次性提取, 返回 float32 矩阵, 第 i 行对应 trace 中第 i 个事件.
+        默认实现逐事件调用 extract, 子类可以提供向量化实现.
+        """
+        return np.asarray(self.extract(list(trace.events)), dtype=np.float32)
@@ -13,3 +13,9 @@ class MessageAbstractor(ABC):
     @abstractmethod
     def abstract(self, feature: List[float]) -> Any:
         pass
+
+    def abstract_batch(self, features) -> List[Any]:
+        """
+        一次性为所有特征向量分配符号, 默认逐个调用 abstract
+        """
+        return [self.abstract(f) for f in features]
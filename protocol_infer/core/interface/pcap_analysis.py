@@ -14,7 +14,7 @@ class PCAPParser(ABC):
 class SessionBuilder(ABC):
 
     @abstractmethod
-    def build(self, packets: Iterable[Rawpacket]) -> List[Session]:
+    def build(self, packets: Iterable[Rawpacket]) -> Iterable[Session]:
         pass
 
 
@@ -25,3 +25,16 @@ class Segmenter(ABC):
     def segment(self, session: Session) -> List[MessageEvent]:
         pass
 
+
+class Framer(ABC):
+    '''
+        应用层分帧: 从重组后的字节流中切出完整消息
+    '''
+
+    @abstractmethod
+    def frame(self, buffer: bytes) -> int:
+        '''
+            返回 buffer 开头第一条完整消息的长度;
+            数据不足返回 0, 无法识别(需要重新同步)返回 -1
+        '''
+        pass
@@ -0,0 +1,31 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, Sequence
+from protocol_infer.core.model.fsm import FSM
+
+
+class ProbTrainer(ABC):
+    '''
+        在已推断的 FSM 上重放符号序列, 估计转移概率与结束概率
+    '''
+
+    @abstractmethod
+    def partial_fit(self, fsm: FSM, sequences: Iterable[Sequence[str]]) -> None:
+        '''
+            累加一批序列的计数, 不保存序列本身; 可对多个抓包多次调用
+        '''
+        pass
+
+    @abstractmethod
+    def apply(self, fsm: FSM) -> FSM:
+        '''
+            由累计的计数计算概率并写入 fsm (Transition.prob / FSMState.end_prob)
+        '''
+        pass
+
+    def fit(self, fsm: FSM, sequences: Iterable[Sequence[str]]) -> FSM:
+        self.reset()
+        self.partial_fit(fsm, sequences)
+        return self.apply(fsm)
+
+    def reset(self) -> None:
+        pass
@@ -0,0 +1,411 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from protocol_infer.core.model.fsm import FSM, Transition
+
+
+class CompactFSM(FSM):
+    '''
+        整数索引的紧凑 FSM
+
+        与 FSM 的区别在于存储方式:
+            符号被驻留(intern)为小整数, symbols[i] 为第 i 个符号
+            状态属性按列保存: 是否结束 / 是否存在 / 访问次数
+            转移按列保存: src, dst, 符号编号, 经过次数, 概率(NaN 表示 None)
+            (src, 符号编号) -> 转移编号 的索引用打包后的整数作为键
+        freeze() 之后按 CSR 方式组织出边: 状态 s 的出边为
+            out_order[out_offsets[s]:out_offsets[s + 1]] (按符号编号排序),
+        入边同样建一份 CSR (按转移编号排序), 同时释放字典索引, 查询改为在 CSR 上二分.
+        successors / predecessors 等查询按需建立 CSR 但保留字典索引, 两者都保留到 FSM 被修改,
+        交替添加转移与查询时不会反复重建字典.
+
+        对外提供与 FSM 相同的查询接口 (new_state, lookup, states, transitions ...),
+        states / transitions 返回按需构造的视图, 修改视图上的 Transition 不会写回.
+    '''
+
+    _SYMBOL_BITS = 32
+
+    def __init__(self):
+        self.symbols: List[str] = []
+        self._symbol_ids: Dict[str, int] = {}
+
+        # 状态列
+        self._is_end = bytearray()
+        self._alive = bytearray()
+        self._visits = array("q")
+        self._end_prob = array("d")                     # NaN 表示 None
+        self.start_state: Optional[int] = None
+
+        # 转移列
+        self.src = array("q")
+        self.dst = array("q")
+        self.sym = array("i")
+        self.count = array("q")
+        self.prob = array("d")
+
+        self._timing = None                             # DelayTable, 行号为转移编号
+        self._index: Optional[Dict[int, int]] = {}      # (src << 32 | 符号编号) -> 转移编号
+        self._csr: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._in_csr: Optional[Tuple[np.ndarray, np.ndarray]] = None    # 与 _csr 一起由 _ensure_csr 重建
+
+    # ---------------- 符号 ----------------
+
+    def intern(self, symbol: str) -> int:
+        sid = self._symbol_ids.get(symbol)
+        if sid is None:
+            sid = self._symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return sid
+
+    # ---------------- 构建 / 查询接口 ----------------
+
+    @property
+    def _next_state_id(self) -> int:
+        return len(self._alive)
+
+    def new_state(self, is_start=False, is_end=False) -> int:
+        sid = len(self._alive)
+        self._is_end.append(int(is_end))
+        self._alive.append(1)
+        self._visits.append(0)
+        self._end_prob.append(float("nan"))
+        if is_start:
+            self.start_state = sid
+        self._csr = None
+        return sid
+
+    def lookup(self, src: int, symbol: str) -> Optional[int]:
+        tid = self._find(src, symbol)
+        return None if tid is None else self.dst[tid]
+
+    def traverse(self, src: int, symbol: str) -> Optional[int]:
+        tid = self._find(src, symbol)
+        if tid is None:
+            return None
+        self.count[tid] += 1
+        return self.dst[tid]
+
+    def add_transition(self, src: int, dst: int, symbol: str, count: int = 1) -> int:
+        tid = len(self.src)
+        sym = self.intern(symbol)
+        self.src.append(src)
+        self.dst.append(dst)
+        self.sym.append(sym)
+        self.count.append(count)
+        self.prob.append(float("nan"))
+
+        index = self._ensure_index()
+        index.setdefault(self._key(src, sym), tid)
+        self._csr = None
+        return tid
+
+    def visit(self, sid: int) -> None:
+        self._visits[sid] += 1
+
+    def mark_end(self, sid: int) -> None:
+        self._is_end[sid] = 1
+
+    def end_states(self) -> List[int]:
+        flags = np.frombuffer(self._is_end, dtype=np.uint8) & np.frombuffer(self._alive, dtype=np.uint8)
+        return np.flatnonzero(flags).tolist()
+
+    def visit_counts(self) -> np.ndarray:
+        return np.frombuffer(self._visits, dtype=np.int64).copy()
+
+    def successors(self, sid: int) -> List[Tuple[str, int]]:
+        offsets, order = self._ensure_csr()
+        tids = order[offsets[sid]:offsets[sid + 1]]
+        return sorted((self.symbols[self.sym[t]], self.dst[t]) for t in tids.tolist())
+
+    def predecessors(self, sid: int) -> List[Tuple[str, int]]:
+        self._ensure_csr()
+        offsets, order = self._in_csr
+        return [(self.symbols[self.sym[t]], self.src[t]) for t in order[offsets[sid]:offsets[sid + 1]].tolist()]
+
+    def out_transitions(self, sid: int) -> List[int]:
+        offsets, order = self._ensure_csr()
+        return order[offsets[sid]:offsets[sid + 1]].tolist()
+
+    # ---------------- 列视图 / CSR ----------------
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        '''
+            转移列的 numpy 零拷贝视图
+            注意: 视图存活期间底层 array 不能扩容, 不要在持有视图时添加转移
+        '''
+        return {
+            "src": np.frombuffer(self.src, dtype=np.int64),
+            "dst": np.frombuffer(self.dst, dtype=np.int64),
+            "sym": np.frombuffer(self.sym, dtype=np.int32),
+            "count": np.frombuffer(self.count, dtype=np.int64),
+            "prob": np.frombuffer(self.prob, dtype=np.float64),
+        }
+
+    def freeze(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            构建 CSR 出边索引 (out_offsets, out_order) 与入边索引 (_in_csr) 并释放字典索引
+        '''
+        csr = self._ensure_csr()
+        self._index = None
+        return csr
+
+    def _ensure_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        # 按需建立 CSR (出边与入边), 不影响字典索引
+        if self._csr is None:
+            n = len(self._alive)
+            src = np.frombuffer(self.src, dtype=np.int64)
+            dst = np.frombuffer(self.dst, dtype=np.int64)
+            sym = np.frombuffer(self.sym, dtype=np.int32)
+            order = np.lexsort((np.arange(len(src)), sym, src))
+            offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+            self._csr = (offsets, order)
+
+            in_offsets = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(dst, minlength=n), out=in_offsets[1:])
+            self._in_csr = (in_offsets, np.argsort(dst, kind="stable"))
+        return self._csr
+
+    def _key(self, src: int, sym: int) -> int:
+        return (src << self._SYMBOL_BITS) | sym
+
+    def _ensure_index(self) -> Dict[int, int]:
+        if self._index is None:
+            index: Dict[int, int] = {}
+            for tid, (s, y) in enumerate(zip(self.src, self.sym)):
+                index.setdefault(self._key(s, y), tid)
+            self._index = index
+        return self._index
+
+    def _find(self, src: int, symbol: str) -> Optional[int]:
+        sym = self._symbol_ids.get(symbol)
+        if sym is None:
+            return None
+        if self._index is not None:
+            return self._index.get(self._key(src, sym))
+
+        # 冻结后: 在该状态的 CSR 片段上二分
+        offsets, order = self._ensure_csr()
+        tids = order[offsets[src]:offsets[src + 1]]
+        syms = np.frombuffer(self.sym, dtype=np.int32)[tids]
+        i = int(np.searchsorted(syms, sym))
+        return int(tids[i]) if i < len(tids) and syms[i] == sym else None
+
+    # ---------------- 与 FSM 兼容的视图 ----------------
+
+    @property
+    def states(self) -> "_StateMapping":
+        return _StateMapping(self)
+
+    @property
+    def transitions(self) -> "_TransitionSequence":
+        return _TransitionSequence(self)
+
+    def transition(self, tid: int) -> Transition:
+        prob = self.prob[tid]
+        return Transition(
+            id=tid,
+            src=self.src[tid],
+            dst=self.dst[tid],
+            symbol=self.symbols[self.sym[tid]],
+            guard=None,
+            action=None,
+            prob=None if prob != prob else prob,
+            timing=self._timing.stats(tid) if self._timing is not None else None
+        )
+
+    # ---------------- 概率 ----------------
+
+    def symbol_table(self) -> List[str]:
+        return list(self.symbols)
+
+    def set_probabilities(self, prob: np.ndarray, end_prob: np.ndarray) -> None:
+        self.prob = array("d", np.asarray(prob, dtype=np.float64).tobytes())
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        end_prob = np.where(alive, np.asarray(end_prob, dtype=np.float64), np.nan)
+        self._end_prob = array("d", end_prob.tobytes())
+
+    def set_timing(self, table) -> None:
+        self._timing = table
+
+    # ---------------- 供 MergeEngine 使用 ----------------
+
+    def transition_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        cols = self.columns()
+        return cols["src"].copy(), cols["dst"].copy(), cols["sym"].copy()
+
+    def _apply_quotient(self, root: np.ndarray, canon: np.ndarray) -> None:
+        n = len(self._alive)
+        alive = np.frombuffer(self._alive, dtype=np.uint8).copy()
+        is_end = np.frombuffer(self._is_end, dtype=np.uint8).copy()
+        visits = np.frombuffer(self._visits, dtype=np.int64).copy()
+
+        # 状态: 统计信息累加到代表状态
+        members = np.flatnonzero(alive)
+        merged_visits = np.zeros(n, dtype=np.int64)
+        np.add.at(merged_visits, root[members], visits[members])
+        merged_end = np.zeros(n, dtype=np.uint8)
+        np.maximum.at(merged_end, root[members], is_end[members])
+        keep_state = (root == np.arange(n)) & (alive == 1)
+
+        self._alive = bytearray(keep_state.astype(np.uint8).tobytes())
+        self._is_end = bytearray((merged_end & keep_state).tobytes())
+        self._visits = array("q", (merged_visits * keep_state).tobytes())
+        end_prob = np.frombuffer(self._end_prob, dtype=np.float64)
+        self._end_prob = array("d", np.where(keep_state, end_prob, np.nan).tobytes())
+        if self.start_state is not None:
+            self.start_state = int(root[self.start_state])
+
+        # 转移: 重定向并去重, 被去掉的转移经过次数累加到保留的那条
+        cols = {k: v.copy() for k, v in self.columns().items()}
+        keep = np.flatnonzero(canon == np.arange(len(canon)))
+        counts = np.zeros(len(canon), dtype=np.int64)
+        np.add.at(counts, canon, cols["count"])
+
+        self.src = array("q", root[cols["src"][keep]].tobytes())
+        self.dst = array("q", root[cols["dst"][keep]].tobytes())
+        self.sym = array("i", cols["sym"][keep].tobytes())
+        self.count = array("q", counts[keep].tobytes())
+        self.prob = array("d", cols["prob"][keep].tobytes())
+
+        self._timing = None                 # 转移已重新编号, 旧的延迟统计不再对应
+        self._index = None
+        self._csr = None
+
+    @classmethod
+    def from_arrays(cls, symbols: List[str], is_end: np.ndarray, visits: np.ndarray,
+                    src: np.ndarray, dst: np.ndarray, sym: np.ndarray, count: np.ndarray,
+                    start_state: Optional[int] = 0) -> "CompactFSM":
+        '''
+            直接由状态列 / 转移列构造 (批量构建 PTA 时使用)
+        '''
+        fsm = cls()
+        fsm.symbols = list(symbols)
+        fsm._symbol_ids = {s: i for i, s in enumerate(fsm.symbols)}
+        fsm._is_end = bytearray(np.asarray(is_end, dtype=np.uint8).tobytes())
+        fsm._alive = bytearray(b"\x01" * len(fsm._is_end))
+        fsm._visits = array("q", np.asarray(visits, dtype=np.int64).tobytes())
+        fsm._end_prob = array("d", np.full(len(fsm._is_end), np.nan).tobytes())
+        fsm.start_state = start_state
+
+        fsm.src = array("q", np.asarray(src, dtype=np.int64).tobytes())
+        fsm.dst = array("q", np.asarray(dst, dtype=np.int64).tobytes())
+        fsm.sym = array("i", np.asarray(sym, dtype=np.int32).tobytes())
+        fsm.count = array("q", np.asarray(count, dtype=np.int64).tobytes())
+        fsm.prob = array("d", np.full(len(fsm.src), np.nan).tobytes())
+        fsm._index = None                   # 需要时再建立
+        return fsm
+
+    @classmethod
+    def from_fsm(cls, fsm: FSM) -> "CompactFSM":
+        compact = cls()
+        remap = {}
+        for sid, state in fsm.states.items():
+            remap[sid] = compact.new_state(is_start=sid == fsm.start_state, is_end=state.is_end)
+            compact._visits[remap[sid]] = state.visit_count
+            if state.end_prob is not None:
+                compact._end_prob[remap[sid]] = state.end_prob
+        for tran in fsm.transitions:
+            tid = compact.add_transition(remap[tran.src], remap[tran.dst], tran.symbol, count=0)
+            if tran.prob is not None:
+                compact.prob[tid] = tran.prob
+        return compact
+
+
+class _StateView:
+    '''
+        CompactFSM 中单个状态的只读视图(is_end / visit_count 可写), 字段与 FSMState 一致
+    '''
+
+    __slots__ = ("_fsm", "_sid")
+
+    hasNo = None
+
+    def __init__(self, fsm: CompactFSM, sid: int):
+        self._fsm = fsm
+        self._sid = sid
+
+    @property
+    def name(self) -> str:
+        return f"s{self._sid}"
+
+    @property
+    def is_start(self) -> bool:
+        return self._fsm.start_state == self._sid
+
+    @property
+    def is_end(self) -> bool:
+        return bool(self._fsm._is_end[self._sid])
+
+    @is_end.setter
+    def is_end(self, value: bool) -> None:
+        self._fsm._is_end[self._sid] = int(value)
+
+    @property
+    def visit_count(self) -> int:
+        return self._fsm._visits[self._sid]
+
+    @visit_count.setter
+    def visit_count(self, value: int) -> None:
+        self._fsm._visits[self._sid] = value
+
+    @property
+    def end_prob(self) -> Optional[float]:
+        p = self._fsm._end_prob[self._sid]
+        return None if p != p else p
+
+    def visit(self) -> None:
+        self._fsm.visit(self._sid)
+
+    @property
+    def next_states(self) -> Dict[str, int]:
+        return dict(self._fsm.successors(self._sid))
+
+    @property
+    def prev_states(self) -> Dict[str, int]:
+        return dict(self._fsm.predecessors(self._sid))
+
+    @property
+    def transitions(self) -> List[Transition]:
+        return [self._fsm.transition(t) for t in self._fsm.out_transitions(self._sid)]
+
+
+class _StateMapping(Mapping):
+
+    def __init__(self, fsm: CompactFSM):
+        self._fsm = fsm
+
+    def __getitem__(self, sid: int) -> _StateView:
+        if sid not in self:
+            raise KeyError(sid)
+        return _StateView(self._fsm, sid)
+
+    def __contains__(self, sid) -> bool:
+        return isinstance(sid, (int, np.integer)) and 0 <= sid < len(self._fsm._alive) \
+            and bool(self._fsm._alive[sid])
+
+    def __iter__(self) -> Iterator[int]:
+        alive = np.frombuffer(self._fsm._alive, dtype=np.uint8)
+        return iter(np.flatnonzero(alive).tolist())
+
+    def __len__(self) -> int:
+        return self._fsm._alive.count(1)
+
+
+class _TransitionSequence(Sequence):
+
+    def __init__(self, fsm: CompactFSM):
+        self._fsm = fsm
+
+    def __len__(self) -> int:
+        return len(self._fsm.src)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._fsm.transition(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._fsm.transition(i)
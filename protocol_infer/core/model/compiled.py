@@ -0,0 +1,252 @@
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from protocol_infer.core.model.fsm import FSM
+
+
+_SIMULATE_BYTES = 1 << 26          # 子集模拟每块保存的前沿位集上限
+
+
+class CompiledFSM:
+    '''
+        FSM 的稠密转移表, 用于批量重放符号序列
+
+        状态重新编号为 0..n-1 (state_ids[i] 为原状态编号), 符号编号与
+        fsm.symbol_table() 一致, 另加一列表示未知符号 (该列全为 -1).
+            delta[i, a]: 目标状态下标, -1 表示没有转移
+            tid[i, a]:   转移编号 (fsm.transitions 中的位置)
+        同一 (状态, 符号) 有多条转移时 (非确定 FSM, 例如未折叠的 K-tails 结果),
+        表中保存编号最小的一条, 与 FSM.lookup 一致; replay 中按表无法走完的序列
+        再做向量化的子集模拟 (见 replay).
+    '''
+
+    def __init__(self, fsm: FSM):
+        self.source = fsm
+        self.symbols: List[str] = fsm.symbol_table()
+        self.symbol_ids: Dict[Hashable, int] = {s: i for i, s in enumerate(self.symbols)}
+
+        self.state_ids = np.fromiter(fsm.states, dtype=np.int64, count=len(fsm.states))
+        self.state_ids.sort()
+        index = np.full(fsm._next_state_id, -1, dtype=np.int64)
+        index[self.state_ids] = np.arange(len(self.state_ids))
+        self.index = index
+
+        src, dst, sym = fsm.transition_columns()
+        n, m = len(self.state_ids), len(self.symbols)
+        self.trans_src = index[src]
+        self.delta = np.full((n, m + 1), -1, dtype=np.int32)
+        self.tid = np.full((n, m + 1), -1, dtype=np.int64)
+        rev = np.arange(len(src))[::-1]                 # 倒序写入, 编号最小的转移最后写入并保留
+        self.tid[self.trans_src[rev], sym[rev]] = rev
+        self.delta[self.trans_src[rev], sym[rev]] = index[dst[rev]]
+
+        self.start = int(index[fsm.start_state]) if fsm.start_state is not None else -1
+
+        # 转移列 (编译后的状态下标), 子集模拟按列展开
+        self.trans_sym, self.trans_dst = sym, index[dst]
+        key = self.trans_src * (m + 1) + sym
+        self.deterministic = len(np.unique(key)) == len(key)
+        self._by_key: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._by_state: Dict[str, Tuple[np.ndarray, ...]] = {}
+
+    @property
+    def n_states(self) -> int:
+        return len(self.state_ids)
+
+    @property
+    def n_transitions(self) -> int:
+        return len(self.trans_src)
+
+    def encode(self, sequences: Iterable[Sequence[Hashable]]) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            把序列编码为 (flat, lengths): 所有符号编号首尾相接, 未知符号编码为最后一列
+        '''
+        unknown = len(self.symbols)
+        ids = self.symbol_ids
+        lengths = []
+        flat = []
+        for seq in sequences:
+            lengths.append(len(seq))
+            flat.extend(ids.get(s, unknown) for s in seq)
+        return np.asarray(flat, dtype=np.int64), np.asarray(lengths, dtype=np.int64)
+
+    def replay(self, flat: np.ndarray, lengths: np.ndarray,
+               return_depth: bool = False) -> Tuple[np.ndarray, ...]:
+        '''
+            同时重放所有序列, 每一步对仍然存活的序列做一次向量化查表
+
+            非确定 FSM 中按表走不通的序列再做子集模拟 (_simulate): 每一步把 (序列, 状态)
+            前沿沿所有同符号的转移展开并去重, 前沿非空即可继续, 与 OnlineDetector 的状态集合语义一致.
+
+            计数的归属: 每条被接受的序列只贡献一条路径, 取所有可接受路径中转移编号字典序最小的一条
+            (每一步选编号最小、且之后仍能走完的转移). 按表一次走通的序列即为这条路径.
+            概率 / 延迟 / guard 的统计都按这条路径累加, 不在多条歧义路径之间拆分.
+
+            Returns:
+                path:  与 flat 等长, 每个位置经过的转移编号; 被拒绝的序列全部为 -1
+                final: 每条序列结束时的状态下标, 无法完整重放的序列为 -1
+                depth: (return_depth=True 时) 每条序列在前沿变空之前消耗的符号数,
+                       被接受的序列等于其长度, 被拒绝的序列即第一个偏离位置
+        '''
+        n_seq = len(lengths)
+        path = np.full(len(flat), -1, dtype=np.int64)
+        depth = np.zeros(n_seq, dtype=np.int64)
+        if self.start < 0:
+            final = np.full(n_seq, -1, dtype=np.int64)
+            return (path, final, depth) if return_depth else (path, final)
+
+        offsets = np.zeros(n_seq, dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        order = np.argsort(-lengths, kind="stable")     # 按长度降序, 第 t 步存活的序列是一个前缀
+        desc = -lengths[order]
+
+        cur = np.full(n_seq, self.start, dtype=np.int64)
+        alive = np.ones(n_seq, dtype=bool)
+        depth[:] = lengths
+        max_len = int(lengths.max()) if n_seq else 0
+        for t in range(max_len):
+            seqs = order[:np.searchsorted(desc, -t, side="left")]
+            seqs = seqs[alive[seqs]]
+            if len(seqs) == 0:
+                break
+            pos = offsets[seqs] + t
+            state, symbol = cur[seqs], flat[pos]
+            tid = self.tid[state, symbol]
+            ok = tid >= 0
+            path[pos[ok]] = tid[ok]
+            cur[seqs[ok]] = self.delta[state[ok], symbol[ok]]
+            alive[seqs[~ok]] = False
+            depth[seqs[~ok]] = t
+
+        failed = np.flatnonzero(~alive)
+        if len(failed) and not self.deterministic:
+            end, reached = self._simulate(flat, offsets[failed], lengths[failed], path)
+            cur[failed], alive[failed], depth[failed] = end, end >= 0, reached
+
+        path[np.repeat(~alive, lengths)] = -1
+        final = np.where(alive, cur, -1)
+        return (path, final, depth) if return_depth else (path, final)
+
+    def _csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+            (状态 * 宽度 + 符号) -> 转移, 按键再按转移编号排序: (ptr, tid, dst)
+        '''
+        if self._by_key is None:
+            width = len(self.symbols) + 1
+            key = self.trans_src * width + self.trans_sym
+            tids = np.lexsort((np.arange(len(key)), key))
+            ptr = np.searchsorted(key[tids], np.arange(self.n_states * width + 1))
+            self._by_key = (ptr, tids, self.trans_dst[tids])
+        return self._by_key
+
+    def _grouped(self, by: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+            按目标状态 (by="dst") 或源状态 (by="src") 排序的转移列, 以及 reduceat 用的分组
+            Returns: (src, sym, dst, 分组的状态下标, 分组起点)
+        '''
+        if by not in self._by_state:
+            col = self.trans_dst if by == "dst" else self.trans_src
+            order = np.argsort(col, kind="stable")
+            groups, starts = np.unique(col[order], return_index=True)
+            self._by_state[by] = (self.trans_src[order], self.trans_sym[order], self.trans_dst[order],
+                                  groups, starts)
+        return self._by_state[by]
+
+    def _simulate(self, flat: np.ndarray, offsets: np.ndarray, lengths: np.ndarray,
+                  path: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            对一组序列做子集模拟, 被接受的序列把字典序最小的可接受路径写入 path
+
+            位并行: frontier[t][s] 是一个位集, 第 j 位表示第 j 条序列在第 t 步可能处于状态 s.
+            每一步对所有转移 (s -a-> d) 计算 frontier[t][s] & mask[a] 再按 d 做 OR 归约,
+            代价与转移数 x 序列数 / 64 成正比, 与前沿大小无关 (K-tails 结果的前沿可达上千个状态).
+            序列按块处理, 每块保存的前沿与符号掩码 (按位打包) 合计不超过 _SIMULATE_BYTES.
+
+            Returns: (终止状态下标 (拒绝为 -1), 前沿变空之前消耗的符号数)
+        '''
+        n, m = max(self.n_states, 1), len(self.symbols) + 1
+        max_len = int(lengths.max()) if len(lengths) else 0
+        # 每 64 条序列: 前沿 n x (max_len + 1) 个字, 掩码 max_len x m 个字, 结束标记 max_len + 1 个字
+        words = max(1, _SIMULATE_BYTES // (8 * ((n + 1) * (max_len + 1) + m * max_len)))
+        size = 64 * words
+        end = np.full(len(lengths), -1, dtype=np.int64)
+        reached = np.zeros(len(lengths), dtype=np.int64)
+        for a in range(0, len(lengths), size):
+            b = min(a + size, len(lengths))
+            end[a:b], reached[a:b] = self._simulate_block(flat, offsets[a:b], lengths[a:b], path)
+        return end, reached
+
+    def _simulate_block(self, flat: np.ndarray, offsets: np.ndarray, lengths: np.ndarray,
+                        path: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        k, n = len(lengths), self.n_states
+        m = len(self.symbols) + 1
+        words = (k + 63) // 64
+        steps = int(lengths.max())
+        seq = np.arange(k)
+
+        def pack(bits: np.ndarray) -> np.ndarray:
+            # 最后一维的布尔值 -> uint64 位集, 第 j 位对应第 j 条序列
+            pad = np.zeros(bits.shape[:-1] + (64 * words,), dtype=bool)
+            pad[..., :k] = bits
+            return np.packbits(pad, axis=-1, bitorder="little").view(np.uint64)
+
+        def unpack(packed: np.ndarray) -> np.ndarray:
+            return np.unpackbits(packed.view(np.uint8), axis=-1, bitorder="little")[..., :k].astype(bool)
+
+        # masks[t][a]: 第 t 个符号为 a 的序列; ends[t]: 长度恰为 t 的序列; 逐步打包, 不保存未打包的布尔矩阵
+        masks = np.zeros((steps, m, words), dtype=np.uint64)
+        ends = np.zeros((steps + 1, words), dtype=np.uint64)
+        step = np.zeros((m, k), dtype=bool)
+        for t in range(steps + 1):
+            ends[t] = pack(lengths == t)
+            if t < steps:
+                live = seq[lengths > t]
+                step[:] = False
+                step[flat[offsets[live] + t], live] = True
+                masks[t] = pack(step)
+
+        # 前向: frontier[t + 1][d] = OR_{s -a-> d} frontier[t][s] & masks[t][a]
+        e_src, e_sym, _, groups, starts = self._grouped("dst")
+        frontier = np.zeros((steps + 1, n, words), dtype=np.uint64)
+        frontier[0, self.start] = pack(np.ones(k, dtype=bool))
+        reached = np.zeros(k, dtype=np.int64)
+        for t in range(steps):
+            if len(starts):
+                frontier[t + 1, groups] = np.bitwise_or.reduceat(
+                    frontier[t, e_src] & masks[t, e_sym], starts, axis=0)
+            alive = unpack(np.bitwise_or.reduce(frontier[t + 1], axis=0))
+            reached[alive] = t + 1
+            if not alive.any():
+                break
+
+        # 反向: 只保留之后还能走完的 (序列, 状态), 结果覆盖 frontier
+        _, r_sym, r_dst, groups, starts = self._grouped("src")
+        for t in range(steps, -1, -1):
+            keep = ends[t].copy()
+            back = np.zeros((n, words), dtype=np.uint64)
+            if t < steps and len(starts):
+                back[groups] = np.bitwise_or.reduceat(frontier[t + 1, r_dst] & masks[t, r_sym], starts, axis=0)
+            frontier[t] &= back | keep
+
+        accepted = unpack(frontier[0, self.start])
+        end = np.full(k, -1, dtype=np.int64)
+        if not accepted.any():
+            return end, reached
+
+        # 前向: 每一步在仍可走完的转移中选编号最小的一条 (CSR 中同一键的转移按编号排列)
+        ptr, csr_tid, csr_dst = self._csr()
+        viable_bytes = frontier.view(np.uint8)
+        cur = np.full(k, self.start, dtype=np.int64)
+        for t in range(steps):
+            seqs = seq[accepted & (lengths > t)]
+            key = cur[seqs] * m + flat[offsets[seqs] + t]
+            lo, cnt = ptr[key], ptr[key + 1] - ptr[key]
+            rep = np.repeat(np.arange(len(seqs)), cnt)
+            e = np.repeat(lo - np.cumsum(cnt) + cnt, cnt) + np.arange(int(cnt.sum()))
+            cs, cdst = seqs[rep], csr_dst[e]
+            ok = (viable_bytes[t + 1, cdst, cs >> 3] >> (cs & 7)) & 1 == 1
+            chosen, first = np.unique(cs[ok], return_index=True)
+            path[offsets[chosen] + t] = csr_tid[e[ok][first]]
+            cur[chosen] = cdst[ok][first]
+
+        end[accepted] = cur[accepted]
+        return end, reached
@@ -1,4 +1,84 @@
-from model.fsm import FSM
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from protocol_infer.core.model.fsm import FSM, FSMState
+
 
 class EFSM(FSM):
-    pass
\ No newline at end of file
+    '''
+        带 guard / action 的 FSM
+
+        guard(vars) -> bool, action(vars) -> new_vars, 其中
+            vars = {"payload": 当前消息负载, 寄存器名: 值, ...}
+        registers 为所有 action 可能写入的寄存器名.
+        guard / action 使用 data_flow_layer.predicates 中可序列化的谓词时,
+        export_guards / load_guards 可把它们转换为 JSON 兼容的 dict.
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.registers: List[str] = []
+
+    @classmethod
+    def from_fsm(cls, fsm: FSM) -> "EFSM":
+        '''
+            复制 fsm (FSM 或 CompactFSM) 的状态与转移, 保持状态编号和转移顺序不变
+        '''
+        efsm = cls()
+        for sid in fsm.states:
+            state = fsm.states[sid]
+            copy = FSMState(state.name, is_start=state.is_start, is_end=state.is_end)
+            copy.visit_count = state.visit_count
+            copy.end_prob = state.end_prob
+            efsm.states[sid] = copy
+        efsm._next_state_id = fsm._next_state_id
+        efsm.start_state = fsm.start_state
+
+        for tran in fsm.transitions:
+            copy = efsm.transitions[efsm.add_transition(tran.src, tran.dst, tran.symbol)]
+            copy.output, copy.prob, copy.timing = tran.output, tran.prob, tran.timing
+        return efsm
+
+    def step(self, sid: int, symbol: str, payload: bytes,
+             registers: Dict[str, Any]) -> Optional[Tuple[int, Dict[str, Any]]]:
+        '''
+            按 (状态, 符号) 依次尝试转移, 取第一条 guard 成立的转移并执行 action
+
+            Returns: (目标状态, 新的寄存器), 没有可用转移时为 None
+        '''
+        for tran in self._by_state_input.get((sid, symbol), []):
+            vars = dict(registers, payload=payload)
+            if tran.guard is not None and not tran.guard(vars):
+                continue
+            if tran.action is not None:
+                vars = tran.action(vars)
+            vars.pop("payload", None)
+            return tran.dst, vars
+        return None
+
+    # ---------------- 序列化 ----------------
+
+    def export_guards(self) -> Dict[str, Any]:
+        return {
+            "registers": list(self.registers),
+            "transitions": [
+                {"guard": _to_dict(t.guard), "action": _to_dict(t.action)} for t in self.transitions
+            ],
+        }
+
+    def load_guards(self, data: Dict[str, Any]) -> None:
+        from protocol_infer.data_flow_layer.predicates import from_dict
+
+        entries = data["transitions"]
+        if len(entries) != len(self.transitions):
+            raise ValueError(f"expected {len(self.transitions)} transitions, got {len(entries)}")
+        self.registers = list(data["registers"])
+        for tran, entry in zip(self.transitions, entries):
+            tran.guard = from_dict(entry["guard"]) if entry["guard"] is not None else None
+            tran.action = from_dict(entry["action"]) if entry["action"] is not None else None
+
+
+def _to_dict(fn: Optional[Callable]) -> Optional[Dict[str, Any]]:
+    if fn is None:
+        return None
+    if not hasattr(fn, "to_dict"):
+        raise TypeError(f"{fn!r} is not a serializable predicate")
+    return fn.to_dict()
@@ -1,5 +1,7 @@
 from dataclasses import dataclass, field
-from typing import Callable, Dict, List, Tuple, Optional, Iterable
+from typing import Any, Callable, Dict, List, Tuple, Optional, Iterable
+import numpy as np
+from protocol_infer.core.model.merge_engine import MergeEngine
 
 
 @dataclass
@@ -12,6 +14,7 @@ class Transition:
     action: Optional[Callable[[Dict], Dict]]  # action(vars) -> new_vars
     output: Optional[str] = None
     prob: Optional[float] = None  # for P-EFSM
+    timing: Optional[Any] = None  # 消息间隔统计 (probabilistic_layer.timing 的 TimingStats)
 
 
 class FSMState:
@@ -31,6 +34,7 @@ class FSMState:
 
         # 统计信息（为 merge / coverage 服务）
         self.visit_count = 0        # 出现于多少条序列, 相当于refsm的no_of_seqs
+        self.end_prob: Optional[float] = None       # 在该状态结束的概率 (P-EFSM)
 
         self.hasNo = hasNo          # 状态的哈希编号（用于状态合并）
 
@@ -99,54 +103,157 @@ class FSM:
         )
 
         return sid
-    
 
-    def merge_two_state(self, s1, s2):
+    # ---------------- 构建 / 查询接口 (CompactFSM 提供相同的接口) ----------------
+
+    def lookup(self, src: int, symbol: str) -> Optional[int]:
         '''
-            将s1 s2(都为sid)合并
+            (状态, 输入符号) -> 目标状态, 不存在时返回 None
         '''
+        existing = self._by_state_input.get((src, symbol))
+        return existing[0].dst if existing else None
 
-        if s1 == s2:
-            return
+    def traverse(self, src: int, symbol: str) -> Optional[int]:
+        '''
+            沿已有转移走一步, 与 lookup 相同; CompactFSM 会额外记录转移的经过次数
+        '''
+        return self.lookup(src, symbol)
+
+    def add_transition(self, src: int, dst: int, symbol: str) -> int:
+        tran = Transition(
+            id=len(self.transitions),        # transition列表的长度递增性直接作为id
+            src=src,
+            dst=dst,
+            symbol=symbol,
+            guard=None,
+            action=None
+        )
+        self.transitions.append(tran)
+        self._by_state_input.setdefault((src, symbol), []).append(tran)
+
+        # 更新前驱后继
+        self.states[src].next_states[symbol] = dst
+        self.states[dst].prev_states[symbol] = src
+        self.states[src].add_transition(tran)
+        return tran.id
+
+    def visit(self, sid: int) -> None:
+        self.states[sid].visit()
 
-        state1 = self.states[s1]
-        state2 = self.states[s2]
+    def mark_end(self, sid: int) -> None:
+        self.states[sid].is_end = True
 
-        if state1.is_end or state2.is_end:
-            # 避免合并 end 状态
+    def end_states(self) -> List[int]:
+        return [sid for sid, s in self.states.items() if s.is_end]
+
+    def visit_counts(self) -> np.ndarray:
+        '''
+            visit_counts()[sid] 为状态的 visit_count, 已删除的状态为 0
+        '''
+        counts = np.zeros(self._next_state_id, dtype=np.int64)
+        for sid, state in self.states.items():
+            counts[sid] = state.visit_count
+        return counts
+
+    def successors(self, sid: int) -> List[Tuple[str, int]]:
+        '''
+            按符号排序的 (符号, 后继状态) 列表
+        '''
+        return sorted(self.states[sid].next_states.items())
+
+
+    def merge_two_state(self, s1, s2, merge_end_states: bool = False):
+        '''
+            将s1 s2(都为sid)合并, s2 并入 s1
+
+            默认不合并 end 状态. 一次合并一对状态需要重建整个 FSM,
+            批量合并应直接使用 MergeEngine: 多次 union 之后只 materialize 一次
+        '''
+        if s1 == s2:
             return
 
-        # 合并s2信息到s1(统计信息)
-        state1.visit_count += state2.visit_count
-        state1.is_end = state1.is_end or state2.is_end
+        engine = MergeEngine(self, merge_end_states=merge_end_states)
+        if engine.union(s1, s2):
+            engine.materialize()
 
-        # 修改state2的transition
-        for tran in state2.transitions:
-            tran.src = s1
-            state1.add_transition(tran)
+    # ---------------- 概率 ----------------
 
-        # 修改所有指向state2的transition
-        for tran in self.transitions:
-            if tran.dst == s2:
-                tran.dst = s1
+    def symbol_table(self) -> List[str]:
+        '''
+            符号编号 -> 符号, 与 transition_columns 中的符号编号一致
+        '''
+        symbol_ids: Dict[str, int] = {}
+        for t in self.transitions:
+            symbol_ids.setdefault(t.symbol, len(symbol_ids))
+        return list(symbol_ids)
 
-        # 合并前驱后继
-        for symbol, pid in state2.prev_states.items():
-            state1.prev_states[symbol] = pid
+    def set_probabilities(self, prob: np.ndarray, end_prob: np.ndarray) -> None:
+        '''
+            prob[i]:       第 i 条转移的概率
+            end_prob[sid]: 在状态 sid 结束的概率
+            NaN 表示没有估计 (写为 None)
+        '''
+        for tran, p in zip(self.transitions, prob.tolist()):
+            tran.prob = None if p != p else p
+        for sid, state in self.states.items():
+            p = float(end_prob[sid])
+            state.end_prob = None if p != p else p
 
-        for symbol, nid in state2.next_states.items():
-            state1.next_states[symbol] = nid
+    def set_timing(self, table) -> None:
+        '''
+            table: DelayTable, 第 i 行对应第 i 条转移
+        '''
+        for i, tran in enumerate(self.transitions):
+            tran.timing = table.stats(i)
 
-        # 检查s2是否为start_state
-        if self.start_state == s2:
-            self.start_state = s1
-            state1.is_start = True
+    # ---------------- 供 MergeEngine 使用 ----------------
 
-            
-        # 删除state2
-        del self.states[s2]
+    def transition_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+            转移的 (src, dst, 符号编号) 列, 第 i 行对应 self.transitions[i]
+        '''
+        n = len(self.transitions)
+        symbol_ids: Dict[str, int] = {}
+        src = np.fromiter((t.src for t in self.transitions), dtype=np.int64, count=n)
+        dst = np.fromiter((t.dst for t in self.transitions), dtype=np.int64, count=n)
+        sym = np.fromiter(
+            (symbol_ids.setdefault(t.symbol, len(symbol_ids)) for t in self.transitions),
+            dtype=np.int64, count=n
+        )
+        return src, dst, sym
 
-        self._by_state_input.clear()
-        for tran in self.transitions:
-            key = (tran.src, tran.symbol)
-            self._by_state_input.setdefault(key, []).append(tran)
\ No newline at end of file
+    def _apply_quotient(self, root: np.ndarray, canon: np.ndarray) -> None:
+        '''
+            root[s]:  状态 s 合并后的代表状态
+            canon[i]: 第 i 条转移去重后对应的转移位置, canon[i] == i 表示保留
+        '''
+        root = root.tolist()
+
+        # 合并s2信息到s1(统计信息)
+        for sid in list(self.states):
+            rid = root[sid]
+            if rid != sid:
+                state, target = self.states.pop(sid), self.states[rid]
+                target.visit_count += state.visit_count
+                target.is_end = target.is_end or state.is_end
+                target.is_start = target.is_start or state.is_start
+
+        if self.start_state is not None:
+            self.start_state = root[self.start_state]
+            self.states[self.start_state].is_start = True
+
+        # 修改所有 transition, 重建前驱后继
+        kept = [t for i, t in enumerate(self.transitions) if canon[i] == i]
+        for state in self.states.values():
+            state.transitions = []
+            state.next_states = {}
+            state.prev_states = {}
+
+        self.transitions = kept
+        self._by_state_input = {}
+        for tran in kept:
+            tran.src, tran.dst = root[tran.src], root[tran.dst]
+            self.states[tran.src].add_transition(tran)
+            self.states[tran.src].next_states[tran.symbol] = tran.dst
+            self.states[tran.dst].prev_states[tran.symbol] = tran.src
+            self._by_state_input.setdefault((tran.src, tran.symbol), []).append(tran)
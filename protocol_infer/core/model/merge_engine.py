@@ -0,0 +1,156 @@
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+class MergeEngine:
+    '''
+        基于并查集的状态合并
+
+        union() 只记录合并关系(近似 O(1)), 不修改 FSM; 所有合并完成后调用一次
+        materialize() 生成商自动机:
+            - 每个等价类保留代表状态(union(s1, s2) 中 s1 所在类的代表), 其余状态删除
+            - 访问次数求和, is_end / is_start 取或
+            - 转移的 src / dst 替换为代表状态, 完全相同的 (src, 符号, dst) 只保留一条
+            - fold=True 时继续合并同一 (状态, 符号) 的不同目标状态, 直到确定
+
+        合并过程中可通过 successors / predecessors 查询商自动机上的出入边,
+        出入边索引在第一次查询时建立, 之后随 union 按小并大合并.
+
+        适用于 FSM 和 CompactFSM (两者都提供 transition_columns / _apply_quotient).
+        materialize() 之后 FSM 已被修改, 本对象不应再使用.
+    '''
+
+    def __init__(self, fsm, merge_end_states: bool = False):
+        self.fsm = fsm
+        self.merge_end_states = merge_end_states
+
+        n = fsm._next_state_id
+        self.parent = list(range(n))
+        self._end = bytearray(n)
+        for sid in fsm.end_states():
+            self._end[sid] = 1
+
+        self.src, self.dst, self.sym = fsm.transition_columns()
+        self._out: Optional[Dict[int, List[int]]] = None     # 代表状态 -> 出边转移编号
+        self._in: Optional[Dict[int, List[int]]] = None      # 代表状态 -> 入边转移编号
+
+    def find(self, sid: int) -> int:
+        parent = self.parent
+        while parent[sid] != sid:
+            parent[sid] = parent[parent[sid]]           # 路径减半
+            sid = parent[sid]
+        return sid
+
+    def is_end(self, sid: int) -> bool:
+        return bool(self._end[self.find(sid)])
+
+    def union(self, s1: int, s2: int, force: bool = False) -> bool:
+        '''
+            把 s2 所在的类并入 s1 所在的类
+
+            Returns:
+                是否发生了合并; 同一类或 (未 force 且) 任一方为 end 状态时返回 False
+        '''
+        r1, r2 = self.find(s1), self.find(s2)
+        if r1 == r2:
+            return False
+        if not (force or self.merge_end_states) and (self._end[r1] or self._end[r2]):
+            return False
+
+        self.parent[r2] = r1
+        self._end[r1] |= self._end[r2]
+        if self._out is not None:
+            self._absorb(self._out, r1, r2)
+            self._absorb(self._in, r1, r2)
+        return True
+
+    def assign(self, root: np.ndarray) -> None:
+        '''
+            直接指定每个状态的代表状态 (要求 root[root[s]] == root[s]),
+            代替逐对 union, 用于已经算好等价类的批量合并
+        '''
+        self.parent = np.asarray(root, dtype=np.int64).tolist()
+        end = np.zeros(len(self.parent), dtype=np.uint8)
+        np.maximum.at(end, root, np.frombuffer(self._end, dtype=np.uint8))
+        self._end = bytearray(end.tobytes())
+        self._out = self._in = None
+
+    def successors(self, sid: int) -> List[Tuple[int, int]]:
+        '''
+            商自动机上的出边 (符号编号, 目标代表状态), 可能含重复
+        '''
+        self._ensure_adjacency()
+        return [(int(self.sym[t]), self.find(int(self.dst[t]))) for t in self._out.get(self.find(sid), [])]
+
+    def predecessors(self, sid: int) -> List[Tuple[int, int]]:
+        self._ensure_adjacency()
+        return [(int(self.sym[t]), self.find(int(self.src[t]))) for t in self._in.get(self.find(sid), [])]
+
+    def roots(self) -> np.ndarray:
+        '''
+            每个状态的代表状态, 向量化的指针跳跃
+        '''
+        root = np.asarray(self.parent, dtype=np.int64)
+        while True:
+            nxt = root[root]
+            if np.array_equal(nxt, root):
+                return root
+            root = nxt
+
+    def materialize(self, fold: bool = False):
+        root = self.roots()
+        while fold and self._fold(root):
+            root = self.roots()
+
+        src, dst = root[self.src], root[self.dst]
+        canon = np.arange(len(src), dtype=np.int64)
+        if len(src):
+            # 完全相同的转移只保留第一次出现的那条
+            _, first, inverse = np.unique(
+                np.stack([src, self.sym.astype(np.int64), dst], axis=1),
+                axis=0, return_index=True, return_inverse=True
+            )
+            canon = first[inverse.ravel()]
+
+        self.fsm._apply_quotient(root, canon)
+        return self.fsm
+
+    def _fold(self, root: np.ndarray) -> bool:
+        # 同一 (状态, 符号) 下的不同目标状态全部合并到第一个目标
+        src, dst, sym = root[self.src], root[self.dst], self.sym
+        if len(src) == 0:
+            return False
+        order = np.lexsort((dst, sym, src))
+        src, sym, dst = src[order], sym[order], dst[order]
+
+        group_start = np.r_[True, (src[1:] != src[:-1]) | (sym[1:] != sym[:-1])]
+        head = dst[np.maximum.accumulate(np.where(group_start, np.arange(len(dst)), 0))]
+        conflict = np.flatnonzero(dst != head)
+
+        merged = False
+        for a, b in zip(head[conflict].tolist(), dst[conflict].tolist()):
+            merged |= self.union(a, b, force=True)
+        return merged
+
+    def _ensure_adjacency(self) -> None:
+        if self._out is not None:
+            return
+        self._out, self._in = {}, {}
+        for tid, (s, d) in enumerate(zip(self.src.tolist(), self.dst.tolist())):
+            self._out.setdefault(self.find(s), []).append(tid)
+            self._in.setdefault(self.find(d), []).append(tid)
+
+    @staticmethod
+    def _absorb(index: Dict[int, List[int]], r1: int, r2: int) -> None:
+        # 小并大: 把较短的列表接到较长的后面
+        small = index.pop(r2, None)
+        if not small:
+            return
+        big = index.get(r1)
+        if big is None:
+            index[r1] = small
+            return
+        if len(big) < len(small):
+            big, small = small, big
+            index[r1] = big
+        big.extend(small)
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+
+
+@dataclass(frozen=True)
+class Field:
+    '''
+        负载中固定偏移的无符号整数字段
+    '''
+    offset: int
+    width: int = 1
+    byteorder: str = "big"
+
+    @property
+    def name(self) -> str:
+        if self.width == 1:
+            return f"u8@{self.offset}"
+        return f"u{8 * self.width}{'be' if self.byteorder == 'big' else 'le'}@{self.offset}"
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.width
+
+    @property
+    def modulus(self) -> int:
+        return 1 << (8 * self.width)
+
+    def read(self, payload: bytes) -> Optional[int]:
+        if len(payload) < self.end:
+            return None
+        return int.from_bytes(payload[self.offset:self.end], self.byteorder)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"offset": self.offset, "width": self.width, "byteorder": self.byteorder}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Field":
+        return cls(data["offset"], data["width"], data["byteorder"])
+
+
+class FieldColumns:
+    '''
+        一批消息负载的前 width 个字节, 每个偏移一列 (int16, 负载不够长的位置为 -1)
+
+        消息按会话排列, first[i] 表示第 i 条消息是会话的第一条.
+        value / previous 返回的列按字段缓存, 同一字段只计算一次.
+    '''
+
+    def __init__(self, lead: np.ndarray, lengths: np.ndarray, first: Optional[np.ndarray] = None):
+        self.lead = lead
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        if first is None:
+            first = np.zeros(len(lead), dtype=bool)
+            first[:1] = True
+        self.first = first
+        self._values: Dict[Field, Tuple[np.ndarray, np.ndarray]] = {}
+        self._previous: Dict[Field, Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def from_trace(cls, trace: ColumnarTrace, rows: np.ndarray, width: int,
+                   first: Optional[np.ndarray] = None) -> "FieldColumns":
+        '''
+            取出 trace 中 rows 行的负载前缀 (ColumnarTrace.leading 分块花式索引), 不逐条解析消息
+        '''
+        return cls(trace.leading(width, rows), trace.lengths[rows], first)
+
+    def __len__(self) -> int:
+        return len(self.lead)
+
+    @property
+    def width(self) -> int:
+        return self.lead.shape[1]
+
+    def value(self, field: Field) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            (字段值, 是否存在), 负载短于 field.end 的消息不存在该字段
+        '''
+        cached = self._values.get(field)
+        if cached is not None:
+            return cached
+        if field.end > self.width:
+            raise ValueError(f"{field.name} needs {field.end} leading bytes, columns hold {self.width}")
+
+        cols = range(field.offset, field.end)
+        if field.byteorder == "little":
+            cols = reversed(cols)
+        values = np.zeros(len(self), dtype=np.int64)
+        for c in cols:
+            values = (values << 8) | self.lead[:, c].astype(np.int64)
+        valid = self.lead[:, field.end - 1] >= 0
+        self._values[field] = cached = (np.where(valid, values, 0), valid)
+        return cached
+
+    def previous(self, field: Field) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            同一会话中之前最近一条带有该字段的消息的字段值, 即寄存器在此消息之前的值
+        '''
+        cached = self._previous.get(field)
+        if cached is not None:
+            return cached
+        values, valid = self.value(field)
+        n = len(self)
+        idx = np.arange(n)
+        last = np.maximum.accumulate(np.where(valid, idx, -1)) if n else idx
+        prev = np.r_[-1, last[:-1]] if n else idx
+        session_start = np.maximum.accumulate(np.where(self.first, idx, 0)) if n else idx
+        ok = prev >= session_start
+        self._previous[field] = cached = (np.where(ok, values[np.maximum(prev, 0)], 0), ok)
+        return cached
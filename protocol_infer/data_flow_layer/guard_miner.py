@@ -0,0 +1,156 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.interface.efsm_builder import EFSMBuilder
+from protocol_infer.core.model.compiled import CompiledFSM
+from protocol_infer.core.model.efsm import EFSM
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.data_flow_layer.fields import Field, FieldColumns
+from protocol_infer.data_flow_layer.predicates import (
+    And, FieldDelta, FieldEquals, FieldIn, FieldRange, LengthRange, Predicate, StoreFields
+)
+
+
+class ColumnarEFSMBuilder(EFSMBuilder):
+    '''
+        按列挖掘每条转移的 guard 与 action
+
+        1. 在 CompiledFSM 上批量重放符号序列, 得到每条消息经过的转移;
+        2. 取所有消息负载的前 max_offset 个字节组成 FieldColumns;
+        3. 消息按转移编号排序后, 每个字段用 reduceat 一次算出所有转移上的统计量.
+
+        每条转移 (至少 min_support 条消息经过) 的 guard 是以下条件的合取:
+            LengthRange:  负载长度范围
+            FieldDelta:   计数器, 字段值与会话中该字段上一次的值之差恒定且字段不是常量
+                          (按 counter_widths 从宽到窄查找, 与已找到的计数器重叠的字段跳过)
+            FieldEquals:  不属于计数器的字节, 在该转移上是常量
+            FieldIn:      取值不超过 max_values 种
+            FieldRange:   其余字节, 取值范围小于整个字节范围时
+        所有计数器字段都作为寄存器, 每条转移的 action 为 StoreFields(计数器字段).
+    '''
+
+    def __init__(self, max_offset: int = 16, counter_widths: Sequence[int] = (2, 1),
+                 byteorder: str = "big", max_values: int = 4, min_support: int = 2):
+        self.max_offset = max_offset
+        self.counter_widths = counter_widths
+        self.byteorder = byteorder
+        self.max_values = max_values
+        self.min_support = min_support
+
+    def build(self, fsm: FSM, trace, sequences: Dict[SessionKey, Sequence[str]]) -> EFSM:
+        trace = ColumnarTrace.from_trace(trace)
+        groups = trace.group_by_session()
+        keys = list(sequences)
+
+        compiled = CompiledFSM(fsm)
+        flat, lengths = compiled.encode(sequences[k] for k in keys)
+        path, final = compiled.replay(flat, lengths)
+        rows = np.concatenate([groups[k] for k in keys]) if keys else np.zeros(0, dtype=np.int64)
+        if len(rows) != len(flat):
+            raise ValueError("sequences do not match the sessions of trace")
+
+        first = np.zeros(len(rows), dtype=bool)
+        first[(np.cumsum(lengths) - lengths)[lengths > 0]] = True
+        columns = FieldColumns.from_trace(trace, rows, self.max_offset, first)
+
+        # 只用能完整重放的序列
+        tids = np.where(np.repeat(final >= 0, lengths), path, -1)
+        guards, actions = self.mine(columns, tids, compiled.n_transitions)
+
+        efsm = EFSM.from_fsm(fsm)
+        for tran, guard, action in zip(efsm.transitions, guards, actions):
+            tran.guard, tran.action = guard, action
+        efsm.registers = list(actions[0].registers) if actions and actions[0] is not None else []
+        return efsm
+
+    def mine(self, columns: FieldColumns, tids: np.ndarray,
+             n_transitions: int) -> Tuple[List[Optional[Predicate]], List[Optional[StoreFields]]]:
+        '''
+            tids[i] 为第 i 条消息经过的转移编号, -1 表示不参与统计
+        '''
+        selected = np.flatnonzero(tids >= 0)
+        order = selected[np.argsort(tids[selected], kind="stable")]
+        present, starts, sizes = np.unique(tids[order], return_index=True, return_counts=True)
+        supported = sizes >= self.min_support
+        n_groups = len(present)
+
+        if n_groups == 0:
+            return [None] * n_transitions, [None] * n_transitions
+
+        lengths = columns.lengths[order]
+        lo = np.minimum.reduceat(lengths, starts)
+        hi = np.maximum.reduceat(lengths, starts)
+        terms: List[List[Predicate]] = [[LengthRange(int(lo[g]), int(hi[g]))] for g in range(n_groups)]
+
+        # 计数器: 从宽到窄, 偏移从小到大; covered[g, j] 表示转移 g 的第 j 字节已属于计数器
+        covered = np.zeros((n_groups, columns.width), dtype=bool)
+        counters: List[Field] = []
+        for width in sorted(self.counter_widths, reverse=True):
+            for offset in range(columns.width - width + 1):
+                field = Field(offset, width, self.byteorder)
+                found, delta = self._counters(columns, field, order, starts, sizes)
+                found &= supported & ~covered[:, offset:offset + width].any(axis=1)
+                if not found.any():
+                    continue
+                counters.append(field)
+                covered[found, offset:offset + width] = True
+                for g in np.flatnonzero(found).tolist():
+                    terms[g].append(FieldDelta(field, int(delta[g])))
+
+        for offset in range(columns.width):
+            self._byte_terms(columns, Field(offset), order, starts, sizes, ~covered[:, offset] & supported, terms)
+
+        guards: List[Optional[Predicate]] = [None] * n_transitions
+        for g, tid in enumerate(present.tolist()):
+            if supported[g]:
+                guards[tid] = And(tuple(terms[g]))
+        action = StoreFields(tuple(counters)) if counters else None
+        return guards, [action] * n_transitions
+
+    # ---------------- 按转移分组的列统计 ----------------
+
+    def _counters(self, columns: FieldColumns, field: Field, order: np.ndarray,
+                  starts: np.ndarray, sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            (每个分组是否为计数器, 分组内的差值)
+        '''
+        values, valid = columns.value(field)
+        last, has_last = columns.previous(field)
+        values, valid = values[order], valid[order]
+        pair = valid & has_last[order]
+        delta = (values - last[order]) % field.modulus
+
+        all_valid = np.add.reduceat(valid, starts) == sizes
+        constant = (np.minimum.reduceat(np.where(valid, values, field.modulus), starts)
+                    == np.maximum.reduceat(np.where(valid, values, -1), starts))
+        n_pairs = np.add.reduceat(pair, starts)
+        d_lo = np.minimum.reduceat(np.where(pair, delta, field.modulus), starts)
+        d_hi = np.maximum.reduceat(np.where(pair, delta, -1), starts)
+        return all_valid & ~constant & (n_pairs >= self.min_support) & (d_lo == d_hi), d_lo
+
+    def _byte_terms(self, columns: FieldColumns, field: Field, order: np.ndarray, starts: np.ndarray,
+                    sizes: np.ndarray, mask: np.ndarray, terms: List[List[Predicate]]) -> None:
+        values, valid = columns.value(field)
+        values, valid = values[order], valid[order]
+        mask = mask & (np.add.reduceat(valid, starts) == sizes)         # 所有消息都带有该字节
+        if not mask.any():
+            return
+        lo = np.minimum.reduceat(values, starts)
+        hi = np.maximum.reduceat(values, starts)
+
+        # 每个分组的不同取值数: (分组, 取值) 去重后按分组计数
+        group = np.repeat(np.arange(len(starts)), sizes)
+        pairs = np.unique(group * 256 + values)
+        n_values = np.bincount(pairs // 256, minlength=len(starts))
+
+        bounds = np.searchsorted(pairs, np.arange(len(starts) + 1) * 256)
+
+        for g in np.flatnonzero(mask).tolist():
+            if lo[g] == hi[g]:
+                terms[g].append(FieldEquals(field, int(lo[g])))
+            elif n_values[g] <= self.max_values:
+                seen = pairs[bounds[g]:bounds[g + 1]] - g * 256
+                terms[g].append(FieldIn(field, tuple(seen.tolist())))
+            elif hi[g] - lo[g] < 255:
+                terms[g].append(FieldRange(field, int(lo[g]), int(hi[g])))
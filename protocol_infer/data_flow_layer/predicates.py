@@ -0,0 +1,215 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, Tuple
+import numpy as np
+from protocol_infer.data_flow_layer.fields import Field, FieldColumns
+
+
+class Predicate(ABC):
+    '''
+        可序列化的 guard
+
+        __call__(vars) 判断单条消息 (vars["payload"] 为负载, 其余键为寄存器),
+        evaluate(columns) 对一批消息做向量化判断, 寄存器取 FieldColumns.previous.
+    '''
+    kind: ClassVar[str]
+
+    @abstractmethod
+    def __call__(self, vars: Dict[str, Any]) -> bool:
+        pass
+
+    @abstractmethod
+    def evaluate(self, columns: FieldColumns) -> np.ndarray:
+        pass
+
+    @property
+    def span(self) -> int:
+        '''
+            evaluate 需要的负载前缀字节数
+        '''
+        return 0
+
+    @abstractmethod
+    def to_dict(self) -> Dict[str, Any]:
+        pass
+
+
+@dataclass(frozen=True)
+class FieldEquals(Predicate):
+    kind: ClassVar[str] = "field_equals"
+    field: Field
+    value: int
+
+    def __call__(self, vars):
+        return self.field.read(vars["payload"]) == self.value
+
+    def evaluate(self, columns):
+        values, valid = columns.value(self.field)
+        return valid & (values == self.value)
+
+    @property
+    def span(self):
+        return self.field.end
+
+    def to_dict(self):
+        return {"type": self.kind, "field": self.field.to_dict(), "value": self.value}
+
+
+@dataclass(frozen=True)
+class FieldIn(Predicate):
+    kind: ClassVar[str] = "field_in"
+    field: Field
+    values: Tuple[int, ...]
+
+    def __call__(self, vars):
+        return self.field.read(vars["payload"]) in self.values
+
+    def evaluate(self, columns):
+        values, valid = columns.value(self.field)
+        return valid & np.isin(values, self.values)
+
+    @property
+    def span(self):
+        return self.field.end
+
+    def to_dict(self):
+        return {"type": self.kind, "field": self.field.to_dict(), "values": list(self.values)}
+
+
+@dataclass(frozen=True)
+class FieldRange(Predicate):
+    kind: ClassVar[str] = "field_range"
+    field: Field
+    lo: int
+    hi: int
+
+    def __call__(self, vars):
+        value = self.field.read(vars["payload"])
+        return value is not None and self.lo <= value <= self.hi
+
+    def evaluate(self, columns):
+        values, valid = columns.value(self.field)
+        return valid & (values >= self.lo) & (values <= self.hi)
+
+    @property
+    def span(self):
+        return self.field.end
+
+    def to_dict(self):
+        return {"type": self.kind, "field": self.field.to_dict(), "lo": self.lo, "hi": self.hi}
+
+
+@dataclass(frozen=True)
+class LengthRange(Predicate):
+    kind: ClassVar[str] = "length_range"
+    lo: int
+    hi: int
+
+    def __call__(self, vars):
+        return self.lo <= len(vars["payload"]) <= self.hi
+
+    def evaluate(self, columns):
+        return (columns.lengths >= self.lo) & (columns.lengths <= self.hi)
+
+    def to_dict(self):
+        return {"type": self.kind, "lo": self.lo, "hi": self.hi}
+
+
+@dataclass(frozen=True)
+class FieldDelta(Predicate):
+    '''
+        字段值 = 寄存器中同一字段上一次的值 + delta (按字段宽度取模), 例如递增的事务号;
+        会话中还没有出现过该字段 (寄存器为空) 时成立
+    '''
+    kind: ClassVar[str] = "field_delta"
+    field: Field
+    delta: int
+
+    def __call__(self, vars):
+        value = self.field.read(vars["payload"])
+        if value is None:
+            return False
+        last = vars.get(self.field.name)
+        return last is None or (value - last) % self.field.modulus == self.delta
+
+    def evaluate(self, columns):
+        values, valid = columns.value(self.field)
+        last, has_last = columns.previous(self.field)
+        return valid & (~has_last | ((values - last) % self.field.modulus == self.delta))
+
+    @property
+    def span(self):
+        return self.field.end
+
+    def to_dict(self):
+        return {"type": self.kind, "field": self.field.to_dict(), "delta": self.delta}
+
+
+@dataclass(frozen=True)
+class And(Predicate):
+    kind: ClassVar[str] = "and"
+    terms: Tuple[Predicate, ...]
+
+    def __call__(self, vars):
+        return all(term(vars) for term in self.terms)
+
+    def evaluate(self, columns):
+        result = np.ones(len(columns), dtype=bool)
+        for term in self.terms:
+            result &= term.evaluate(columns)
+        return result
+
+    @property
+    def span(self):
+        return max((term.span for term in self.terms), default=0)
+
+    def to_dict(self):
+        return {"type": self.kind, "terms": [term.to_dict() for term in self.terms]}
+
+
+@dataclass(frozen=True)
+class StoreFields:
+    '''
+        action: 把消息中出现的字段写入同名寄存器, 负载中没有的字段保持原值
+    '''
+    kind: ClassVar[str] = "store_fields"
+    fields: Tuple[Field, ...]
+
+    def __call__(self, vars: Dict[str, Any]) -> Dict[str, Any]:
+        new_vars = dict(vars)
+        for field in self.fields:
+            value = field.read(vars["payload"])
+            if value is not None:
+                new_vars[field.name] = value
+        return new_vars
+
+    @property
+    def registers(self) -> Tuple[str, ...]:
+        return tuple(field.name for field in self.fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.kind, "fields": [field.to_dict() for field in self.fields]}
+
+
+def from_dict(data: Dict[str, Any]) -> Any:
+    '''
+        to_dict 的逆操作, 适用于所有谓词与 StoreFields
+    '''
+    kind = data["type"]
+    if kind == "and":
+        return And(tuple(from_dict(term) for term in data["terms"]))
+    if kind == "length_range":
+        return LengthRange(data["lo"], data["hi"])
+    if kind == "store_fields":
+        return StoreFields(tuple(Field.from_dict(f) for f in data["fields"]))
+
+    field = Field.from_dict(data["field"])
+    if kind == "field_equals":
+        return FieldEquals(field, data["value"])
+    if kind == "field_in":
+        return FieldIn(field, tuple(data["values"]))
+    if kind == "field_range":
+        return FieldRange(field, data["lo"], data["hi"])
+    if kind == "field_delta":
+        return FieldDelta(field, data["delta"])
+    raise ValueError(f"unknown predicate type: {kind}")
@@ -0,0 +1,142 @@
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Tuple
+import numpy as np
+from protocol_infer.core.model.compiled import CompiledFSM
+from protocol_infer.core.model.fsm import FSM
+
+
+@dataclass
+class ConformanceReport:
+    '''
+        一批序列的检查结果, 每个数组的第 i 项对应第 i 条序列
+    '''
+    lengths: np.ndarray
+    accepted: np.ndarray            # 能完整重放 (require_end 时还需停在结束状态)
+    deviation: np.ndarray           # 第一个不符合模型的位置, 接受的序列为 -1; 未停在结束状态时为序列长度
+    final_state: np.ndarray         # 结束时的状态编号 (原 FSM 中的编号), 拒绝的序列为 -1
+    log_likelihood: np.ndarray      # 接受的序列: sum log P(转移) + log P(end); 拒绝为 -inf, 缺少概率为 NaN
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def n_messages(self) -> int:
+        return int(self.lengths.sum())
+
+    @property
+    def acceptance_rate(self) -> float:
+        return float(self.accepted.mean()) if len(self) else 1.0
+
+
+class ConformanceChecker:
+    '''
+        在推断的 FSM 上批量检查符号序列
+
+        FSM 编译为 CompiledFSM 的稠密 (状态 x 符号) 转移表, 一批序列按位置同时查表,
+        每一步是一次向量化索引, 不在 Python 中逐条消息遍历 next_states.
+        对数似然由 Transition.prob / FSMState.end_prob 预先算成两张表, 按路径求和.
+
+        非确定 FSM 按状态集合重放 (CompiledFSM.replay), 被拒绝序列的 deviation 为
+        最长可行前缀的长度, 与 OnlineDetector 报告 no_transition 的位置一致.
+
+        限制: 稠密表只保存每个 (状态, 符号) 编号最小的转移, 只有确定 FSM (compiled.deterministic)
+        能保证全部走快速路径. K-tails 合并后的 FSM 通常是非确定的, 按表走不完的序列
+        (在 K-tails 结果上往往是大多数) 要做状态集合重放, 每一步的代价与转移数成正比,
+        吞吐量比确定 FSM 低一个数量级以上 (实测约 2 万条消息/秒).
+        这里不做确定化, 因为子集构造会改变报告中的状态编号和按路径计算的对数似然;
+        需要高吞吐时应在推断阶段得到确定模型.
+    '''
+
+    def __init__(self, fsm: FSM, require_end: bool = False):
+        self.fsm = fsm
+        self.require_end = require_end
+        self.compiled = CompiledFSM(fsm)
+
+        # 没有估计概率的转移 / 状态记为 NaN
+        prob = np.array([np.nan if t.prob is None else t.prob for t in fsm.transitions], dtype=np.float64)
+        end_prob = np.array([np.nan if fsm.states[sid].end_prob is None else fsm.states[sid].end_prob
+                             for sid in self.compiled.state_ids.tolist()], dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            self.trans_logp = np.log(prob)
+            self.end_logp = np.log(end_prob)
+        is_end = np.zeros(self.compiled.n_states, dtype=bool)
+        is_end[self.compiled.index[fsm.end_states()]] = True
+        self.is_end = is_end
+
+    def check(self, sequences: Iterable[Sequence[str]]) -> ConformanceReport:
+        flat, lengths = self.compiled.encode(sequences)
+        return self.check_encoded(flat, lengths)
+
+    def check_encoded(self, flat: np.ndarray, lengths: np.ndarray) -> ConformanceReport:
+        '''
+            flat / lengths 为 CompiledFSM.encode 的输出, 重复检查同一批数据时可以只编码一次
+        '''
+        compiled = self.compiled
+        path, final, depth = compiled.replay(flat, lengths, return_depth=True)
+        n_seq = len(lengths)
+        seq = np.repeat(np.arange(n_seq), lengths)
+
+        # 第一个偏离位置: 可能所在的状态集合变空之前消耗的符号数 (起始状态不存在时为 0)
+        accepted = final >= 0
+        deviation = np.where(accepted, -1, depth)
+
+        if self.require_end:
+            unfinished = accepted.copy()
+            unfinished[accepted] = ~self.is_end[final[accepted]]
+            deviation[unfinished] = lengths[unfinished]
+            accepted &= ~unfinished
+
+        # 整批都没有经过转移时 bincount 返回整数数组, 统一为 float64
+        taken = path >= 0
+        loglik = np.bincount(seq[taken], weights=self.trans_logp[path[taken]], minlength=n_seq).astype(np.float64)
+        if accepted.any():
+            loglik[accepted] += self.end_logp[final[accepted]]
+        loglik[~accepted] = -np.inf
+
+        final_state = np.full(n_seq, -1, dtype=np.int64)
+        final_state[accepted] = compiled.state_ids[final[accepted]]
+        return ConformanceReport(lengths, accepted, deviation, final_state, loglik)
+
+    # ---------------- 吞吐量 ----------------
+
+    def random_walks(self, n: int, length: int, seed: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+            从起始状态出发随机游走生成 n 条编码后的序列, 遇到没有出边的状态提前结束; 用于压测
+
+            每一步在当前状态的所有出边中均匀选择一条 (非确定 FSM 中同一符号的多条转移都会被走到),
+            因此生成的序列都能被模型接受.
+        '''
+        compiled = self.compiled
+        rng = np.random.default_rng(seed)
+        # 按源状态分组的转移: 状态 s 的出边为 by_src[ptr[s]:ptr[s + 1]]
+        by_src = np.argsort(compiled.trans_src, kind="stable")
+        ptr = np.searchsorted(compiled.trans_src[by_src], np.arange(compiled.n_states + 1))
+        n_options = np.diff(ptr)
+
+        symbols = np.zeros((n, length), dtype=np.int64)
+        lengths = np.zeros(n, dtype=np.int64)
+        cur = np.full(n, compiled.start, dtype=np.int64)
+        alive = np.full(n, compiled.start >= 0)
+        for t in range(length):
+            alive &= n_options[np.maximum(cur, 0)] > 0
+            idx = np.flatnonzero(alive)
+            if len(idx) == 0:
+                break
+            pick = (rng.random(len(idx)) * n_options[cur[idx]]).astype(np.int64)
+            tid = by_src[ptr[cur[idx]] + pick]
+            symbols[idx, t] = compiled.trans_sym[tid]
+            cur[idx] = compiled.trans_dst[tid]
+            lengths[idx] += 1
+        return symbols[np.arange(length)[None, :] < lengths[:, None]], lengths
+
+    def throughput(self, flat: np.ndarray, lengths: np.ndarray, repeat: int = 3) -> float:
+        '''
+            check_encoded 的吞吐量 (消息 / 秒), 取 repeat 次中最快的一次
+        '''
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            self.check_encoded(flat, lengths)
+            best = min(best, time.perf_counter() - start)
+        return len(flat) / best if best > 0 else np.inf
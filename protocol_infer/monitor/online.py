@@ -0,0 +1,224 @@
+import copy
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from protocol_infer.control_flow_layer.features.control_feature_extraction import ControlFeatureExtraction
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.event import Direction
+from protocol_infer.core.datamodel.raw_packet import Rawpacket
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.interface.feature_extractor import FeatureExtractor
+from protocol_infer.core.interface.message_abstraction import MessageAbstractor
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.monitor.conformance import ConformanceChecker
+from protocol_infer.pcap_layer.session.flow_key import FlowKeyer
+from protocol_infer.probabilistic_layer.timing.delay_stats import DelayTable, LogBins
+
+DEVIATION_KINDS = ("unknown_symbol", "no_transition", "low_probability")
+
+
+@dataclass
+class DeviationEvent:
+    session_key: SessionKey
+    timestamp: float                # 报文时间戳
+    index: int                      # 消息在流中的序号, 从 0 开始
+    symbol: str
+    kind: str                       # DEVIATION_KINDS 之一
+    states: Tuple[int, ...]         # 收到该消息前所在的状态 (原 FSM 中的编号)
+    prob: Optional[float]           # 经过的转移的概率, 没有转移或没有估计时为 None
+    latency: float                  # 从取到报文到检查完成的耗时 (秒)
+
+
+class _Flow:
+    __slots__ = ("key", "client", "states", "index", "last_seen", "deviated")
+
+    def __init__(self, key: SessionKey, start: int):
+        self.key = key
+        self.client = (key.ip1, key.port1)
+        self.states: Tuple[int, ...] = (start,) if start >= 0 else ()
+        self.index = 0
+        self.last_seen = float("nan")
+        self.deviated = False
+
+
+class OnlineDetector:
+    '''
+        在线异常检测: 逐个报文消费, 按流维护模型中的当前状态并输出偏离事件
+
+        - 报文按五元组归入流 (FlowKeyer, 与训练时的 FiveTupleBuilder 相同), 一个报文是一条消息,
+          与 PacketLevelSegmenter 的分段方式一致
+        - 消息用冻结的特征提取器与符号化器转换为符号, 只预测不训练;
+          每 batch_size 条消息一起提取特征和预测, batch_size = 1 时延迟最低
+        - 每个流保存当前可能所在的状态集合, 非确定的 FSM (例如 K-tails 的合并结果) 按子集推进
+        - 偏离事件:
+            unknown_symbol   符号不在模型的字母表中 (包括 UNKNOWN)
+            no_transition    当前状态没有该符号的转移
+            low_probability  转移概率低于 min_prob (需要先用 TransitionProbTrainer 估计概率), 流继续推进
+          发生前两种偏离后流不再推进, 之后的消息只计数, 直到流超时或被淘汰后重新开始
+        - 内存有界: 同时跟踪至多 max_flows 个流 (LRU 淘汰),
+          超过 idle_timeout 秒 (按报文时间戳) 没有新报文的流被移除
+        - latency 为所有消息检查耗时的 DelayTable (只有一行), 可查询均值与分位数
+    '''
+
+    def __init__(self, fsm: FSM, featureer: FeatureExtractor, abstractor: MessageAbstractor,
+                 batch_size: int = 1, max_flows: int = 65536, idle_timeout: float = 120.0,
+                 min_prob: Optional[float] = None, bidirectional: bool = True):
+        if getattr(getattr(abstractor, "algorithm", None), "predict_updates_model", False):
+            raise ValueError("abstractor learns new symbols while predicting and cannot be frozen")
+        self.checker = ConformanceChecker(fsm)
+        self.featureer = featureer
+        self.abstractor = abstractor
+        self.batch_size = batch_size
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.min_prob = min_prob
+        self.keyer = FlowKeyer(bidirectional=bidirectional)
+
+        # (状态下标 * 宽度 + 符号编号) -> [(目标状态下标, 转移概率)]
+        compiled = self.checker.compiled
+        self._width = len(compiled.symbols) + 1
+        prob = np.exp(self.checker.trans_logp)
+        self._next: Dict[int, List[Tuple[int, float]]] = {}
+        for s, a, d, p in zip(compiled.trans_src.tolist(), compiled.trans_sym.tolist(),
+                              compiled.trans_dst.tolist(), prob.tolist()):
+            self._next.setdefault(s * self._width + a, []).append((d, p))
+
+        self.flows: "OrderedDict[int, _Flow]" = OrderedDict()     # 流标识 -> 流, 按最近活跃排序
+        self.latency = DelayTable(1, LogBins(min_delay=1e-7, max_delay=10.0))
+        self.n_messages = 0
+        self.n_deviations = 0
+        self.n_evicted = 0
+
+    @classmethod
+    def from_pipeline(cls, pipeline, fsm: FSM, **kwargs) -> "OnlineDetector":
+        '''
+            使用训练好的 ControlFlowPipeline 的特征提取器与符号化器 (深拷贝, 之后重新训练 pipeline 不影响检测)
+        '''
+        return cls(fsm, copy.deepcopy(pipeline.featureer), copy.deepcopy(pipeline.abstractor), **kwargs)
+
+    def process(self, packets: Iterable[Rawpacket]) -> Iterator[DeviationEvent]:
+        '''
+            packets 可以是 NativePCAPParser.follow 这样不会结束的生成器, 事件按消息顺序产生
+        '''
+        batch: List[Rawpacket] = []
+        arrivals: List[float] = []
+        for pkt in packets:
+            batch.append(pkt)
+            arrivals.append(time.perf_counter())
+            if len(batch) >= self.batch_size:
+                yield from self.feed(batch, arrivals)
+                batch, arrivals = [], []
+        if batch:
+            yield from self.feed(batch, arrivals)
+
+    def feed(self, packets: Sequence[Rawpacket], arrivals: Optional[Sequence[float]] = None) -> List[DeviationEvent]:
+        '''
+            检查一批报文; arrivals 为各报文被取到的时刻 (time.perf_counter), 默认为调用时刻
+        '''
+        if arrivals is None:
+            arrivals = [time.perf_counter()] * len(packets)
+        if not packets:
+            return []
+
+        flows = [self._flow(pkt) for pkt in packets]
+        symbols = self._symbolize(packets, flows)
+
+        events = []
+        latencies = np.zeros(len(packets))
+        for i, (pkt, flow, symbol) in enumerate(zip(packets, flows, symbols)):
+            event = self._step(flow, symbol, pkt.timestamp)
+            flow.last_seen = pkt.timestamp
+            flow.index += 1
+            latencies[i] = time.perf_counter() - arrivals[i]
+            if event is not None:
+                event.latency = latencies[i]
+                events.append(event)
+
+        self.latency.update(np.zeros(len(packets), dtype=np.int64), latencies)
+        self.n_messages += len(packets)
+        self.n_deviations += len(events)
+        return events
+
+    # ---------------- 流 ----------------
+
+    def _flow(self, pkt: Rawpacket) -> _Flow:
+        flows = self.flows
+        while flows:
+            oldest = next(iter(flows.values()))
+            if not pkt.timestamp - oldest.last_seen > self.idle_timeout:
+                break
+            flows.popitem(last=False)
+
+        fid = self.keyer.flow_id(pkt)
+        flow = flows.get(fid)
+        if flow is not None:
+            flows.move_to_end(fid)
+            return flow
+        if len(flows) >= self.max_flows:
+            flows.popitem(last=False)
+            self.n_evicted += 1
+        flow = flows[fid] = _Flow(self.keyer.session_key(pkt), self.checker.compiled.start)
+        return flow
+
+    def _symbolize(self, packets: Sequence[Rawpacket], flows: List[_Flow]) -> List[str]:
+        # 一批报文组成一个小的 ColumnarTrace, 会话编号为批内编号
+        local: Dict[int, int] = {}
+        session_ids = np.fromiter((local.setdefault(id(f), len(local)) for f in flows),
+                                  dtype=np.int32, count=len(flows))
+        keys = [None] * len(local)
+        previous = np.full(len(local), np.nan)
+        for f in flows:
+            sid = local[id(f)]
+            if keys[sid] is None:
+                keys[sid], previous[sid] = f.key, f.last_seen
+
+        directions = np.fromiter(
+            (Direction.C2S.value if (p.src_ip, p.src_port) == f.client else Direction.S2C.value
+             for p, f in zip(packets, flows)), dtype=np.int8, count=len(packets))
+        lengths = np.fromiter((len(p.payload) for p in packets), dtype=np.int32, count=len(packets))
+        offsets = np.zeros(len(packets), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        timestamps = np.fromiter((p.timestamp for p in packets), dtype=np.float64, count=len(packets))
+        trace = ColumnarTrace(timestamps, session_ids, directions, offsets, lengths,
+                              b"".join(bytes(p.payload) for p in packets), keys)
+
+        if isinstance(self.featureer, ControlFeatureExtraction):
+            features = self.featureer.extract_batch(trace, previous)
+        else:
+            features = self.featureer.extract_batch(trace)
+        return self.abstractor.abstract_batch(features)
+
+    # ---------------- 模型 ----------------
+
+    def _step(self, flow: _Flow, symbol: str, timestamp: float) -> Optional[DeviationEvent]:
+        if flow.deviated:
+            return None
+        compiled = self.checker.compiled
+        sym = compiled.symbol_ids.get(symbol)
+        kind, prob = None, None
+
+        if sym is None:
+            kind = "unknown_symbol"
+        else:
+            targets = set()
+            for s in flow.states:
+                for dst, p in self._next.get(s * self._width + sym, ()):
+                    targets.add(dst)
+                    if p == p and (prob is None or p > prob):
+                        prob = p
+            if not targets:
+                kind = "no_transition"
+            elif self.min_prob is not None and prob is not None and prob < self.min_prob:
+                kind = "low_probability"
+
+        event = None
+        if kind is not None:
+            event = DeviationEvent(flow.key, timestamp, flow.index, symbol, kind,
+                                   tuple(compiled.state_ids[list(flow.states)].tolist()), prob, 0.0)
+        if kind in ("unknown_symbol", "no_transition"):
+            flow.deviated = True
+        else:
+            flow.states = tuple(sorted(targets))
+        return event
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import List, Optional, Tuple, Union
+import numpy as np
+from protocol_infer.core.datamodel.trace import Trace
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.session import SessionKey
+
+CACHE_FORMAT = 1                    # 存储格式变化时递增, 旧条目自动失效
+
+_COLUMNS = (
+    ("timestamps", np.float64),
+    ("session_ids", np.int32),
+    ("directions", np.int8),
+    ("offsets", np.int64),
+    ("lengths", np.int32),
+)
+
+
+def default_cache_dir() -> str:
+    return os.path.join(os.path.expanduser("~"), ".cache", "protocol_infer", "traces")
+
+
+class TraceCache:
+    '''
+        解析结果的磁盘缓存, 以内容寻址
+
+        键 = sha256(pcap 文件内容 + 解析器/会话构建器/分段器的配置 + 存储格式版本).
+        每个条目是一个目录:
+            timestamps.npy / session_ids.npy / directions.npy / offsets.npy / lengths.npy
+            payload.bin         所有负载拼接而成
+            session_keys.json
+        读取时各列和负载都以内存映射方式打开, 不把整个 trace 读入内存.
+
+        淘汰策略 (put 之后执行, 也可以手动调用 evict):
+            max_age:   超过该秒数未被访问的条目删除
+            max_bytes: 总大小超过上限时, 按最近访问时间从旧到新删除
+    '''
+
+    def __init__(self, root: Optional[str] = None,
+                 max_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        self.root = root if root is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---------------- 键 ----------------
+
+    def key(self, pcap_path: str, pipeline) -> str:
+        h = hashlib.sha256()
+        with open(pcap_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        h.update(config_fingerprint(pipeline).encode())
+        h.update(str(CACHE_FORMAT).encode())
+        return h.hexdigest()
+
+    # ---------------- 读写 ----------------
+
+    def load_or_parse(self, pcap_path: str, pipeline) -> Union[Trace, ColumnarTrace]:
+        '''
+            命中缓存时直接返回内存映射的 trace, 否则调用 pipeline.run 解析并写入缓存
+        '''
+        key = self.key(pcap_path, pipeline)
+        trace = self.get(key)
+        if trace is None:
+            trace = ColumnarTrace.from_trace(pipeline.run(pcap_path))
+            self.put(key, trace)
+            cached = self.get(key)
+            if cached is not None:
+                trace = cached
+        return trace if pipeline.columnar else trace.to_trace()
+
+    def get(self, key: str) -> Optional[ColumnarTrace]:
+        path = self._path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            columns = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name, _ in _COLUMNS]
+            payload_file = os.path.join(path, "payload.bin")
+            if os.path.getsize(payload_file):
+                payload = memoryview(np.memmap(payload_file, dtype=np.uint8, mode="r"))
+            else:
+                payload = b""                       # 长度为 0 的文件不能 mmap
+            with open(os.path.join(path, "session_keys.json")) as f:
+                keys = [SessionKey(*row) for row in json.load(f)]
+        except (OSError, ValueError):
+            # 条目不完整 (例如写入时被中断), 删除后按未命中处理
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+
+        os.utime(path)                              # 记录访问时间, 供淘汰使用
+        return ColumnarTrace(*columns, payload, keys)
+
+    def put(self, key: str, trace: ColumnarTrace) -> None:
+        path = self._path(key)
+        if os.path.isdir(path):
+            return
+
+        # 先写入临时目录再整体改名, 其他进程不会读到写了一半的条目
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.root)
+        try:
+            for name, dtype in _COLUMNS:
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(trace, name), dtype=dtype))
+            with open(os.path.join(tmp, "payload.bin"), "wb") as f:
+                f.write(trace.payload)
+            with open(os.path.join(tmp, "session_keys.json"), "w") as f:
+                json.dump([[k.ip1, k.port1, k.ip2, k.port2, k.protocol] for k in trace.session_keys], f)
+            os.replace(tmp, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict()
+
+    # ---------------- 淘汰 ----------------
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        '''
+            (键, 字节数, 最近访问时间), 按访问时间从旧到新排列
+        '''
+        result = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            result.append((name, size, os.stat(path).st_mtime))
+        result.sort(key=lambda e: e[2])
+        return result
+
+    def evict(self) -> List[str]:
+        '''
+            按 max_age / max_bytes 删除条目, 返回被删除的键
+        '''
+        entries = self.entries()
+        removed = []
+        if self.max_age is not None:
+            deadline = time.time() - self.max_age
+            removed += [key for key, _, atime in entries if atime < deadline]
+            entries = [e for e in entries if e[2] >= deadline]
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in entries)
+            for key, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                removed.append(key)
+                total -= size
+
+        for key in removed:
+            shutil.rmtree(self._path(key), ignore_errors=True)
+        return removed
+
+    def clear(self) -> None:
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+
+def config_fingerprint(obj, depth: int = 4) -> str:
+    '''
+        对象配置的稳定文本描述: 类名 + 各属性 (递归), 用于区分不同的解析/分段参数
+    '''
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes)):
+        return repr(obj)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = [config_fingerprint(x, depth) for x in obj]
+        if isinstance(obj, (set, frozenset)):
+            items.sort()
+        return f"[{','.join(items)}]"
+    if isinstance(obj, dict):
+        items = sorted(f"{config_fingerprint(k, depth)}:{config_fingerprint(v, depth)}" for k, v in obj.items())
+        return f"{{{','.join(items)}}}"
+
+    cls = type(obj)
+    name = f"{cls.__module__}.{cls.__qualname__}"
+    if depth == 0 or not hasattr(obj, "__dict__") or callable(obj):
+        return name
+    attrs = ",".join(f"{k}={config_fingerprint(v, depth - 1)}" for k, v in sorted(vars(obj).items())
+                     if not k.startswith("_"))             # 下划线属性是运行时状态 (缓存等), 不属于配置
+    return f"{name}({attrs})"
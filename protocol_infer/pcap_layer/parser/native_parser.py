@@ -0,0 +1,386 @@
+import mmap
+import socket
+import struct
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from protocol_infer.core.interface.pcap_analysis import PCAPParser
+from protocol_infer.core.datamodel.raw_packet import Rawpacket
+
+
+# pcap 文件头 magic -> (字节序, 时间戳分母)
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1_000_000),
+    b"\xa1\xb2\xc3\xd4": (">", 1_000_000),
+    b"\x4d\x3c\xb2\xa1": ("<", 1_000_000_000),
+    b"\xa1\xb2\x3c\x4d": (">", 1_000_000_000),
+}
+_PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+_PCAPNG_BOM_LE = b"\x4d\x3c\x2b\x1a"
+
+# 能够直接解码的链路类型
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+_LINKTYPE_RAW_ALIASES = (12, 14, LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6)
+
+_ETH_IPV4 = 0x0800
+_ETH_IPV6 = 0x86DD
+_ETH_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# BSD loopback 的地址族取值(不同系统 AF_INET6 不同)
+_AF_INET = 2
+_AF_INET6 = (10, 24, 28, 30)
+
+# IPv6 扩展头: hop-by-hop, routing, fragment, AH, destination options
+_IPV6_EXT = (0, 43, 44, 51, 60)
+
+_IP_TCP = 6
+_IP_UDP = 17
+
+Decoder = Callable[[bytes, int, int, float], Optional[Rawpacket]]
+
+
+class NativePCAPParser(PCAPParser):
+    '''
+        直接读取 pcap / pcapng 记录头的解析器
+
+        文件通过 mmap 映射, 逐条记录用 struct 解码 Ethernet/VLAN/SLL/IPv4/IPv6/TCP/UDP 头部,
+        惰性 yield Rawpacket, 内存占用与文件大小无关.
+        无法直接解码的链路类型(以及 gzip 等非 pcap/pcapng 文件)回退到 Scapy.
+    '''
+
+    def __init__(self):
+        self._ip_cache: Dict[bytes, str] = {}      # 原始地址 -> 点分字符串, 同一地址只格式化一次
+
+    def parse(self, path: str) -> Iterable[Rawpacket]:
+        with open(path, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:      # 空文件无法映射
+                return
+
+        try:
+            magic = mm[:4]
+            if magic in _PCAP_MAGIC and len(mm) >= 24:
+                endian, tsdiv = _PCAP_MAGIC[magic]
+                yield from self._parse_pcap(mm, endian, tsdiv)
+            elif magic == _PCAPNG_SHB:
+                yield from self._parse_pcapng(mm)
+            else:
+                # 非原生格式(例如 gzip 压缩的 pcap)整体交给 scapy
+                from protocol_infer.pcap_layer.parser.scapy_parser import ScapyParser
+                yield from ScapyParser().parse(path)
+        finally:
+            mm.close()
+
+    def follow(self, path: str, poll_interval: float = 0.1,
+               idle_timeout: Optional[float] = None) -> Iterator[Rawpacket]:
+        '''
+            跟随一个仍在写入的 pcap 文件 (类似 tail -f), 新追加的完整记录解码后立即 yield
+
+            只支持经典 pcap 格式 (pcapng 的块结构需要整体解析接口描述, 不做增量读取).
+            文件在 idle_timeout 秒内没有增长时结束, None 表示一直等待.
+        '''
+        buf = bytearray()
+        decode = unpack = None
+        tsdiv = 1
+        idle_since = time.monotonic()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if chunk:
+                    buf += chunk
+                    idle_since = time.monotonic()
+
+                if decode is None and len(buf) >= 24:
+                    magic = bytes(buf[:4])
+                    if magic not in _PCAP_MAGIC:
+                        raise ValueError(f"{path}: follow only supports classic pcap files")
+                    endian, tsdiv = _PCAP_MAGIC[magic]
+                    decode = self._decoder(struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF)
+                    unpack = struct.Struct(endian + "IIII").unpack_from
+                    del buf[:24]
+
+                if decode is not None:
+                    off = 0
+                    while off + 16 <= len(buf):
+                        sec, frac, caplen, _ = unpack(buf, off)
+                        end = off + 16 + caplen
+                        if end > len(buf):          # 记录还没有写完
+                            break
+                        record = bytes(buf[off + 16:end])
+                        off = end
+                        pkt = decode(record, 0, len(record), sec + frac / tsdiv)
+                        if pkt is not None:
+                            yield pkt
+                    del buf[:off]
+
+                if not chunk:
+                    if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                        return
+                    time.sleep(poll_interval)
+
+    # ---------------- 文件格式 ----------------
+
+    def _parse_pcap(self, mm, endian: str, tsdiv: int) -> Iterable[Rawpacket]:
+        linktype = struct.unpack_from(endian + "I", mm, 20)[0] & 0x0FFFFFFF    # 高位为 FCS 信息
+        decode = self._decoder(linktype)
+
+        unpack = struct.Struct(endian + "IIII").unpack_from
+        size = len(mm)
+        off = 24
+        while off + 16 <= size:
+            sec, frac, caplen, _ = unpack(mm, off)
+            off += 16
+            end = off + caplen
+            if end > size:          # 最后一条记录被截断
+                break
+
+            pkt = decode(mm, off, end, sec + frac / tsdiv)
+            if pkt is not None:
+                yield pkt
+            off = end
+
+    def _parse_pcapng(self, mm) -> Iterable[Rawpacket]:
+        size = len(mm)
+        off = 0
+        endian = "<"
+        interfaces: List[Tuple[Decoder, int, int, int]] = []    # (decoder, 时间戳分母, 时间偏移, snaplen)
+
+        while off + 12 <= size:
+            if mm[off:off + 4] == _PCAPNG_SHB:
+                # 每个 section 可以有自己的字节序和接口列表
+                endian = "<" if mm[off + 8:off + 12] == _PCAPNG_BOM_LE else ">"
+                interfaces = []
+
+            btype, blen = struct.unpack_from(endian + "II", mm, off)
+            if blen < 12 or off + blen > size:
+                break
+            body = off + 8
+            block_end = off + blen - 4
+
+            if btype == 1:          # Interface Description Block
+                linktype, _, snaplen = struct.unpack_from(endian + "HHI", mm, body)
+                tsdiv, tsoffset = self._idb_options(mm, body + 8, block_end, endian)
+                interfaces.append((self._decoder(linktype), tsdiv, tsoffset, snaplen))
+
+            elif btype == 6:        # Enhanced Packet Block
+                iface, ts_hi, ts_lo, caplen, _ = struct.unpack_from(endian + "IIIII", mm, body)
+                if iface < len(interfaces):
+                    decode, tsdiv, tsoffset, _ = interfaces[iface]
+                    data = body + 20
+                    ts = ((ts_hi << 32) | ts_lo) / tsdiv + tsoffset
+                    pkt = decode(mm, data, min(data + caplen, block_end), ts)
+                    if pkt is not None:
+                        yield pkt
+
+            elif btype == 3:        # Simple Packet Block, 没有时间戳
+                if interfaces:
+                    decode, _, _, snaplen = interfaces[0]
+                    (origlen,) = struct.unpack_from(endian + "I", mm, body)
+                    caplen = min(origlen, snaplen) if snaplen else origlen
+                    data = body + 4
+                    pkt = decode(mm, data, min(data + caplen, block_end), 0.0)
+                    if pkt is not None:
+                        yield pkt
+
+            elif btype == 2:        # 已废弃的 Packet Block
+                iface, _, ts_hi, ts_lo, caplen, _ = struct.unpack_from(endian + "HHIIII", mm, body)
+                if iface < len(interfaces):
+                    decode, tsdiv, tsoffset, _ = interfaces[iface]
+                    data = body + 20
+                    ts = ((ts_hi << 32) | ts_lo) / tsdiv + tsoffset
+                    pkt = decode(mm, data, min(data + caplen, block_end), ts)
+                    if pkt is not None:
+                        yield pkt
+
+            off += blen
+
+    @staticmethod
+    def _idb_options(mm, off: int, end: int, endian: str) -> Tuple[int, int]:
+        '''
+            解析 IDB 选项中的 if_tsresol / if_tsoffset
+        '''
+        tsdiv, tsoffset = 1_000_000, 0
+        while off + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", mm, off)
+            off += 4
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                resol = mm[off]
+                tsdiv = 2 ** (resol & 0x7F) if resol & 0x80 else 10 ** resol
+            elif code == 14 and length >= 8:
+                (tsoffset,) = struct.unpack_from(endian + "q", mm, off)
+            off += (length + 3) & ~3
+        return tsdiv, tsoffset
+
+    # ---------------- 链路层 ----------------
+
+    def _decoder(self, linktype: int) -> Decoder:
+        if linktype == LINKTYPE_ETHERNET:
+            return self._decode_ethernet
+        if linktype in _LINKTYPE_RAW_ALIASES:
+            return self._decode_ip
+        if linktype == LINKTYPE_LINUX_SLL:
+            return self._decode_sll
+        if linktype == LINKTYPE_LINUX_SLL2:
+            return self._decode_sll2
+        if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+            return self._decode_null
+
+        def fallback(buf, off, end, ts):
+            return self._decode_scapy(linktype, buf[off:end], ts)
+        return fallback
+
+    def _decode_ethernet(self, buf, off: int, end: int, ts: float) -> Optional[Rawpacket]:
+        if end - off < 14:
+            return None
+        etype = (buf[off + 12] << 8) | buf[off + 13]
+        off += 14
+        while etype in _ETH_VLAN:           # 802.1Q / QinQ
+            if end - off < 4:
+                return None
+            etype = (buf[off + 2] << 8) | buf[off + 3]
+            off += 4
+        return self._dispatch_ethertype(etype, buf, off, end, ts)
+
+    def _decode_sll(self, buf, off: int, end: int, ts: float) -> Optional[Rawpacket]:
+        if end - off < 16:
+            return None
+        etype = (buf[off + 14] << 8) | buf[off + 15]
+        return self._dispatch_ethertype(etype, buf, off + 16, end, ts)
+
+    def _decode_sll2(self, buf, off: int, end: int, ts: float) -> Optional[Rawpacket]:
+        if end - off < 20:
+            return None
+        etype = (buf[off] << 8) | buf[off + 1]
+        return self._dispatch_ethertype(etype, buf, off + 20, end, ts)
+
+    def _decode_null(self, buf, off: int, end: int, ts: float) -> Optional[Rawpacket]:
+        if end - off < 4:
+            return None
+        # 地址族以抓包主机字节序存放, 两端取非零的那个字节即可
+        family = buf[off] or buf[off + 3]
+        if family == _AF_INET or family in _AF_INET6:
+            return self._decode_ip(buf, off + 4, end, ts)
+        return None
+
+    def _dispatch_ethertype(self, etype: int, buf, off: int, end: int, ts: float) -> Optional[Rawpacket]:
+        if etype == _ETH_IPV4 or etype == _ETH_IPV6:
+            return self._decode_ip(buf, off, end, ts)
+        return None
+
+    # ---------------- 网络层 / 传输层 ----------------
+
+    def _decode_ip(self, buf, off: int, end: int, ts: float) -> Optional[Rawpacket]:
+        if end - off < 20:
+            return None
+
+        version = buf[off] >> 4
+        if version == 4:
+            ihl = (buf[off] & 0x0F) * 4
+            if ihl < 20 or end - off < ihl:
+                return None
+            if ((buf[off + 6] & 0x1F) << 8) | buf[off + 7]:
+                return None         # 非首分片不含传输层头
+            total_len = (buf[off + 2] << 8) | buf[off + 3]
+            if total_len >= ihl:
+                end = min(end, off + total_len)     # 去掉以太网填充
+            proto = buf[off + 9]
+            src = self._ipv4(buf[off + 12:off + 16])
+            dst = self._ipv4(buf[off + 16:off + 20])
+            l4 = off + ihl
+
+        elif version == 6:
+            if end - off < 40:
+                return None
+            payload_len = (buf[off + 4] << 8) | buf[off + 5]
+            proto = buf[off + 6]
+            src = self._ipv6(buf[off + 8:off + 24])
+            dst = self._ipv6(buf[off + 24:off + 40])
+            l4 = off + 40
+            if payload_len:         # 0 表示 jumbogram
+                end = min(end, l4 + payload_len)
+
+            while proto in _IPV6_EXT:
+                if end - l4 < 8:
+                    return None
+                next_proto = buf[l4]
+                if proto == 44:
+                    if (((buf[l4 + 2] << 8) | buf[l4 + 3]) >> 3):
+                        return None
+                    hlen = 8
+                elif proto == 51:
+                    hlen = (buf[l4 + 1] + 2) * 4
+                else:
+                    hlen = (buf[l4 + 1] + 1) * 8
+                proto = next_proto
+                l4 += hlen
+        else:
+            return None
+
+        if proto == _IP_TCP:
+            if end - l4 < 20:
+                return None
+            start = min(l4 + (buf[l4 + 12] >> 4) * 4, end)
+            flags = buf[l4 + 13]
+            seq = int.from_bytes(buf[l4 + 4:l4 + 8], "big")
+            prot = "TCP"
+        elif proto == _IP_UDP:
+            if end - l4 < 8:
+                return None
+            udp_len = (buf[l4 + 4] << 8) | buf[l4 + 5]
+            if 8 <= udp_len <= end - l4:
+                end = l4 + udp_len
+            start = l4 + 8
+            flags = 0
+            seq = 0
+            prot = "UDP"
+        else:
+            return None
+
+        return Rawpacket(
+            timestamp=ts,
+            src_ip=src,
+            src_port=(buf[l4] << 8) | buf[l4 + 1],
+            dst_ip=dst,
+            dst_port=(buf[l4 + 2] << 8) | buf[l4 + 3],
+            protocol=prot,
+            payload=buf[start:end],
+            tcp_flags=flags,
+            seq=seq
+        )
+
+    def _ipv4(self, raw: bytes) -> str:
+        ip = self._ip_cache.get(raw)
+        if ip is None:
+            ip = self._ip_cache[raw] = socket.inet_ntoa(raw)
+        return ip
+
+    def _ipv6(self, raw: bytes) -> str:
+        ip = self._ip_cache.get(raw)
+        if ip is None:
+            ip = self._ip_cache[raw] = socket.inet_ntop(socket.AF_INET6, raw)
+        return ip
+
+    @staticmethod
+    def _decode_scapy(linktype: int, data: bytes, ts: float) -> Optional[Rawpacket]:
+        '''
+            回退路径: 交给 scapy 按链路类型解析单个报文
+        '''
+        from scapy.all import conf
+        from protocol_infer.pcap_layer.parser.scapy_parser import packet_to_raw
+
+        cls = conf.l2types.get(linktype, conf.raw_layer)
+        try:
+            packet = cls(data)
+        except Exception:
+            return None
+        packet.time = ts
+        return packet_to_raw(packet)
@@ -1,38 +1,52 @@
-from typing import Iterable
+from typing import Iterable, Optional
 from protocol_infer.core.interface.pcap_analysis import PCAPParser
 from protocol_infer.core.datamodel.raw_packet import Rawpacket
-from scapy.all import rdpcap, PcapReader
+from scapy.all import PcapReader
 from scapy.layers.inet import IP, TCP, UDP, ICMP
 
+
+def packet_to_raw(packet) -> Optional[Rawpacket]:
+    '''
+        scapy packet -> Rawpacket, 非 IP/TCP/UDP 报文返回 None
+    '''
+    if IP not in packet:
+        return None
+
+    ip = packet[IP]
+
+    if TCP in packet:
+        l4 = packet[TCP]
+        prot = "TCP"
+        flags = int(l4.flags)
+        seq = l4.seq
+    elif UDP in packet:
+        l4 = packet[UDP]
+        prot = "UDP"
+        flags = 0
+        seq = 0
+    else:
+        return None
+
+    return Rawpacket(
+        timestamp=float(packet.time),
+        src_ip=ip.src,
+        src_port=l4.sport,
+        dst_ip=ip.dst,
+        dst_port=l4.dport,
+        protocol=prot,
+        payload=bytes(l4.payload),
+        tcp_flags=flags,
+        seq=seq
+    )
+
+
 class ScapyParser(PCAPParser):
-    
+
     def parse(self, path: str) -> Iterable:
-        
-        packets = rdpcap(path)      # 解析pcap文件
-
-        for packet in packets:
-            if IP not in packet:
-                continue
-
-            ip = packet[IP]
-
-            if TCP in packet:
-                l4 = packet[TCP]
-                prot = "TCP"
-            elif UDP in packet:
-                l4 = packet[UDP]
-                prot = "UDP"
-            else:
-                continue
-
-            yield Rawpacket(
-                timestamp=float(packet.time),
-                src_ip=ip.src,
-                src_port=l4.sport,
-                dst_ip=ip.dst,
-                dst_port=l4.dport,
-                protocol=prot,
-                payload=bytes(l4.payload)
-            )
-        
 
+        # PcapReader 逐包读取, 不再像 rdpcap 一样一次性载入整个文件
+        with PcapReader(path) as reader:
+            for packet in reader:
+                raw = packet_to_raw(packet)
+                if raw is not None:
+                    yield raw
@@ -1,19 +1,52 @@
-from typing import List
+import heapq
+import os
+import warnings
+from functools import partial
+from multiprocessing import Pool
+from typing import Iterable, List, Optional, Union
 from protocol_infer.core.datamodel.trace import Trace
-from protocol_infer.pcap_layer.parser.scapy_parser import ScapyParser
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace, ColumnarTraceBuilder
+from protocol_infer.core.interface.pcap_analysis import PCAPParser, Segmenter, SessionBuilder
+from protocol_infer.pcap_layer.parser.native_parser import NativePCAPParser
 from protocol_infer.pcap_layer.session.tuple5_builder import FiveTupleBuilder
 from protocol_infer.pcap_layer.segmentation.packet_level import PacketLevelSegmenter
 
 
+PCAP_SUFFIXES = (".pcap", ".pcapng", ".cap")
+
+
 class PCAPPipeline:
-    def run(self, pcap_path: str) -> Trace:
-        parser = ScapyParser()
-        session_builder = FiveTupleBuilder()
-        segmenter = PacketLevelSegmenter()
+    def __init__(self, parser: Optional[PCAPParser] = None,
+                 session_builder: Optional[SessionBuilder] = None,
+                 segmenter: Optional[Segmenter] = None,
+                 columnar: bool = True):
+        '''
+            parser: pcap 解析器, 默认使用 NativePCAPParser; 传入 ScapyParser() 可切回 scapy 解析
+            session_builder: 会话构建器, 默认 FiveTupleBuilder;
+                             StreamingFiveTupleBuilder 边读边输出会话, 内存只与并发流数量相关
+            segmenter: 分段器, 默认 PacketLevelSegmenter(一个报文一个事件);
+                       TCPReassemblySegmenter 重组 TCP 流并输出应用层消息
+            columnar: 输出 ColumnarTrace(列式存储, 默认); False 时输出由 MessageEvent 列表构成的 Trace
+        '''
+        self.parser = parser if parser is not None else NativePCAPParser()
+        self.session_builder = session_builder if session_builder is not None else FiveTupleBuilder()
+        self.segmenter = segmenter if segmenter is not None else PacketLevelSegmenter()
+        self.columnar = columnar
+
+    def run(self, pcap_path: str) -> Union[Trace, ColumnarTrace]:
+        parser = self.parser
+        session_builder = self.session_builder
+        segmenter = self.segmenter
 
         raw_packets = parser.parse(pcap_path)
         sessions = session_builder.build(raw_packets)
 
+        if self.columnar:
+            builder = ColumnarTraceBuilder()
+            for session in sessions:
+                builder.add_events(session.key, segmenter.segment(session))
+            return builder.build().sort_by_time()
+
         events = []
         for session in sessions:
             events.extend(segmenter.segment(session))
@@ -21,5 +54,65 @@ class PCAPPipeline:
         events.sort(key=lambda e: e.timestamp)
         return Trace(events=events)
 
-        
-        
\ No newline at end of file
+    def run_many(self, paths: Union[str, Iterable[str]],
+                 n_workers: Optional[int] = None,
+                 max_files_per_worker: Optional[int] = 1,
+                 skip_invalid: bool = False) -> Union[Trace, ColumnarTrace]:
+        '''
+            解析多个 pcap 文件并合并为一个 Trace
+
+            paths: 目录(取其中的 pcap/pcapng/cap 文件, 按文件名排序)或文件路径列表
+            n_workers: 进程数, 默认 CPU 核数; 为 1 时在当前进程串行处理
+            max_files_per_worker: 每个工作进程处理多少个文件后被替换, 用于限制单进程内存
+            skip_invalid: 跳过无法解析的文件(例如 git-lfs 指针), 否则抛出解析异常
+
+            每个文件在工作进程中独立完成 解析 -> 会话 -> 分段, 结果按时间戳归并;
+            时间戳相同的事件按文件顺序排列, 与逐个 run() 后拼接再稳定排序的结果一致
+        '''
+        files = self.collect_files(paths)
+        if not files:
+            return self._empty_trace()
+
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        n_workers = min(n_workers, len(files))
+
+        if n_workers <= 1:
+            per_file = [_run_file(self, skip_invalid, path) for path in files]
+        else:
+            with Pool(processes=n_workers, maxtasksperchild=max_files_per_worker) as pool:
+                per_file = pool.map(partial(_run_file, self, skip_invalid), files, chunksize=1)
+
+        if self.columnar:
+            # 按文件顺序拼接后稳定排序, 与串行结果一致
+            return ColumnarTrace.concat(per_file).sort_by_time()
+
+        # 各文件内部已按时间排序, heapq.merge 是稳定的 k 路归并
+        events = list(heapq.merge(*(t.events for t in per_file), key=lambda e: e.timestamp))
+        return Trace(events=events)
+
+    def _empty_trace(self) -> Union[Trace, ColumnarTrace]:
+        return ColumnarTraceBuilder().build() if self.columnar else Trace(events=[])
+
+    @staticmethod
+    def collect_files(paths: Union[str, Iterable[str]]) -> List[str]:
+        if isinstance(paths, (str, os.PathLike)):
+            path = os.fspath(paths)
+            if not os.path.isdir(path):
+                return [path]
+            return sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if name.lower().endswith(PCAP_SUFFIXES) and os.path.isfile(os.path.join(path, name))
+            )
+        return [os.fspath(p) for p in paths]
+
+
+def _run_file(pipeline: PCAPPipeline, skip_invalid: bool, path: str) -> Union[Trace, ColumnarTrace]:
+    # 工作进程入口, 需要是模块级函数才能被 pickle
+    try:
+        return pipeline.run(path)
+    except Exception as e:
+        if not skip_invalid:
+            raise
+        warnings.warn(f"skip {path}: {e}")
+        return pipeline._empty_trace()
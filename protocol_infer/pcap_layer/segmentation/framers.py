@@ -0,0 +1,103 @@
+from protocol_infer.core.interface.pcap_analysis import Framer
+
+
+class LengthPrefixedFramer(Framer):
+    '''
+        长度字段分帧: 消息总长 = length_offset + length_size + 长度字段值 + length_adjust
+
+        例如 Modbus/TCP MBAP 头: 事务号(2) 协议号(2) 长度(2), 长度字段统计其后的字节数
+            -> LengthPrefixedFramer(length_offset=4, length_size=2)
+    '''
+
+    def __init__(self, length_offset: int, length_size: int,
+                 length_adjust: int = 0, byteorder: str = "big",
+                 max_message: int = 1 << 16):
+        self.length_offset = length_offset
+        self.length_size = length_size
+        self.length_adjust = length_adjust
+        self.byteorder = byteorder
+        self.max_message = max_message
+
+    def frame(self, buffer: bytes) -> int:
+        header = self.length_offset + self.length_size
+        if len(buffer) < header:
+            return 0
+
+        value = int.from_bytes(buffer[self.length_offset:header], self.byteorder)
+        total = header + value + self.length_adjust
+        if total <= 0 or total > self.max_message:
+            return -1
+        return total if len(buffer) >= total else 0
+
+
+class DelimiterFramer(Framer):
+    '''
+        分隔符分帧, 消息以 delimiter 结尾(包含分隔符本身)
+    '''
+
+    def __init__(self, delimiter: bytes = b"\r\n"):
+        self.delimiter = delimiter
+
+    def frame(self, buffer: bytes) -> int:
+        pos = buffer.find(self.delimiter)
+        return 0 if pos < 0 else pos + len(self.delimiter)
+
+
+class HTTPFramer(Framer):
+    '''
+        HTTP/1.x: 头部以空行结束, 之后按 Content-Length 取消息体;
+        chunked 编码以 "0\\r\\n\\r\\n" 结束
+    '''
+
+    _HEADER_END = b"\r\n\r\n"
+    _CHUNKED_END = b"0\r\n\r\n"
+
+    def frame(self, buffer: bytes) -> int:
+        pos = buffer.find(self._HEADER_END)
+        if pos < 0:
+            return 0
+        header_len = pos + len(self._HEADER_END)
+        headers = bytes(buffer[:pos]).lower()
+
+        if b"transfer-encoding: chunked" in headers:
+            end = buffer.find(self._CHUNKED_END, header_len)
+            return 0 if end < 0 else end + len(self._CHUNKED_END)
+
+        marker = headers.find(b"content-length:")
+        if marker < 0:
+            return header_len
+        line_end = headers.find(b"\r\n", marker)
+        value = headers[marker + len(b"content-length:"):line_end if line_end >= 0 else None]
+        try:
+            body_len = int(value.strip())
+        except ValueError:
+            return -1
+
+        total = header_len + body_len
+        return total if len(buffer) >= total else 0
+
+
+class MQTTFramer(Framer):
+    '''
+        MQTT: 1 字节固定头 + 变长编码的剩余长度(最多 4 字节, 每字节 7 位)
+    '''
+
+    def frame(self, buffer: bytes) -> int:
+        value = 0
+        for i in range(1, min(len(buffer), 5)):
+            byte = buffer[i]
+            value |= (byte & 0x7F) << (7 * (i - 1))
+            if not byte & 0x80:
+                total = 1 + i + value
+                return total if len(buffer) >= total else 0
+        return 0 if len(buffer) < 5 else -1
+
+
+def modbus_tcp_framer() -> LengthPrefixedFramer:
+    # MBAP 长度字段统计 单元号 + PDU
+    return LengthPrefixedFramer(length_offset=4, length_size=2)
+
+
+def iec104_framer() -> LengthPrefixedFramer:
+    # APCI: 0x68 + 1 字节 APDU 长度
+    return LengthPrefixedFramer(length_offset=1, length_size=1, max_message=255 + 2)
@@ -6,8 +6,14 @@ class PacketLevelSegmenter(Segmenter):
     def segment(self, session):
         events = []
 
+        # session key 的 ip1/port1 为客户端
+        client_ip, client_port = session.key.ip1, session.key.port1
+
         for pkt in session.packets:
-            direction = Direction.C2S       # 默认设为客户端到服务器
+            if pkt.src_port == client_port and pkt.src_ip == client_ip:
+                direction = Direction.C2S
+            else:
+                direction = Direction.S2C
             events.append(
                 MessageEvent(
                     session_key=session.key,
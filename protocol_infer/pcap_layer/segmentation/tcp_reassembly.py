@@ -0,0 +1,189 @@
+from typing import Dict, List, Optional, Tuple
+from protocol_infer.core.interface.pcap_analysis import Framer, Segmenter
+from protocol_infer.core.datamodel.event import MessageEvent, Direction
+from protocol_infer.core.datamodel.raw_packet import Rawpacket, TCP_FIN, TCP_RST, TCP_SYN
+from protocol_infer.core.datamodel.session import Session
+
+
+_SEQ_MOD = 1 << 32
+_SEQ_HALF = 1 << 31
+
+
+def _seq_diff(a: int, b: int) -> int:
+    # a - b, 考虑 32 位序列号回绕
+    return ((a - b + _SEQ_HALF) % _SEQ_MOD) - _SEQ_HALF
+
+
+class TCPStream:
+    '''
+        单方向的 TCP 字节流重组
+
+        feed() 逐个接收报文, 按序列号拼接出连续字节流并交给 framer 切分消息,
+        返回本次得到的 (时间戳, 消息) 列表. 重传/重复数据被丢弃, 乱序报文暂存,
+        暂存或未成帧数据超过 max_buffer 字节时跳过缺口/强制输出, 内存有上界.
+        framer 为 None 时不分帧, 由调用方通过 flush() 决定消息边界.
+    '''
+
+    def __init__(self, framer: Optional[Framer] = None, max_buffer: int = 1 << 20):
+        self.framer = framer
+        self.max_buffer = max_buffer
+
+        self.next_seq: Optional[int] = None
+        self.pending: Dict[int, Tuple[float, bytes]] = {}      # 乱序报文 seq -> (时间戳, 负载)
+        self.pending_bytes = 0
+        self.buffer = bytearray()           # 已按序但尚未成帧的数据
+        self.buffer_ts = 0.0                # buffer 中第一个字节所在报文的时间戳
+
+    def feed(self, pkt: Rawpacket) -> List[Tuple[float, bytes]]:
+        out: List[Tuple[float, bytes]] = []
+
+        if pkt.tcp_flags & TCP_SYN:
+            self.next_seq = (pkt.seq + 1) % _SEQ_MOD
+            seq = self.next_seq
+        else:
+            seq = pkt.seq
+
+        payload = pkt.payload
+        if payload:
+            if self.next_seq is None:       # 抓包从连接中途开始
+                self.next_seq = seq
+            self._insert(seq, pkt.timestamp, payload, out)
+
+        if pkt.tcp_flags & (TCP_FIN | TCP_RST):
+            self.flush(out)
+        return out
+
+    def flush(self, out: List[Tuple[float, bytes]]) -> None:
+        '''
+            输出缓冲区中剩余的数据(流结束或对端开始发送)
+        '''
+        if self.buffer:
+            out.append((self.buffer_ts, bytes(self.buffer)))
+            self.buffer.clear()
+
+    def _insert(self, seq: int, ts: float, payload: bytes, out: List[Tuple[float, bytes]]) -> None:
+        offset = _seq_diff(seq, self.next_seq)
+
+        if offset + len(payload) <= 0:
+            return                          # 完全重传
+        if offset > 0:
+            # 乱序, 等待缺口被补上
+            if seq not in self.pending or len(self.pending[seq][1]) < len(payload):
+                if seq in self.pending:
+                    self.pending_bytes -= len(self.pending[seq][1])
+                self.pending[seq] = (ts, payload)
+                self.pending_bytes += len(payload)
+            if self.pending_bytes > self.max_buffer:
+                self._skip_gap(out)
+            return
+
+        self._append(ts, payload[-offset:] if offset < 0 else payload, out)
+        self._drain(out)
+
+    def _drain(self, out: List[Tuple[float, bytes]]) -> None:
+        # 把已经可以接上的乱序报文依次拼接
+        progressed = True
+        while self.pending and progressed:
+            progressed = False
+            for seq in list(self.pending):
+                offset = _seq_diff(seq, self.next_seq)
+                if offset > 0:
+                    continue
+                ts, payload = self.pending.pop(seq)
+                self.pending_bytes -= len(payload)
+                if offset + len(payload) > 0:
+                    self._append(ts, payload[-offset:] if offset < 0 else payload, out)
+                progressed = True
+
+    def _skip_gap(self, out: List[Tuple[float, bytes]]) -> None:
+        # 缺失的数据不会再来了: 当前缓冲作为一条消息输出, 从最早的暂存报文继续
+        self.flush(out)
+        self.next_seq = min(self.pending, key=lambda s: _seq_diff(s, self.next_seq))
+        self._drain(out)
+
+    def _append(self, ts: float, data: bytes, out: List[Tuple[float, bytes]]) -> None:
+        self.next_seq = (self.next_seq + len(data)) % _SEQ_MOD
+        if not self.buffer:
+            self.buffer_ts = ts
+        self.buffer += data
+
+        framer = self.framer
+        if framer is not None:
+            while self.buffer:
+                n = framer.frame(self.buffer)
+                if n == 0:
+                    break
+                if n < 0 or n > len(self.buffer):
+                    n = len(self.buffer)        # 无法识别, 整体输出以重新同步
+                out.append((self.buffer_ts, bytes(self.buffer[:n])))
+                del self.buffer[:n]
+                self.buffer_ts = ts
+
+        if len(self.buffer) > self.max_buffer:
+            self.flush(out)
+
+
+class TCPReassemblySegmenter(Segmenter):
+    '''
+        基于 TCP 重组的分段: 输出应用层消息而不是报文
+
+        - 按序列号排序, 丢弃重传/重复数据和不带负载的纯 ACK
+        - framer 指定时按协议分帧(长度前缀/分隔符), 一个报文可以拆出多条消息,
+          一条消息也可以跨多个报文
+        - framer 为 None 时, 同一方向上连续的数据视为一条消息, 对端开始发送时结束
+        - UDP 会话中每个非空数据报是一条消息
+    '''
+
+    def __init__(self, framer: Optional[Framer] = None, max_buffer: int = 1 << 20):
+        self.framer = framer
+        self.max_buffer = max_buffer
+
+    def segment(self, session: Session) -> List[MessageEvent]:
+        key = session.key
+        client = (key.ip1, key.port1)
+        messages: List[Tuple[float, Direction, bytes]] = []
+
+        if key.protocol != "TCP":
+            for pkt in session.packets:
+                if pkt.payload:
+                    direction = Direction.C2S if (pkt.src_ip, pkt.src_port) == client else Direction.S2C
+                    messages.append((pkt.timestamp, direction, pkt.payload))
+            return self._to_events(key, messages)
+
+        streams = {
+            Direction.C2S: TCPStream(self.framer, self.max_buffer),
+            Direction.S2C: TCPStream(self.framer, self.max_buffer),
+        }
+
+        for pkt in session.packets:
+            direction = Direction.C2S if (pkt.src_ip, pkt.src_port) == client else Direction.S2C
+
+            if self.framer is None and pkt.payload:
+                # 对端开始发送, 本方向之前的数据构成一条完整消息
+                peer = Direction.S2C if direction == Direction.C2S else Direction.C2S
+                peer_out: List[Tuple[float, bytes]] = []
+                streams[peer].flush(peer_out)
+                messages.extend((ts, peer, data) for ts, data in peer_out)
+
+            out = streams[direction].feed(pkt)
+            messages.extend((ts, direction, data) for ts, data in out)
+
+        for direction, stream in streams.items():
+            out = []
+            stream.flush(out)
+            messages.extend((ts, direction, data) for ts, data in out)
+
+        messages.sort(key=lambda m: m[0])
+        return self._to_events(key, messages)
+
+    @staticmethod
+    def _to_events(key, messages: List[Tuple[float, Direction, bytes]]) -> List[MessageEvent]:
+        return [
+            MessageEvent(
+                session_key=key,
+                timestamp=ts,
+                payload=data,
+                direction=direction
+            )
+            for ts, direction, data in messages
+        ]
@@ -0,0 +1,102 @@
+import socket
+from typing import Dict, FrozenSet
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.datamodel.raw_packet import Rawpacket, TCP_ACK, TCP_SYN
+
+
+# 常见服务端口(工控 / IoT 协议, 1024 以下的端口统一视为服务端口)
+KNOWN_SERVER_PORTS: FrozenSet[int] = frozenset({
+    502,            # Modbus/TCP
+    1883, 8883,     # MQTT
+    2404,           # IEC 60870-5-104
+    4840,           # OPC UA
+    5094,           # HART-IP
+    5672,           # AMQP
+    5683,           # CoAP
+    7400, 7401,     # RTPS
+    9600,           # OMRON FINS
+    18245,          # GE SRTP
+    20000,          # DNP3
+    34962, 34963, 34964,    # PROFINET
+    44818, 2222,    # EtherNet/IP
+    47808,          # BACnet/IP
+})
+
+_PROTO_NUM = {"TCP": 6, "UDP": 17}
+
+_PORT_BITS = 16
+_ENDPOINT_BITS = 1 + 128 + _PORT_BITS      # 地址族 + IPv6 地址 + 端口
+
+
+class FlowKeyer:
+    '''
+        五元组 -> 流标识
+
+        流标识是打包好的整数 (低端点, 高端点, 协议), 两个方向的报文得到同一个值,
+        用作字典键时只需要对一个 int 求哈希. SessionKey 只在流第一次出现时构造一次,
+        其中 ip1/port1 为客户端, ip2/port2 为服务端.
+
+        客户端/服务端判定顺序:
+            1. TCP SYN(发起方为客户端) / SYN+ACK(接收方为客户端)
+            2. 只有一端是服务端口(小于 1024 或在 server_ports 中)时, 该端为服务端
+            3. 首个发包方为客户端
+
+        bidirectional=False 时退化为按方向区分的五元组, 发送方总是 ip1/port1
+    '''
+
+    def __init__(self, bidirectional: bool = True,
+                 server_ports: FrozenSet[int] = KNOWN_SERVER_PORTS):
+        self.bidirectional = bidirectional
+        self.server_ports = server_ports
+        self._ip_ints: Dict[str, int] = {}
+
+    def endpoint(self, ip: str, port: int) -> int:
+        ip_int = self._ip_ints.get(ip)
+        if ip_int is None:
+            if ":" in ip:
+                ip_int = (1 << 128) | int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+            else:
+                ip_int = int.from_bytes(socket.inet_aton(ip), "big")
+            self._ip_ints[ip] = ip_int
+        return (ip_int << _PORT_BITS) | port
+
+    def flow_id(self, pkt: Rawpacket) -> int:
+        src = self.endpoint(pkt.src_ip, pkt.src_port)
+        dst = self.endpoint(pkt.dst_ip, pkt.dst_port)
+        if self.bidirectional and src > dst:
+            src, dst = dst, src
+        return (((src << _ENDPOINT_BITS) | dst) << 8) | _PROTO_NUM.get(pkt.protocol, 0)
+
+    def session_key(self, pkt: Rawpacket) -> SessionKey:
+        '''
+            根据流中第一个报文构造 SessionKey
+        '''
+        if self.bidirectional and not self._sender_is_client(pkt):
+            return SessionKey(
+                ip1=pkt.dst_ip,
+                port1=pkt.dst_port,
+                ip2=pkt.src_ip,
+                port2=pkt.src_port,
+                protocol=pkt.protocol
+            )
+        return SessionKey(
+            ip1=pkt.src_ip,
+            port1=pkt.src_port,
+            ip2=pkt.dst_ip,
+            port2=pkt.dst_port,
+            protocol=pkt.protocol
+        )
+
+    def _sender_is_client(self, pkt: Rawpacket) -> bool:
+        if pkt.tcp_flags & TCP_SYN:
+            return not (pkt.tcp_flags & TCP_ACK)
+
+        src_service = self._is_service_port(pkt.src_port)
+        dst_service = self._is_service_port(pkt.dst_port)
+        if src_service != dst_service:
+            return dst_service
+
+        return True
+
+    def _is_service_port(self, port: int) -> bool:
+        return port < 1024 or port in self.server_ports
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Set, Tuple
+from protocol_infer.core.datamodel.session import Session, SessionKey
+from protocol_infer.core.datamodel.raw_packet import Rawpacket, TCP_FIN, TCP_RST, TCP_SYN
+from protocol_infer.pcap_layer.session.tuple5_builder import FiveTupleBuilder
+
+
+class _OpenFlow:
+    '''
+        尚未结束的流
+    '''
+    __slots__ = ("key", "packets", "last_seen", "senders", "fin_senders")
+
+    def __init__(self, key: SessionKey):
+        self.key = key
+        self.packets: List[Rawpacket] = []
+        self.last_seen = 0.0
+        self.senders: Set[Tuple[str, int]] = set()          # 在该流上发过包的端点
+        self.fin_senders: Set[Tuple[str, int]] = set()      # 已发送 FIN 的端点
+
+    def add(self, pkt: Rawpacket) -> None:
+        self.packets.append(pkt)
+        if pkt.timestamp > self.last_seen:
+            self.last_seen = pkt.timestamp
+        self.senders.add((pkt.src_ip, pkt.src_port))
+
+    def closed_by(self, pkt: Rawpacket) -> bool:
+        '''
+            RST 立即结束; FIN 需要流上所有发送过数据的端点都发出 FIN 后才结束
+        '''
+        if pkt.tcp_flags & TCP_RST:
+            return True
+        if pkt.tcp_flags & TCP_FIN:
+            self.fin_senders.add((pkt.src_ip, pkt.src_port))
+            return len(self.fin_senders) >= len(self.senders)
+        return False
+
+    def to_session(self) -> Session:
+        pkts = self.packets
+        if len(pkts) > 1:
+            pkts.sort(key=lambda p: p.timestamp)
+        return Session(key=self.key, packets=pkts)
+
+
+class StreamingFiveTupleBuilder(FiveTupleBuilder):
+    '''
+        流式会话构建: 边读取报文边输出已经结束的会话
+
+        会话在以下情况下被输出:
+            - TCP 流收到 RST, 或双方都发送了 FIN
+            - 超过 idle_timeout 秒没有新报文(以报文时间戳计)
+            - 同时打开的流超过 max_flows, 最久未活跃的流被提前输出(LRU)
+        输入结束后剩余的流按最近活跃顺序输出.
+
+        同一个五元组在超时/关闭后再次出现会成为新的会话.
+        连接关闭后残留的无负载 ACK 会被丢弃, 不会单独成为会话.
+    '''
+
+    def __init__(self, idle_timeout: float = 120.0, max_flows: int = 65536,
+                 bidirectional: bool = True):
+        super().__init__(bidirectional=bidirectional)
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+
+    def build(self, packets: Iterable[Rawpacket]) -> Iterator[Session]:
+        flows: "OrderedDict[int, _OpenFlow]" = OrderedDict()     # 流标识 -> 流, 按最近活跃时间排序
+        closed: "OrderedDict[int, float]" = OrderedDict()        # 最近关闭的流标识 -> 关闭时间
+        idle_timeout = self.idle_timeout
+
+        for pkt in packets:
+            now = pkt.timestamp
+
+            # 1. 超时的流从 LRU 头部依次输出
+            while flows:
+                oldest = next(iter(flows.values()))
+                if now - oldest.last_seen <= idle_timeout:
+                    break
+                flows.popitem(last=False)
+                yield oldest.to_session()
+
+            while closed and now - next(iter(closed.values())) > idle_timeout:
+                closed.popitem(last=False)
+
+            # 2. 找到 / 新建所属的流
+            fid = self.keyer.flow_id(pkt)
+            flow = flows.get(fid)
+            if flow is None:
+                if fid in closed:
+                    if not pkt.payload and not (pkt.tcp_flags & TCP_SYN):
+                        continue        # 关闭后的残余 ACK
+                    del closed[fid]
+
+                if len(flows) >= self.max_flows:
+                    _, evicted = flows.popitem(last=False)
+                    yield evicted.to_session()
+
+                flow = flows[fid] = _OpenFlow(self.session_key(pkt))
+            else:
+                flows.move_to_end(fid)
+
+            flow.add(pkt)
+
+            # 3. TCP 连接结束
+            if pkt.protocol == "TCP" and flow.closed_by(pkt):
+                del flows[fid]
+                closed[fid] = now
+                if len(closed) > self.max_flows:
+                    closed.popitem(last=False)
+                yield flow.to_session()
+
+        for flow in flows.values():
+            yield flow.to_session()
@@ -1,8 +1,8 @@
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Tuple
 from protocol_infer.core.interface.pcap_analysis import SessionBuilder
 from protocol_infer.core.datamodel.session import Session, SessionKey
 from protocol_infer.core.datamodel.raw_packet import Rawpacket
-from collections import defaultdict
+from protocol_infer.pcap_layer.session.flow_key import FlowKeyer
 
 
 class FiveTupleBuilder(SessionBuilder):
@@ -10,28 +10,32 @@ class FiveTupleBuilder(SessionBuilder):
     ''' raw_packet ---> Session/Sessionkey
         由于流(会话)内的包不一定连续, 所以需要先收集各个流中的包, 
         收集到的包按时间戳排序得到完整且独立的一个个会话
+
+        bidirectional=True 时请求/响应两个方向归为同一个会话, 
+        SessionKey 的 ip1/port1 为客户端, ip2/port2 为服务端
     '''
+    def __init__(self, bidirectional: bool = True):
+        self.keyer = FlowKeyer(bidirectional=bidirectional)
+
     def build(self, packets: Iterable[Rawpacket]) -> List[Session]:
         
-        temp_flow = defaultdict(list)       # 先用字典收集, 构造出5元组, 再排序
+        temp_flow: Dict[int, Tuple[SessionKey, List[Rawpacket]]] = {}      # 流标识 -> (session key, 包)
 
         for pkt in packets:
-
-            # 构建session key(5元组)
-            key = SessionKey(
-                ip1=pkt.src_ip,
-                port1=pkt.src_port,
-                ip2=pkt.dst_ip,
-                port2=pkt.dst_port,
-                protocol=pkt.protocol
-            )
-
-            temp_flow[key].append(pkt)
+            fid = self.keyer.flow_id(pkt)
+            flow = temp_flow.get(fid)
+            if flow is None:
+                flow = temp_flow[fid] = (self.session_key(pkt), [])
+            flow[1].append(pkt)
         
         sessions = []
-        for key, pkts in temp_flow.items():
+        for key, pkts in temp_flow.values():
             if len(pkts) > 1:                               # 单个包不需要排序
                 pkts.sort(key=lambda p : p.timestamp)       # 每个流内部排序
             sessions.append(Session(key=key, packets=pkts))
 
-        return sessions
\ No newline at end of file
+        return sessions
+
+    def session_key(self, pkt: Rawpacket) -> SessionKey:
+        # 构建session key(5元组), 由流中第一个包决定客户端/服务端
+        return self.keyer.session_key(pkt)
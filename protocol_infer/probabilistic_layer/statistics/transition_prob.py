@@ -0,0 +1,84 @@
+from itertools import islice
+from typing import Iterable, Optional, Sequence
+import numpy as np
+from protocol_infer.core.interface.prob_trainer import ProbTrainer
+from protocol_infer.core.model.compiled import CompiledFSM
+from protocol_infer.core.model.fsm import FSM
+
+
+class TransitionProbTrainer(ProbTrainer):
+    '''
+        批量重放序列估计转移概率
+
+        序列按 batch_size 条一批编码为整数数组, 在 CompiledFSM 上同时重放,
+        经过次数与结束次数用 np.bincount 累加, 只保留计数, 不保留序列.
+        只统计能完整重放的序列, 其余计入 n_rejected.
+
+        状态 s 的每条出边和 "在 s 结束" 构成一个分类分布, alpha 为加法平滑:
+            P(t)      = (count[t] + alpha)      / (total[s] + alpha * (出边数 + 1))
+            P(end|s)  = (end_count[s] + alpha)  / (同上)
+        alpha = 0 且没有任何序列经过的状态, 概率保持 None.
+    '''
+
+    def __init__(self, alpha: float = 0.0, batch_size: int = 65536):
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.reset()
+
+    def reset(self) -> None:
+        self.compiled: Optional[CompiledFSM] = None
+        self.trans_counts: Optional[np.ndarray] = None
+        self.end_counts: Optional[np.ndarray] = None
+        self.n_sequences = 0
+        self.n_rejected = 0
+
+    def partial_fit(self, fsm: FSM, sequences: Iterable[Sequence[str]]) -> None:
+        if self.compiled is None:
+            self.compiled = CompiledFSM(fsm)
+            self.trans_counts = np.zeros(self.compiled.n_transitions, dtype=np.int64)
+            self.end_counts = np.zeros(self.compiled.n_states, dtype=np.int64)
+        elif self.compiled.source is not fsm:
+            raise ValueError("counts were accumulated on a different FSM; call reset() first")
+
+        it = iter(sequences)
+        while True:
+            batch = list(islice(it, self.batch_size))
+            if not batch:
+                break
+            self._count(batch)
+
+    def _count(self, batch) -> None:
+        compiled = self.compiled
+        flat, lengths = compiled.encode(batch)
+        path, final = compiled.replay(flat, lengths)
+
+        accepted = final >= 0
+        tids = path[np.repeat(accepted, lengths)]
+        self.trans_counts += np.bincount(tids, minlength=compiled.n_transitions)
+        self.end_counts += np.bincount(final[accepted], minlength=compiled.n_states)
+        self.n_sequences += len(lengths)
+        self.n_rejected += int((~accepted).sum())
+
+    def apply(self, fsm: FSM) -> FSM:
+        compiled = self.compiled
+        if compiled is None:
+            raise RuntimeError("TransitionProbTrainer has no counts; call partial_fit first")
+        if compiled.source is not fsm:
+            raise ValueError("counts were accumulated on a different FSM")
+
+        n = compiled.n_states
+        src = compiled.trans_src
+        out_degree = np.bincount(src, minlength=n)
+        total = np.bincount(src, weights=self.trans_counts, minlength=n) + self.end_counts
+        denom = total + self.alpha * (out_degree + 1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            prob = (self.trans_counts + self.alpha) / denom[src]
+            end_prob = (self.end_counts + self.alpha) / denom
+        prob[denom[src] == 0] = np.nan
+        end_prob[denom == 0] = np.nan
+
+        by_sid = np.full(fsm._next_state_id, np.nan)
+        by_sid[compiled.state_ids] = end_prob
+        fsm.set_probabilities(prob, by_sid)
+        return fsm
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from typing import Optional, Sequence
+import numpy as np
+
+
+class LogBins:
+    '''
+        对数等宽的固定分箱, 覆盖 [min_delay, max_delay), 每 10 倍 bins_per_decade 个箱
+
+        第 0 个箱收集小于 min_delay 的延迟 (包括 0), 最后一个箱收集不小于 max_delay 的延迟.
+    '''
+
+    def __init__(self, min_delay: float = 1e-6, max_delay: float = 1e5, bins_per_decade: int = 10):
+        if not 0 < min_delay < max_delay:
+            raise ValueError("expected 0 < min_delay < max_delay")
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.bins_per_decade = bins_per_decade
+
+        decades = np.log10(max_delay / min_delay)
+        n_inner = int(np.ceil(decades * bins_per_decade))
+        self.edges = min_delay * 10.0 ** (np.arange(n_inner + 1) / bins_per_decade)
+        self.n_bins = n_inner + 2
+
+    def index(self, delays: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.edges, delays, side="right")
+
+    def bounds(self) -> np.ndarray:
+        '''
+            每个箱的 [下界, 上界], 两端的溢出箱分别用 0 和 max_delay 截断
+        '''
+        lower = np.r_[0.0, self.edges]
+        upper = np.r_[self.edges, self.edges[-1]]
+        return np.stack([lower, upper], axis=1)
+
+
+@dataclass
+class TimingStats:
+    '''
+        单条转移的延迟统计 (秒)
+    '''
+    count: int
+    mean: float
+    variance: float
+    min: float
+    max: float
+    histogram: np.ndarray
+    bins: LogBins
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def quantile(self, q: float) -> Optional[float]:
+        return _quantiles(self.histogram[None, :], self.bins, np.array([q]),
+                          np.array([self.min]), np.array([self.max]))[0, 0] if self.count else None
+
+
+class DelayTable:
+    '''
+        所有转移的流式延迟统计, 每条转移占用固定大小的内存
+
+            count / mean / m2:  Welford 矩 (批量更新时用 Chan 的合并公式)
+            min / max
+            hist[t, b]:         LogBins 直方图, 用于估计分位数
+
+        update() 一次处理一批 (转移编号, 延迟), 全部用 bincount 向量化完成;
+        merge() 合并另一张表 (例如不同进程 / 不同时间段的统计).
+    '''
+
+    def __init__(self, n_transitions: int, bins: Optional[LogBins] = None):
+        self.bins = bins if bins is not None else LogBins()
+        self.count = np.zeros(n_transitions, dtype=np.int64)
+        self.mean = np.zeros(n_transitions, dtype=np.float64)
+        self.m2 = np.zeros(n_transitions, dtype=np.float64)
+        self.min = np.full(n_transitions, np.inf)
+        self.max = np.full(n_transitions, -np.inf)
+        self.hist = np.zeros((n_transitions, self.bins.n_bins), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.count)
+
+    def update(self, tids: np.ndarray, delays: np.ndarray) -> None:
+        n = len(self)
+        delays = np.asarray(delays, dtype=np.float64)
+        count = np.bincount(tids, minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(tids, weights=delays, minlength=n) / count
+        mean[count == 0] = 0.0
+        m2 = np.bincount(tids, weights=(delays - mean[tids]) ** 2, minlength=n)
+        self._combine(count, mean, m2)
+
+        np.minimum.at(self.min, tids, delays)
+        np.maximum.at(self.max, tids, delays)
+        flat = tids * self.bins.n_bins + self.bins.index(delays)
+        self.hist += np.bincount(flat, minlength=self.hist.size).reshape(self.hist.shape)
+
+    def merge(self, other: "DelayTable") -> None:
+        if len(other) != len(self) or other.bins.n_bins != self.bins.n_bins:
+            raise ValueError("cannot merge DelayTables with different shapes")
+        self._combine(other.count, other.mean, other.m2)
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        self.hist += other.hist
+
+    def _combine(self, count: np.ndarray, mean: np.ndarray, m2: np.ndarray) -> None:
+        # Chan et al.: 合并两组 (n, mean, M2)
+        total = self.count + count
+        delta = mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            w = np.where(total > 0, count / total, 0.0)
+        self.mean += delta * w
+        self.m2 += m2 + delta ** 2 * self.count * w
+        self.count = total
+
+    @property
+    def variance(self) -> np.ndarray:
+        # 总体方差; 少于 2 个样本时为 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / np.maximum(self.count, 1), 0.0)
+
+    def quantiles(self, qs: Sequence[float]) -> np.ndarray:
+        '''
+            所有转移的分位数估计, 形状 (转移数, len(qs)); 没有样本的转移为 NaN
+        '''
+        result = _quantiles(self.hist, self.bins, np.asarray(qs, dtype=np.float64), self.min, self.max)
+        result[self.count == 0] = np.nan
+        return result
+
+    def stats(self, tid: int) -> Optional[TimingStats]:
+        if self.count[tid] == 0:
+            return None
+        return TimingStats(
+            count=int(self.count[tid]),
+            mean=float(self.mean[tid]),
+            variance=float(self.variance[tid]),
+            min=float(self.min[tid]),
+            max=float(self.max[tid]),
+            histogram=self.hist[tid].copy(),
+            bins=self.bins
+        )
+
+
+def _quantiles(hist: np.ndarray, bins: LogBins, qs: np.ndarray,
+               lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    '''
+        由直方图估计分位数: 找到累计计数越过 q 的箱, 箱内按对数插值 (最低的箱线性插值),
+        结果截断到 [min, max]
+    '''
+    cum = np.cumsum(hist, axis=1)
+    total = cum[:, -1:]
+    target = qs[None, :] * total                                        # (n, q)
+    b = (cum[:, None, :] < target[:, :, None]).sum(axis=2)              # 目标所在的箱
+    b = np.minimum(b, hist.shape[1] - 1)
+
+    rows = np.arange(len(hist))[:, None]
+    before = np.where(b > 0, cum[rows, np.maximum(b - 1, 0)], 0)
+    inside = hist[rows, b]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = np.clip(np.where(inside > 0, (target - before) / inside, 0.0), 0.0, 1.0)
+
+    bounds = bins.bounds()
+    lower, upper = bounds[b, 0], bounds[b, 1]
+    value = np.where(lower > 0, lower * (upper / np.where(lower > 0, lower, 1.0)) ** frac,
+                     lower + (upper - lower) * frac)
+    return np.clip(value, lo[:, None], hi[:, None])
@@ -0,0 +1,85 @@
+from itertools import islice
+from typing import Dict, Iterable, Optional, Sequence
+import numpy as np
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.model.compiled import CompiledFSM
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.probabilistic_layer.timing.delay_stats import DelayTable, LogBins
+
+
+class TimingTrainer:
+    '''
+        在 FSM 上重放带时间戳的符号序列, 统计每条转移的消息间隔
+
+        第 i 条消息触发的转移记录延迟 timestamps[i] - timestamps[i-1],
+        会话的第一条消息没有前一条消息, 不计入. 与 TransitionProbTrainer 一样
+        只统计能完整重放的序列, 序列按 batch_size 条一批处理, 不保留序列本身,
+        内存只与转移数相关.
+    '''
+
+    def __init__(self, bins: Optional[LogBins] = None, batch_size: int = 65536):
+        self.bins = bins if bins is not None else LogBins()
+        self.batch_size = batch_size
+        self.reset()
+
+    def reset(self) -> None:
+        self.compiled: Optional[CompiledFSM] = None
+        self.table: Optional[DelayTable] = None
+        self.n_sequences = 0
+        self.n_rejected = 0
+
+    def partial_fit(self, fsm: FSM, sequences: Iterable[Sequence[str]],
+                    timestamps: Iterable[Sequence[float]]) -> None:
+        if self.compiled is None:
+            self.compiled = CompiledFSM(fsm)
+            self.table = DelayTable(self.compiled.n_transitions, self.bins)
+        elif self.compiled.source is not fsm:
+            raise ValueError("statistics were accumulated on a different FSM; call reset() first")
+
+        it = zip(sequences, timestamps)
+        while True:
+            batch = list(islice(it, self.batch_size))
+            if not batch:
+                break
+            self._count([seq for seq, _ in batch], [ts for _, ts in batch])
+
+    def _count(self, sequences, timestamps) -> None:
+        flat, lengths = self.compiled.encode(sequences)
+        path, final = self.compiled.replay(flat, lengths)
+        ts = np.concatenate([np.asarray(t, dtype=np.float64) for t in timestamps]) if len(flat) else np.zeros(0)
+        if len(ts) != len(flat):
+            raise ValueError("each sequence needs exactly one timestamp per symbol")
+
+        # 每个位置与同一序列中前一个位置的间隔, 序列首位置无效
+        first = np.zeros(len(flat), dtype=bool)
+        first[np.cumsum(lengths)[:-1][lengths[1:] > 0]] = True
+        if len(flat):
+            first[0] = True
+        delays = np.diff(ts, prepend=ts[:1])
+
+        keep = np.repeat(final >= 0, lengths) & ~first
+        self.table.update(path[keep], delays[keep])
+        self.n_sequences += len(lengths)
+        self.n_rejected += int((final < 0).sum())
+
+    def fit_trace(self, fsm: FSM, trace: ColumnarTrace,
+                  sequences: Dict[SessionKey, Sequence[str]]) -> FSM:
+        '''
+            sequences 为 ControlFlowPipeline.symbolize(trace) 的输出,
+            时间戳按相同的会话分组方式从 trace 中取出
+        '''
+        trace = ColumnarTrace.from_trace(trace)
+        groups = trace.group_by_session()
+        keys = list(sequences)
+        self.partial_fit(fsm, (sequences[k] for k in keys),
+                         (trace.timestamps[groups[k]] for k in keys))
+        return self.apply(fsm)
+
+    def apply(self, fsm: FSM) -> FSM:
+        if self.table is None:
+            raise RuntimeError("TimingTrainer has no statistics; call partial_fit first")
+        if self.compiled.source is not fsm:
+            raise ValueError("statistics were accumulated on a different FSM")
+        fsm.set_timing(self.table)
+        return fsm
@@ -57,6 +57,8 @@ class FSMVisualizer:
             stats.append(f"访问: {state.visit_count}")
         if state.hasNo is not None:
             stats.append(f"哈希: {state.hasNo}")
+        if state.end_prob is not None:
+            stats.append(f"P(end)={state.end_prob:.2f}")
         
         if stats:
             label += f"\\n({', '.join(stats)})"
@@ -0,0 +1,101 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pytest
+from protocol_infer.algorithm.clustering.hierarchical import HierarchicalClustering
+from protocol_infer.algorithm.clustering.kmeans import KMeansClustering
+from protocol_infer.algorithm.clustering.minibatch_kmeans import MiniBatchKMeansClustering
+from protocol_infer.algorithm.clustering.rule_based import RuleBasedClustering
+from protocol_infer.control_flow_layer.abstraction.clustering_abstraction import ClusterMessageAbstractor
+from protocol_infer.control_flow_layer.pipeline import ControlFlowPipeline, stratified_sample
+
+
+X = np.array([[0, 0], [0, 1], [10, 10], [10, 11], [50, 0], [51, 0]], dtype=np.float32)
+
+
+def test_abstract_batch_matches_abstract():
+    abstractor = ClusterMessageAbstractor(KMeansClustering(n_clusters=3))
+    abstractor.fit(X)
+
+    assert abstractor.abstract_batch(X) == [abstractor.abstract(f) for f in X]
+    assert abstractor.abstract_batch(X[:0]) == []
+
+
+def test_hierarchical_predicts_unseen_samples():
+    algo = HierarchicalClustering(distance_threshold=5.0)
+    algo.fit(X)
+
+    train = algo.predict_batch(X)
+    assert train.tolist() == algo.labels_.tolist()
+
+    new = algo.predict([[1, 0], [49, 1], [11, 9]])
+    assert new == [train[0], train[4], train[2]]
+
+
+def test_minibatch_partial_fit_in_chunks():
+    rng = np.random.default_rng(0)
+    data = np.repeat(X, 50, axis=0)[rng.permutation(len(X) * 50)]
+
+    algo = MiniBatchKMeansClustering(n_clusters=3, random_state=0)
+    algo.partial_fit(data[:2])                  # 样本数不足 n_clusters, 先缓存
+    for i in range(2, len(data), 60):
+        algo.partial_fit(data[i:i + 60])
+
+    labels = algo.predict_batch(X)
+    assert labels[0] == labels[1] and labels[2] == labels[3] and labels[4] == labels[5]
+    assert len(set(labels.tolist())) == 3
+
+
+def test_minibatch_short_stream_is_fitted_before_predict():
+    algo = MiniBatchKMeansClustering(n_clusters=8, random_state=0)
+    algo.partial_fit(X[:2])
+    algo.partial_fit(X[4:])
+    labels = algo.predict_batch(X)
+    assert algo.model.n_clusters == 4 and len(set(labels[[0, 1, 4, 5]].tolist())) == 4
+
+
+def test_stream_mode_requires_partial_fit():
+    assert MiniBatchKMeansClustering(n_clusters=2).supports_partial_fit
+    assert not KMeansClustering(n_clusters=2).supports_partial_fit
+    with pytest.raises(ValueError):
+        ControlFlowPipeline(fit_mode="stream", algorithm=KMeansClustering(n_clusters=2))
+
+
+def test_stratified_sample_covers_every_session():
+    starts = np.array([0, 1000, 1002])
+    rows = stratified_sample(starts, 1010, 100, np.random.default_rng(0))
+
+    session = np.searchsorted(starts, rows, side="right") - 1
+    assert np.bincount(session).tolist() == [97, 1, 2]
+    assert len(np.unique(rows)) == len(rows)
+
+    # 会话数超过 sample_size 时按会话抽样, 总数不超过 sample_size
+    rows = stratified_sample(np.arange(1000), 1000, 100, np.random.default_rng(0))
+    assert len(rows) == 100 and len(np.unique(rows)) == 100
+
+
+def test_rule_based_policies():
+    train = [[3, 502, 1], [5, 502, 2], [3, 502, 1], [-0.0, 502, 1]]
+    query = [[5, 502, 2], [0, 502, 1], [4, 502, 1], [3, 502, 1]]
+
+    algo = RuleBasedClustering()
+    algo.fit(train)
+    assert algo.predict(train) == [0, 1, 0, 2]
+    assert algo.predict(query) == [1, 2, -1, 0]
+
+    nearest = RuleBasedClustering(unknown="nearest")
+    nearest.fit(train)
+    assert nearest.predict(query) == [1, 2, 0, 0]
+
+    new = RuleBasedClustering(unknown="new")
+    new.fit(train)
+    assert new.predict(query) == [1, 2, 3, 0]
+    new.partial_fit([[9, 9, 9], [4, 502, 1]])
+    assert new.predict([[9, 9, 9]]) == [4]
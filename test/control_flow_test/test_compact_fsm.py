@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.algorithm.states_merging.K_tails import KTailStateMerger
+from protocol_infer.control_flow_layer.inference.pta_infer import PTAInfer
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.model.compact_fsm import CompactFSM
+
+
+SEQUENCES = {
+    SessionKey("1.1.1.1", 123, "2.2.2.2", 80, "tcp"): ["a", "b", "c"],
+    SessionKey("3.3.3.3", 111, "4.4.4.4", 80, "tcp"): ["a", "b", "d"],
+    SessionKey("5.5.5.5", 222, "4.4.4.4", 80, "tcp"): ["a", "b", "c"],
+}
+
+
+def _edges(fsm):
+    return sorted((t.src, t.symbol, t.dst) for t in fsm.transitions)
+
+
+def test_compact_pta_matches_fsm():
+    fsm = PTAInfer().infer(SEQUENCES)
+    compact = PTAInfer(compact=True).infer(SEQUENCES)
+
+    assert isinstance(compact, CompactFSM)
+    assert compact._next_state_id == fsm._next_state_id == 5
+    assert _edges(compact) == _edges(fsm)
+    for sid, state in fsm.states.items():
+        view = compact.states[sid]
+        assert (view.is_start, view.is_end, view.visit_count) == (state.is_start, state.is_end, state.visit_count)
+        assert view.next_states == state.next_states
+
+    assert compact.symbols == ["a", "b", "c", "d"]
+    assert list(compact.count) == [3, 3, 2, 1]          # 每条转移被经过的次数
+
+
+def test_lookup_after_freeze_and_merge():
+    compact = PTAInfer(compact=True).infer(SEQUENCES)
+    offsets, order = compact.freeze()
+
+    assert offsets.tolist() == [0, 1, 2, 4, 4, 4]
+    assert compact.lookup(2, "d") == 4
+    assert compact.lookup(2, "x") is None
+    assert compact.predecessors(4) == [("d", 2)] and compact.predecessors(0) == []
+
+    merged = KTailStateMerger(0).merge(compact)
+    expected = KTailStateMerger(0).merge(PTAInfer().infer(SEQUENCES))
+    assert list(merged.states) == list(expected.states) == [0, 3, 4]
+    assert _edges(merged) == _edges(expected)
+    assert merged.lookup(0, "b") == 0
+    assert sorted(merged.predecessors(0)) == [("a", 0), ("b", 0)]
+
+
+def test_queries_between_insertions_keep_dict_index():
+    compact = CompactFSM()
+    sid = compact.new_state(is_start=True)
+    index = compact._index
+    for i in range(3):
+        compact.add_transition(sid, sid, f"x{i}")
+        assert compact.successors(sid) == [(f"x{j}", sid) for j in range(i + 1)]
+        assert compact._index is index              # 查询不丢弃字典, 下一次插入不需要重建
+    assert compact.lookup(sid, "x1") == sid
+
+    compact.freeze()
+    assert compact._index is None and compact.lookup(sid, "x2") == sid
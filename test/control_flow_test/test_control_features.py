@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.control_flow_layer.features.control_feature_extraction import ControlFeatureExtraction
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.event import Direction, MessageEvent
+from protocol_infer.core.datamodel.session import SessionKey
+
+
+SK1 = SessionKey("10.0.0.1", 40000, "10.0.0.2", 502, "TCP")
+SK2 = SessionKey("10.0.0.3", 40001, "10.0.0.2", 502, "TCP")
+
+EVENTS = [
+    MessageEvent(SK1, 1.0, b"\x00\x01\x02", Direction.C2S),
+    MessageEvent(SK2, 1.5, b"", Direction.C2S),
+    MessageEvent(SK1, 2.0, b"\xff\xff", Direction.S2C),
+    MessageEvent(SK2, 4.0, b"\x01", Direction.S2C),
+]
+
+
+def test_base_features_match_per_event():
+    batch = ControlFeatureExtraction().extract_batch(ColumnarTrace.from_events(EVENTS))
+
+    assert batch.dtype == np.float32
+    expected = [
+        [len(e.payload), e.session_key.port1, e.session_key.port2, e.direction.to_feature()]
+        for e in EVENTS
+    ]
+    assert batch.tolist() == expected
+
+
+def test_rich_features():
+    extractor = ControlFeatureExtraction(inter_arrival=True, byte_histogram_bins=4,
+                                         leading_bytes=2, ngram_buckets=8, max_chunk_bytes=2)
+    batch = extractor.extract_batch(ColumnarTrace.from_events(EVENTS))
+
+    assert batch.shape == (4, extractor.n_features)
+    assert batch[:, 4].tolist() == [0.0, 0.0, 1.0, 2.5]             # 会话内时间间隔
+    assert np.allclose(batch[:, 5:9].sum(axis=1), [1, 0, 1, 1])     # 归一化直方图
+    assert batch[2, 8] == 1.0                                       # 0xff 落在最后一个 bin
+    assert batch[:, 9:11].tolist() == [[0, 1], [-1, -1], [255, 255], [1, -1]]
+    assert batch[:, 11:].sum(axis=1).tolist() == [2, 0, 1, 0]       # 2-gram 个数
+
+    assert extractor.extract(EVENTS) == batch.tolist()
+
+    # 分批处理时, 由上一批各会话的最后时间戳接上间隔
+    tail = extractor.extract_batch(ColumnarTrace.from_events(EVENTS[2:]), previous=np.array([1.0, 1.5]))
+    assert tail[:, 4].tolist() == [1.0, 2.5]
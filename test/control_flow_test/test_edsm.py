@@ -0,0 +1,51 @@
+import sys
+import random
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import pytest
+from protocol_infer.algorithm.states_merging.edsm import EDSMStateMerger
+from protocol_infer.algorithm.states_merging.K_tails import KTailStateMerger
+from protocol_infer.control_flow_layer.inference.pta_infer import PTAInfer
+
+
+def _request_response_sessions():
+    rng = random.Random(0)
+    sequences = {}
+    for i in range(500):
+        seq = ["req", "resp"]
+        while rng.random() < 0.7:
+            seq += ["req", "resp"]
+        sequences[i] = seq
+    return sequences
+
+
+def test_edsm_learns_request_response_loop():
+    for compact in (False, True):
+        fsm = EDSMStateMerger().merge(PTAInfer(compact=compact).infer(_request_response_sessions()))
+
+        assert sorted((t.src, t.symbol, t.dst) for t in fsm.transitions) == \
+            [(0, "req", 1), (1, "resp", 2), (2, "req", 1)]
+        assert fsm.end_states() == [2]
+        assert fsm.states[1].visit_count == sum(len(s) // 2 for s in _request_response_sessions().values())
+
+
+def test_edsm_scoring_leaves_working_copy_untouched():
+    merger = EDSMStateMerger()
+    merger._load(PTAInfer().infer(_request_response_sessions()))
+    before = (list(merger.visits), list(merger.endc), [dict(d) for d in merger.delta])
+
+    assert merger._score(1, 3) is not None
+    assert merger._score(0, 1) is None
+    assert (merger.visits, merger.endc, merger.delta) == before
+
+
+def test_edsm_requires_prefix_tree():
+    fsm = KTailStateMerger(0).merge(PTAInfer().infer(_request_response_sessions()))
+    with pytest.raises(ValueError):
+        EDSMStateMerger().merge(fsm)
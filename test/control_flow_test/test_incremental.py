@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import random
+from protocol_infer.control_flow_layer.incremental import IncrementalControlFlowModel
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.algorithm.states_merging.K_tails import KTailStateMerger
+
+
+def _batches(n_batches, size, seed=0):
+    rng = random.Random(seed)
+    return [[[rng.choice("abc") for _ in range(rng.randint(0, 6))] for _ in range(size)]
+            for _ in range(n_batches)]
+
+
+def _edges(fsm):
+    return sorted(zip(*[col.tolist() for col in fsm.transition_columns()]))
+
+
+def test_incremental_matches_full_k_tails():
+    for k in (0, 2):
+        model = IncrementalControlFlowModel(k=k)
+        seen = []
+        for batch in _batches(4, 200):
+            seen.extend(batch)
+            report = model.add_sequences(batch)
+
+            full = KTailStateMerger(k).merge(PrefixTree.build(seen).to_fsm(compact=True))
+            assert _edges(model.fsm) == _edges(full)
+            assert (report.states, report.transitions) == (len(full.states), len(full.transitions))
+            assert sorted(model.fsm.end_states()) == sorted(full.end_states())
+
+
+def test_update_report_and_persistence(tmp_path):
+    model = IncrementalControlFlowModel(k=2)
+    first = model.add_sequences([["a", "b"], ["a", "b"], ["a"]])
+    assert first.sessions == 3 and first.new_sequences == 2
+    assert first.pta_states_added == 2
+
+    # 已有的序列不会新增状态
+    again = model.add_sequences([["a", "b"]])
+    assert again.new_sequences == 0 and again.pta_states_added == 0 and again.states_added == 0
+
+    path = tmp_path / "model.pkl"
+    model.save(str(path))
+    loaded = IncrementalControlFlowModel.load(str(path))
+
+    report = loaded.add_sequences([["a", "b", "c"]])
+    assert report.pta_states_added == 1 and report.new_sequences == 1
+    assert report.affected_states <= 3
+    assert len(loaded.tree) == 4 and len(model.tree) == 3
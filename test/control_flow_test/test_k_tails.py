@@ -0,0 +1,48 @@
+import sys
+import random
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.algorithm.states_merging.K_tails import KTailStateMerger
+from protocol_infer.control_flow_layer.inference.pta_infer import PTAInfer
+
+
+def _random_pta(compact=False):
+    rng = random.Random(7)
+    sequences = {
+        i: [rng.choice("abc") for _ in range(rng.randrange(0, 6))]
+        for i in range(40)
+    }
+    return PTAInfer(compact=compact).infer(sequences)
+
+
+def _partition(labels):
+    groups = {}
+    for sid, label in labels.items():
+        groups.setdefault(label, []).append(sid)
+    return sorted(groups.values())
+
+
+def test_signatures_match_recursive_definition():
+    for compact in (False, True):
+        fsm = _random_pta(compact)
+        for k in range(4):
+            merger = KTailStateMerger(k)
+            sig = merger.signatures(fsm)
+            fast = {sid: int(sig[sid]) for sid in fsm.states}
+            slow = {sid: merger.signiture_compute(sid, k, fsm) for sid in fsm.states}
+            assert _partition(fast) == _partition(slow)
+
+
+def test_merge_same_result_for_both_storages():
+    plain = KTailStateMerger(2).merge(_random_pta())
+    compact = KTailStateMerger(2).merge(_random_pta(compact=True))
+
+    assert list(plain.states) == list(compact.states)
+    assert sorted((t.src, t.symbol, t.dst) for t in plain.transitions) == \
+        sorted((t.src, t.symbol, t.dst) for t in compact.transitions)
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.control_flow_layer.inference.pta_infer import PTAInfer
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.model.merge_engine import MergeEngine
+
+
+def _pta(compact=False):
+    # s0 -a-> s1 -b-> s2(end)
+    #    -c-> s3 -b-> s4(end)
+    return PTAInfer(compact=compact).infer({
+        SessionKey("1.1.1.1", 1, "2.2.2.2", 2, "tcp"): ["a", "b"],
+        SessionKey("1.1.1.1", 3, "2.2.2.2", 2, "tcp"): ["c", "b"],
+    })
+
+
+def _edges(fsm):
+    return sorted((t.src, t.symbol, t.dst) for t in fsm.transitions)
+
+
+def test_merge_two_state_wrapper():
+    fsm = _pta()
+    fsm.merge_two_state(1, 3)
+
+    assert list(fsm.states) == [0, 1, 2, 4]
+    assert fsm.states[1].visit_count == 2
+    assert _edges(fsm) == [(0, "a", 1), (0, "c", 1), (1, "b", 2), (1, "b", 4)]
+    assert fsm.states[1].next_states == {"b": 4}
+
+    fsm.merge_two_state(2, 4)                           # 默认不合并 end 状态
+    assert 4 in fsm.states
+    fsm.merge_two_state(2, 4, merge_end_states=True)
+    assert _edges(fsm) == [(0, "a", 1), (0, "c", 1), (1, "b", 2)]
+    assert fsm.states[2].is_end and fsm.states[2].visit_count == 2
+
+
+def test_materialize_fold_and_compact():
+    for compact in (False, True):
+        fsm = _pta(compact)
+        engine = MergeEngine(fsm)
+        assert engine.union(1, 3)
+        assert not engine.union(2, 4)
+        assert sorted(engine.successors(3)) == [(1, 2), (1, 4)]
+
+        fsm = engine.materialize(fold=True)
+        assert _edges(fsm) == [(0, "a", 1), (0, "c", 1), (1, "b", 2)]
+        assert fsm.end_states() == [2]
+        assert fsm.lookup(1, "b") == 2
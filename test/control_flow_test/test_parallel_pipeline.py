@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.control_flow_layer.features.control_feature_extraction import ControlFeatureExtraction
+from protocol_infer.control_flow_layer.parallel import session_batches
+from protocol_infer.control_flow_layer.pipeline import ControlFlowPipeline
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.session import SessionKey
+
+
+def _trace(n=3000, n_sessions=40, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, 20, n).astype(np.int32)
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    payload = rng.integers(0, 256, int(lengths.sum()), dtype=np.uint8).tobytes()
+    keys = [SessionKey("10.0.0.1", 40000 + i, "10.0.0.2", 502, "TCP") for i in range(n_sessions)]
+    return ColumnarTrace(np.sort(rng.random(n)), rng.integers(0, n_sessions, n), rng.integers(0, 2, n),
+                         offsets, lengths, payload, keys)
+
+
+def test_session_batches_keep_sessions_whole():
+    starts = np.array([0, 3, 4, 9, 10])
+    assert session_batches(starts, 12, 4) == [(0, 4), (4, 9), (9, 12)]
+    assert session_batches(starts, 12, 100) == [(0, 12)]
+
+
+def test_parallel_matches_serial():
+    trace = _trace()
+    results = []
+    for n_jobs in (1, 2):
+        for fit_mode in ("full", "stream"):
+            pipeline = ControlFlowPipeline(n_clusters=4, fit_mode=fit_mode, chunk_size=500,
+                                           random_state=0, n_jobs=n_jobs)
+            pipeline.featureer = ControlFeatureExtraction(inter_arrival=True, byte_histogram_bins=8)
+            results.append(pipeline.symbolize(trace))
+
+    assert results[:2] == results[2:]
+
+
+def test_stream_mode_extracts_features_per_batch():
+    class Recording(ControlFeatureExtraction):
+        def extract_batch(self, trace, previous=None):
+            sizes.append(len(trace))
+            return super().extract_batch(trace, previous)
+
+    sizes = []
+    trace = _trace()
+    pipeline = ControlFlowPipeline(n_clusters=4, fit_mode="stream", chunk_size=500, random_state=0)
+    pipeline.featureer = Recording(inter_arrival=True)
+    sequences = pipeline.symbolize(trace)
+
+    # 训练与预测各遍历一次, 每批只包含整会话
+    assert sum(sizes) == 2 * len(trace) and max(sizes) < len(trace)
+    assert sum(len(seq) for seq in sequences.values()) == len(trace)
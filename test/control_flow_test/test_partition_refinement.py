@@ -0,0 +1,71 @@
+import sys
+import random
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.algorithm.states_merging.partition_refinement import PartitionRefinementMerger
+from protocol_infer.control_flow_layer.inference.pta_infer import PTAInfer
+
+
+def _sequences():
+    rng = random.Random(3)
+    return {i: [rng.choice("ab") for _ in range(rng.randrange(1, 7))] for i in range(60)}
+
+
+def _partition(block, states):
+    groups = {}
+    for sid in states:
+        groups.setdefault(int(block[sid]), []).append(sid)
+    return sorted(groups.values())
+
+
+def _accepts(fsm, seq):
+    current = fsm.start_state
+    for symbol in seq:
+        current = fsm.lookup(current, symbol)
+        if current is None:
+            return False
+    return fsm.states[current].is_end
+
+
+def test_valmari_matches_moore_fixpoint():
+    fsm = PTAInfer(compact=True).infer(_sequences())
+    merger = PartitionRefinementMerger()
+    n = fsm._next_state_id
+    src, dst, sym = fsm.transition_columns()
+    is_end = np.zeros(n, dtype=np.int64)
+    is_end[fsm.end_states()] = 1
+
+    fast = merger.partition(fsm)
+    moore = merger._moore(n, src, dst, sym, is_end)
+    assert _partition(fast, range(n)) == _partition(moore, range(n))
+
+
+def test_minimized_fsm_is_deterministic_and_accepts_sample():
+    sequences = _sequences()
+    for compact in (False, True):
+        pta = PTAInfer(compact=compact).infer(sequences)
+        n_pta = len(pta.states)
+        fsm = PartitionRefinementMerger().merge(pta)
+
+        assert len(fsm.states) < n_pta
+        keys = [(t.src, t.symbol) for t in fsm.transitions]
+        assert len(keys) == len(set(keys))
+        assert all(_accepts(fsm, seq) for seq in sequences.values())
+
+
+def test_k_bounded_is_coarser():
+    fsm = PTAInfer().infer(_sequences())
+    full = PartitionRefinementMerger().partition(fsm)
+    bounded = PartitionRefinementMerger(k=1).partition(fsm)
+    assert len(np.unique(bounded)) <= len(np.unique(full))
+    # k 轮细化得到的划分比最终划分粗: 同一最终块内的状态一定在同一 k 块内
+    for sid in fsm.states:
+        same = [o for o in fsm.states if full[o] == full[sid]]
+        assert len({int(bounded[o]) for o in same}) == 1
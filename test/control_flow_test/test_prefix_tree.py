@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.core.model.compact_fsm import CompactFSM
+
+
+SEQUENCES = [["a", "b"], ["a"], ["a", "b"], ["c"], [], ["a", "b", "c"]]
+
+
+def _incremental(sequences):
+    # 逐符号插入的参照实现
+    fsm = CompactFSM()
+    fsm.new_state(is_start=True)
+    for seq in sequences:
+        current = fsm.start_state
+        fsm.visit(current)
+        for symbol in seq:
+            dst = fsm.traverse(current, symbol)
+            if dst is None:
+                dst = fsm.new_state()
+                fsm.add_transition(current, dst, symbol)
+            current = dst
+            fsm.visit(current)
+        fsm.mark_end(current)
+    return fsm
+
+
+def test_prefix_tree_dedup_and_counts():
+    tree = PrefixTree.build(SEQUENCES)
+
+    assert len(tree) == 5
+    assert tree.n_sequences == 5
+    assert list(tree.end_count) == [1, 1, 2, 1, 1]
+    assert tree.visit_counts().tolist() == [6, 4, 3, 1, 1]
+
+
+def test_bulk_pta_matches_incremental_build():
+    expected = _incremental(SEQUENCES)
+    for compact in (False, True):
+        fsm = PrefixTree.build(SEQUENCES).to_fsm(compact=compact)
+
+        assert list(fsm.states) == list(expected.states)
+        assert [(t.src, t.symbol, t.dst) for t in fsm.transitions] == \
+            [(t.src, t.symbol, t.dst) for t in expected.transitions]
+        assert fsm.end_states() == expected.end_states()
+        assert fsm.visit_counts().tolist() == expected.visit_counts().tolist()
+    assert list(fsm.count) == list(expected.count)
+    assert fsm.lookup(1, "b") == 2
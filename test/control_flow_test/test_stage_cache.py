@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.control_flow_layer.pipeline import ControlFlowPipeline
+from protocol_infer.control_flow_layer.stage_cache import StageCache
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.session import SessionKey
+
+
+def _trace(n, n_sessions, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(0, 20, n).astype(np.int32)
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    keys = [SessionKey("10.0.0.1", 40000 + i, "10.0.0.2", 502, "TCP") for i in range(n_sessions)]
+    return ColumnarTrace(np.sort(rng.random(n)), rng.integers(0, n_sessions, n), rng.integers(0, 2, n),
+                         offsets, lengths, bytes(int(lengths.sum())), keys)
+
+
+def _edges(fsm):
+    return sorted(zip(*[col.tolist() for col in fsm.transition_columns()]))
+
+
+def test_changing_k_reuses_upstream_stages():
+    trace = _trace(2000, 30)
+    cache = StageCache()
+    first = ControlFlowPipeline(n_clusters=4, k=2, random_state=0, stage_cache=cache).run(trace)
+    second = ControlFlowPipeline(n_clusters=4, k=3, random_state=0, stage_cache=cache).run(trace)
+    assert cache.hits == {"features": 1, "symbols": 1, "pta": 1}
+
+    # 缓存命中与否不影响结果
+    assert _edges(second) == _edges(ControlFlowPipeline(n_clusters=4, k=3, random_state=0).run(trace))
+    assert _edges(first) == _edges(ControlFlowPipeline(n_clusters=4, k=2, random_state=0).run(trace))
+
+    ControlFlowPipeline(n_clusters=3, k=3, random_state=0, stage_cache=cache).run(trace)
+    assert cache.hits["features"] == 2 and cache.misses["symbols"] == 2
+
+
+def test_sweep_grid_serial_matches_parallel():
+    trace = _trace(2000, 30)
+    pipeline = ControlFlowPipeline(random_state=0)
+    serial = pipeline.sweep(trace, n_clusters=[2, 4], k=[1, 3])
+    assert pipeline.stage_cache is None                 # sweep 不在 pipeline 上留下缓存
+    parallel = ControlFlowPipeline(random_state=0, n_jobs=2).sweep(trace, n_clusters=[2, 4], k=[1, 3])
+
+    assert serial == parallel
+    assert [(p.n_clusters, p.k) for p in serial] == [(2, 1), (2, 3), (4, 1), (4, 3)]
+    assert serial[0].pta_states == serial[1].pta_states
+    assert serial[0].distortion > serial[2].distortion
+
+
+def test_parallel_sweep_fills_configured_cache():
+    trace = _trace(2000, 30)
+    cache = StageCache()
+    ControlFlowPipeline(random_state=0, n_jobs=2, stage_cache=cache).sweep(trace, n_clusters=[2, 4], k=[1])
+    assert {stage for stage, _, _ in cache.items()} == {"features", "symbols", "pta"}
+
+    # 之后的串行 run 命中工作进程写回的条目
+    ControlFlowPipeline(n_clusters=4, k=1, random_state=0, stage_cache=cache).run(trace)
+    assert cache.hits["symbols"] == 1 and cache.hits["pta"] == 1
@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import json
+import numpy as np
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.session import SessionKey
+from protocol_infer.core.model.efsm import EFSM
+from protocol_infer.data_flow_layer.fields import Field, FieldColumns
+from protocol_infer.data_flow_layer.guard_miner import ColumnarEFSMBuilder
+from protocol_infer.data_flow_layer.predicates import FieldDelta, FieldEquals, FieldIn
+
+
+def _modbus(n_sessions=30, n_pairs=4, seed=0):
+    # 请求: 事务号 | 0000 | 0006 | 01 | 01 | 地址 | 000a, 响应: 事务号 | 0000 | 0005 | 01 | 01 | 02 | 2 字节数据
+    rng = np.random.default_rng(seed)
+    payloads, sids, dirs, sequences = [], [], [], {}
+    keys = [SessionKey("10.0.0.1", 40000 + i, "10.0.0.2", 502, "TCP") for i in range(n_sessions)]
+    for s, key in enumerate(keys):
+        tid = int(rng.integers(0, 60000))
+        for _ in range(n_pairs):
+            addr = int(rng.choice([0, 10, 20]))
+            payloads.append(tid.to_bytes(2, "big") + bytes.fromhex("000000060101") + addr.to_bytes(2, "big") + b"\x00\x0a")
+            payloads.append(tid.to_bytes(2, "big") + bytes.fromhex("000000050101") + b"\x02" + rng.bytes(2))
+            sids += [s, s]
+            dirs += [1, 2]
+            tid += 1
+        sequences[key] = ["REQ", "RSP"] * n_pairs
+    lengths = np.array([len(p) for p in payloads], dtype=np.int32)
+    trace = ColumnarTrace(np.arange(len(payloads), dtype=np.float64), np.array(sids), np.array(dirs),
+                          np.r_[0, np.cumsum(lengths)[:-1]], lengths, b"".join(payloads), keys)
+    return trace, sequences
+
+
+def test_mines_counters_and_constant_fields():
+    trace, sequences = _modbus()
+    fsm = PrefixTree.build(list(sequences.values())).to_fsm()
+    efsm = ColumnarEFSMBuilder().build(fsm, trace, sequences)
+
+    tid_field = Field(0, 2)
+    assert efsm.registers == [tid_field.name]
+    second_req, second_rsp = efsm.transitions[2].guard.terms, efsm.transitions[3].guard.terms
+    assert FieldDelta(tid_field, 1) in second_req and FieldDelta(tid_field, 0) in second_rsp
+    assert FieldEquals(Field(5), 6) in second_req and FieldEquals(Field(5), 5) in second_rsp
+    assert any(isinstance(t, FieldIn) and t.field == Field(9) for t in second_req)
+
+    # 训练消息在各自经过的转移上都满足 guard
+    rows = np.concatenate([trace.group_by_session()[k] for k in sequences])
+    first = np.zeros(len(rows), dtype=bool)
+    first[::8] = True
+    columns = FieldColumns.from_trace(trace, rows, 16, first)
+    depth = np.tile(np.arange(8), len(sequences))
+    for tid, tran in enumerate(efsm.transitions):
+        assert tran.guard.evaluate(columns)[depth == tid].all()
+
+
+def test_step_rejects_skipped_counter_and_round_trips():
+    trace, sequences = _modbus(n_sessions=10, n_pairs=2)
+    fsm = PrefixTree.build(list(sequences.values())).to_fsm(compact=True)
+    efsm = ColumnarEFSMBuilder().build(fsm, trace, sequences)
+
+    loaded = EFSM.from_fsm(fsm)
+    loaded.load_guards(json.loads(json.dumps(efsm.export_guards())))
+    assert loaded.export_guards() == efsm.export_guards()
+
+    # 第一条请求的事务号取自训练数据, 之后的请求必须逐次加一
+    tid = int.from_bytes(bytes(trace.payload[:2]), "big")
+    request = bytes.fromhex("000000060101000a000a")
+    sid, regs = loaded.step(loaded.start_state, "REQ", tid.to_bytes(2, "big") + request, {})
+    sid, regs = loaded.step(sid, "RSP", tid.to_bytes(2, "big") + bytes.fromhex("00000005010102abcd"), regs)
+    assert regs == {"u16be@0": tid}
+    assert loaded.step(sid, "REQ", (tid + 2).to_bytes(2, "big") + request, regs) is None
+    assert loaded.step(sid, "REQ", (tid + 1).to_bytes(2, "big") + request, regs) is not None
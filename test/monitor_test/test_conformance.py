@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.core.model.fsm import FSM
+from protocol_infer.monitor.conformance import ConformanceChecker
+from protocol_infer.probabilistic_layer.statistics.transition_prob import TransitionProbTrainer
+
+
+def test_accept_reject_and_deviation():
+    train = [["a", "b", "c"], ["a", "b"], ["a", "d"]]
+    for compact in (False, True):
+        fsm = PrefixTree.build(train).to_fsm(compact=compact)
+        checker = ConformanceChecker(fsm)
+        report = checker.check([["a", "b", "c"], ["a", "x", "c"], ["b"], ["a"], []])
+        assert report.accepted.tolist() == [True, False, False, True, True]
+        assert report.deviation.tolist() == [-1, 1, 0, -1, -1]
+        assert report.final_state[1] == -1 and report.n_messages == 8
+
+        # 要求停在结束状态时, ["a"] 在第 1 个位置之后偏离
+        strict = ConformanceChecker(fsm, require_end=True).check([["a"], ["a", "d"]])
+        assert strict.accepted.tolist() == [False, True]
+        assert strict.deviation.tolist() == [1, -1]
+
+
+def test_log_likelihood_uses_trained_probabilities():
+    train = [["a", "b"], ["a", "b"], ["a", "c"], ["a"]]
+    fsm = PrefixTree.build(train).to_fsm()
+    checker = ConformanceChecker(fsm)
+    assert np.isnan(checker.check([["a", "b"]]).log_likelihood[0])     # 尚未估计概率
+
+    TransitionProbTrainer().fit(fsm, train)
+    report = ConformanceChecker(fsm).check([["a", "b"], ["a"], ["a", "z"]])
+    assert np.allclose(report.log_likelihood[:2], [np.log(2 / 4), np.log(1 / 4)])
+    assert report.log_likelihood[2] == -np.inf
+
+
+def test_random_walks_are_accepted_and_throughput_is_reported():
+    train = [list(s) for s in ["abcab", "abd", "acab", "bbca", "ba"]]
+    fsm = PrefixTree.build(train).to_fsm(compact=True)
+    checker = ConformanceChecker(fsm)
+    flat, lengths = checker.random_walks(1000, 6, seed=0)
+    assert len(flat) == lengths.sum() and lengths.max() <= 6
+    assert checker.check_encoded(flat, lengths).accepted.all()
+    assert checker.throughput(flat, lengths, repeat=1) > 0
+
+
+def test_random_walks_follow_all_nondeterministic_transitions():
+    # s0 --a--> s1 --b--> s2, 以及 s0 --a--> s3 --c--> s4
+    fsm = PrefixTree.build([["a", "b"], ["d", "c"]]).to_fsm()
+    fsm.add_transition(0, 3, "a")
+    checker = ConformanceChecker(fsm)
+    flat, lengths = checker.random_walks(200, 2, seed=0)
+    walks = {tuple(checker.compiled.symbols[i] for i in s.tolist())
+             for s in np.split(flat, np.cumsum(lengths)[:-1])}
+    assert ("a", "c") in walks and ("a", "b") in walks
+    assert checker.check_encoded(flat, lengths).accepted.all()
+
+
+def test_batches_without_any_transition():
+    fsm = PrefixTree.build([["a", "b"]]).to_fsm(compact=True)
+    checker = ConformanceChecker(fsm)
+
+    rejected = checker.check([["a", "x"], ["x"]])
+    assert rejected.accepted.tolist() == [False, False] and rejected.deviation.tolist() == [1, 0]
+    assert rejected.log_likelihood.dtype == np.float64 and np.isneginf(rejected.log_likelihood).all()
+
+    empty = checker.check([[], []])
+    assert empty.accepted.all() and empty.final_state.tolist() == [0, 0]
+    assert np.isnan(empty.log_likelihood).all()                          # 尚未估计概率
+
+    no_start = ConformanceChecker(FSM()).check([["a"], []])
+    assert not no_start.accepted.any() and no_start.deviation.tolist() == [0, 0]
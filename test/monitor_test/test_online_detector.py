@@ -0,0 +1,74 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import contextlib
+import dataclasses
+import io
+import threading
+import time
+from protocol_infer.control_flow_layer.pipeline import ControlFlowPipeline
+from protocol_infer.monitor.online import OnlineDetector
+from protocol_infer.pcap_layer.parser.native_parser import NativePCAPParser
+from protocol_infer.pcap_layer.pipeline import PCAPPipeline
+
+PCAP = project_root / "Data" / "MODBUS" / "FC1-permit.pcap"
+
+
+def _model():
+    pipeline = ControlFlowPipeline(n_clusters=3, random_state=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        fsm = pipeline.run(PCAPPipeline().run(str(PCAP)))
+    return pipeline, fsm
+
+
+def test_follow_reads_a_growing_file(tmp_path):
+    data = PCAP.read_bytes()
+    path = tmp_path / "live.pcap"
+    path.write_bytes(b"")
+
+    def writer():
+        # 故意在记录中间切开, 模拟抓包程序分段写入
+        with open(path, "ab") as f:
+            for i in range(0, len(data), 333):
+                f.write(data[i:i + 333])
+                f.flush()
+                time.sleep(0.002)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    followed = list(NativePCAPParser().follow(str(path), poll_interval=0.001, idle_timeout=0.5))
+    thread.join()
+    assert followed == list(NativePCAPParser().parse(str(PCAP)))
+
+
+def test_detector_replays_training_capture_and_flags_deviation():
+    pipeline, fsm = _model()
+    detector = OnlineDetector.from_pipeline(pipeline, fsm)
+    packets = list(NativePCAPParser().parse(str(PCAP)))
+
+    assert list(detector.process(packets)) == []
+    assert detector.n_messages == len(packets) and detector.latency.count[0] == len(packets)
+
+    # 同一个响应重复发送一次: 模型中响应之后不会紧跟另一个响应
+    replayed = packets[:5] + [packets[4]] + packets[5:]
+    events = list(OnlineDetector.from_pipeline(pipeline, fsm, batch_size=4).process(replayed))
+    assert [(e.index, e.kind) for e in events] == [(5, "no_transition")]
+    assert events[0].latency > 0 and events[0].session_key.port2 == 502
+
+
+def test_flow_table_is_bounded():
+    pipeline, fsm = _model()
+    packets = list(NativePCAPParser().parse(str(PCAP)))
+    other = [dataclasses.replace(p, src_port=p.src_port + 1) if p.src_port != 502
+             else dataclasses.replace(p, dst_port=p.dst_port + 1) for p in packets]
+    interleaved = [p for pair in zip(packets, other) for p in pair]
+
+    detector = OnlineDetector.from_pipeline(pipeline, fsm, max_flows=1)
+    list(detector.process(interleaved))
+    assert len(detector.flows) == 1 and detector.n_evicted == len(interleaved) - 1
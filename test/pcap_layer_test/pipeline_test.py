@@ -15,6 +15,7 @@ sys.path.insert(0, str(project_root / "protocol_infer"))
 # Also add project root for other absolute imports if needed
 sys.path.insert(0, str(project_root))
 
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
 from protocol_infer.pcap_layer.pipeline import PCAPPipeline
 
 
@@ -30,5 +31,19 @@ def test_pcap_to_trace():
         print(f"[{i}] {event.session_key} len={len(event.payload)}")
 
 
+def test_run_many_matches_per_file_runs():
+    pipeline = PCAPPipeline()
+    directory = project_root / "Data" / "MODBUS"
+
+    # 约定: 与逐个 run() 后按文件顺序拼接、再稳定排序的结果一致
+    files = PCAPPipeline.collect_files(str(directory))
+    expected = ColumnarTrace.concat([pipeline.run(path) for path in files]).sort_by_time()
+    assert len(expected) > 0
+
+    for n_workers in (1, 2):
+        assert pipeline.run_many(str(directory), n_workers=n_workers).events == expected.events
+    assert PCAPPipeline(columnar=False).run_many(str(directory), n_workers=2).events == expected.events
+
+
 if __name__ == "__main__":
     test_pcap_to_trace()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import pickle
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.core.datamodel.columnar_trace import ColumnarTrace
+from protocol_infer.core.datamodel.event import Direction, MessageEvent
+from protocol_infer.core.datamodel.session import SessionKey
+
+
+SK1 = SessionKey("1.1.1.1", 1000, "2.2.2.2", 502, "TCP")
+SK2 = SessionKey("3.3.3.3", 2000, "2.2.2.2", 502, "TCP")
+
+
+def _events():
+    return [
+        MessageEvent(SK2, 3.0, b"ccc", Direction.S2C),
+        MessageEvent(SK1, 1.0, b"a", Direction.C2S),
+        MessageEvent(SK2, 2.0, b"", Direction.C2S),
+        MessageEvent(SK1, 1.0, b"bb", Direction.S2C),
+    ]
+
+
+def test_roundtrip_sort_and_group():
+    events = _events()
+    trace = ColumnarTrace.from_events(events)
+
+    assert trace.events == events
+    assert bytes(trace.payload_of(0)) == b"ccc"
+    assert all(type(ev.payload) is bytes for ev in trace.to_trace().events)
+
+    ordered = trace.sort_by_time()
+    assert ordered.events == sorted(events, key=lambda e: e.timestamp)
+
+    groups = ordered.group_by_session()
+    assert list(groups) == [SK1, SK2]
+    assert [bytes(ordered.payload_of(i)) for i in groups[SK1]] == [b"a", b"bb"]
+    assert [bytes(ordered.payload_of(i)) for i in groups[SK2]] == [b"", b"ccc"]
+
+
+def test_concat_and_pickle():
+    a = ColumnarTrace.from_events(_events()[:2])
+    b = ColumnarTrace.from_events(_events()[2:])
+    merged = ColumnarTrace.concat([a, b])
+
+    assert merged.events == _events()
+    assert merged.session_keys == [SK2, SK1]
+
+    restored = pickle.loads(pickle.dumps(merged.sort_by_time()))
+    assert restored.events == merged.sort_by_time().events
+
+
+def test_leading_bytes_in_chunks():
+    trace = ColumnarTrace.from_events(_events())
+    expected = [[99, 99], [97, -1], [-1, -1], [98, 98]]
+    assert trace.leading(2).tolist() == expected
+    # 每块只放得下一行
+    assert trace.leading(2, max_chunk_bytes=1).tolist() == expected
+    assert trace.leading(2, rows=[3, 0], max_chunk_bytes=3).tolist() == [expected[3], expected[0]]
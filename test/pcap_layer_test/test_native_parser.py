@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.pcap_layer.parser.native_parser import NativePCAPParser
+from protocol_infer.pcap_layer.parser.scapy_parser import ScapyParser
+
+
+MODBUS_DIR = project_root / "Data" / "MODBUS"
+
+
+def _key(pkt):
+    return (pkt.src_ip, pkt.src_port, pkt.dst_ip, pkt.dst_port, pkt.protocol)
+
+
+def test_native_matches_scapy_on_modbus():
+    for path in sorted(MODBUS_DIR.glob("*.pcap")):
+        expected = list(ScapyParser().parse(str(path)))
+        actual = list(NativePCAPParser().parse(str(path)))
+
+        assert len(actual) == len(expected), path.name
+        for e, a in zip(expected, actual):
+            assert _key(a) == _key(e)
+            assert abs(a.timestamp - e.timestamp) < 1e-6
+            # scapy 会把以太网填充计入负载, 原生解析器按 IP 长度裁剪
+            assert e.payload.startswith(a.payload)
+
+
+def test_native_reads_pcapng():
+    path = project_root / "Data" / "HART_IP" / "hart_ip.pcap"
+    packets = list(NativePCAPParser().parse(str(path)))
+
+    assert len(packets) > 0
+    assert all(p.protocol in ("TCP", "UDP") for p in packets)
+    assert all(p.timestamp > 0 for p in packets)
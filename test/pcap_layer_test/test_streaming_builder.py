@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.core.datamodel.event import Direction
+from protocol_infer.core.datamodel.raw_packet import Rawpacket, TCP_ACK, TCP_FIN, TCP_RST, TCP_SYN
+from protocol_infer.pcap_layer.session.streaming_builder import StreamingFiveTupleBuilder
+from protocol_infer.pcap_layer.session.tuple5_builder import FiveTupleBuilder
+from protocol_infer.pcap_layer.segmentation.packet_level import PacketLevelSegmenter
+
+
+def _pkt(ts, sport, dport, flags=TCP_ACK, payload=b"x", src="10.0.0.1", dst="10.0.0.2"):
+    return Rawpacket(
+        timestamp=ts, src_ip=src, dst_ip=dst,
+        src_port=sport, dst_port=dport, protocol="TCP",
+        payload=payload, tcp_flags=flags
+    )
+
+
+def test_fin_and_rst_close_sessions():
+    packets = [
+        _pkt(0.0, 1000, 502),
+        _pkt(1.0, 1000, 502, flags=TCP_FIN | TCP_ACK, payload=b""),
+        _pkt(1.1, 1000, 502, payload=b""),      # 关闭后的残余 ACK
+        _pkt(2.0, 2000, 502),
+        _pkt(3.0, 2000, 502, flags=TCP_RST, payload=b""),
+    ]
+
+    sessions = list(StreamingFiveTupleBuilder().build(iter(packets)))
+
+    assert [s.key.port1 for s in sessions] == [1000, 2000]
+    assert [len(s.packets) for s in sessions] == [2, 2]
+
+
+def test_idle_timeout_and_lru_eviction():
+    builder = StreamingFiveTupleBuilder(idle_timeout=10.0, max_flows=2)
+    packets = [
+        _pkt(0.0, 1000, 502),
+        _pkt(1.0, 2000, 502),
+        _pkt(2.0, 3000, 502),       # 超过 max_flows, 1000 被淘汰
+        _pkt(20.0, 2000, 502),      # 2000 / 3000 均已超时, 2000 重新开始
+    ]
+
+    sessions = list(builder.build(iter(packets)))
+
+    assert [s.key.port1 for s in sessions] == [1000, 2000, 3000, 2000]
+    assert [s.packets[0].timestamp for s in sessions] == [0.0, 1.0, 2.0, 20.0]
+
+
+def test_bidirectional_session_and_direction():
+    packets = [
+        # 服务端先被抓到, 但 SYN 确定了客户端
+        _pkt(0.0, 502, 40000, flags=TCP_SYN | TCP_ACK, payload=b"", src="10.0.0.2", dst="10.0.0.1"),
+        _pkt(0.1, 40000, 502, src="10.0.0.1", dst="10.0.0.2"),
+        _pkt(0.2, 502, 40000, src="10.0.0.2", dst="10.0.0.1"),
+    ]
+
+    sessions = FiveTupleBuilder().build(packets)
+    assert len(sessions) == 1
+    key = sessions[0].key
+    assert (key.ip1, key.port1, key.ip2, key.port2) == ("10.0.0.1", 40000, "10.0.0.2", 502)
+
+    events = PacketLevelSegmenter().segment(sessions[0])
+    assert [e.direction for e in events] == [Direction.S2C, Direction.C2S, Direction.S2C]
@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+from protocol_infer.core.datamodel.event import Direction
+from protocol_infer.core.datamodel.raw_packet import Rawpacket, TCP_ACK, TCP_SYN
+from protocol_infer.core.datamodel.session import Session, SessionKey
+from protocol_infer.pcap_layer.segmentation.framers import modbus_tcp_framer
+from protocol_infer.pcap_layer.segmentation.tcp_reassembly import TCPReassemblySegmenter
+
+
+KEY = SessionKey("10.0.0.1", 40000, "10.0.0.2", 502, "TCP")
+
+
+def _c2s(ts, seq, payload=b"", flags=TCP_ACK):
+    return Rawpacket(ts, "10.0.0.1", "10.0.0.2", 40000, 502, "TCP", payload, flags, seq)
+
+
+def _s2c(ts, seq, payload=b"", flags=TCP_ACK):
+    return Rawpacket(ts, "10.0.0.2", "10.0.0.1", 502, 40000, "TCP", payload, flags, seq)
+
+
+def _mbap(tid, pdu):
+    return tid.to_bytes(2, "big") + b"\x00\x00" + (len(pdu) + 1).to_bytes(2, "big") + b"\x01" + pdu
+
+
+def test_reassembly_with_framer():
+    req1 = _mbap(1, b"\x03\x00\x00\x00\x01")
+    req2 = _mbap(2, b"\x03\x00\x01\x00\x01")
+    resp = _mbap(1, b"\x03\x02\x00\x2a")
+
+    packets = [
+        _c2s(0.0, 99, flags=TCP_SYN),
+        _s2c(0.1, 499, flags=TCP_SYN | TCP_ACK),
+        _c2s(1.0, 100 + 5, req1[5:]),           # 乱序到达
+        _c2s(1.1, 100, req1[:5]),
+        _c2s(1.2, 100, req1[:5]),               # 重传
+        _s2c(1.3, 500),                         # 纯 ACK
+        _s2c(1.4, 500, resp),
+        _c2s(2.0, 100 + len(req1), req2 + req1),  # 一个报文两条消息
+    ]
+
+    events = TCPReassemblySegmenter(modbus_tcp_framer()).segment(Session(KEY, packets))
+
+    assert [e.payload for e in events] == [req1, resp, req2, req1]
+    assert [e.direction for e in events] == [Direction.C2S, Direction.S2C, Direction.C2S, Direction.C2S]
+    assert events[0].timestamp == 1.1          # 消息首字节所在报文的时间
+
+
+def test_reassembly_without_framer_splits_on_turns():
+    packets = [
+        _c2s(0.0, 1, b"GET "),
+        _c2s(0.1, 5, b"/ HTTP/1.0\r\n\r\n"),
+        _s2c(0.2, 1, b"HTTP/1.0 200 OK\r\n\r\n"),
+    ]
+
+    events = TCPReassemblySegmenter().segment(Session(KEY, packets))
+
+    assert [e.payload for e in events] == [b"GET / HTTP/1.0\r\n\r\n", b"HTTP/1.0 200 OK\r\n\r\n"]
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import os
+import time
+from protocol_infer.pcap_layer.cache import TraceCache
+from protocol_infer.pcap_layer.pipeline import PCAPPipeline
+from protocol_infer.pcap_layer.session.tuple5_builder import FiveTupleBuilder
+
+
+PCAP = str(project_root / "Data" / "MODBUS" / "FC1-permit.pcap")
+
+
+class _CountingPipeline(PCAPPipeline):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._runs = 0
+
+    def run(self, pcap_path):
+        self._runs += 1
+        return super().run(pcap_path)
+
+
+def test_cache_hit_skips_parsing(tmp_path):
+    cache = TraceCache(str(tmp_path))
+    expected = list(PCAPPipeline().run(PCAP))
+
+    first = _CountingPipeline()
+    assert list(cache.load_or_parse(PCAP, first)) == expected
+    second = _CountingPipeline()
+    assert list(cache.load_or_parse(PCAP, second)) == expected
+    assert (first._runs, second._runs) == (1, 0)
+
+    # 配置不同 -> 键不同
+    other = PCAPPipeline(session_builder=FiveTupleBuilder(bidirectional=False))
+    assert cache.key(PCAP, other) != cache.key(PCAP, PCAPPipeline())
+
+
+def test_eviction_by_size_and_age(tmp_path):
+    cache = TraceCache(str(tmp_path))
+    trace = PCAPPipeline().run(PCAP)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, trace)
+        os.utime(tmp_path / key, (time.time() - 100 + i, time.time() - 100 + i))
+
+    cache.get("a")                                  # 访问后成为最新的条目
+    size = cache.entries()[0][1]
+    cache.max_bytes = 2 * size
+    assert cache.evict() == ["b"]
+
+    cache.max_bytes, cache.max_age = None, 50
+    assert cache.evict() == ["c"]
+    assert [key for key, _, _ in cache.entries()] == ["a"]
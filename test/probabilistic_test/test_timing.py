@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.probabilistic_layer.timing.delay_stats import DelayTable, LogBins
+from protocol_infer.probabilistic_layer.timing.timing_trainer import TimingTrainer
+
+
+def test_streaming_moments_and_merge():
+    rng = np.random.default_rng(0)
+    tids = rng.integers(0, 3, 5000)
+    delays = rng.lognormal(mean=-3, sigma=1, size=5000)
+
+    table, other = DelayTable(3), DelayTable(3)
+    for part in np.array_split(np.arange(3000), 7):
+        table.update(tids[part], delays[part])
+    other.update(tids[3000:], delays[3000:])
+    table.merge(other)
+
+    for t in range(3):
+        v = delays[tids == t]
+        assert table.count[t] == len(v)
+        assert np.isclose(table.mean[t], v.mean()) and np.isclose(table.variance[t], v.var())
+        assert table.min[t] == v.min() and table.max[t] == v.max()
+
+        # 分位数误差不超过一个对数箱 (10 ** 0.1)
+        est = table.quantiles([0.5, 0.9])[t]
+        ratio = est / np.quantile(v, [0.5, 0.9])
+        assert np.all((ratio > 10 ** -0.1) & (ratio < 10 ** 0.1))
+
+
+def test_log_bins_cover_range():
+    bins = LogBins(min_delay=1e-3, max_delay=1e3, bins_per_decade=2)
+    assert bins.n_bins == 14
+    assert bins.index(np.array([0.0, 1e-3, 1.0, 1e3, 1e9])).tolist() == [0, 1, 7, 13, 13]
+
+
+def test_trainer_skips_first_message_and_rejected_sequences():
+    sequences = [["a", "b"], ["a", "b"], ["a", "x"]]
+    timestamps = [[0.0, 0.5], [10.0, 11.5], [0.0, 2.0]]
+    for compact in (False, True):
+        fsm = PrefixTree.build(sequences[:2]).to_fsm(compact=compact)
+        trainer = TimingTrainer()
+        trainer.partial_fit(fsm, sequences, timestamps)
+        trainer.apply(fsm)
+
+        timing = {t.symbol: t.timing for t in fsm.transitions}
+        assert timing["a"] is None                      # 会话的第一条消息
+        assert timing["b"].count == 2 and np.isclose(timing["b"].mean, 1.0)
+        assert np.isclose(timing["b"].variance, 0.25)
+        assert trainer.n_rejected == 1
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+current_file = Path(__file__).resolve()
+
+project_root = current_file.parent.parent.parent
+
+sys.path.insert(0, str(project_root / "protocol_infer"))
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+from protocol_infer.control_flow_layer.inference.prefix_tree import PrefixTree
+from protocol_infer.core.model.compiled import CompiledFSM
+from protocol_infer.probabilistic_layer.statistics.transition_prob import TransitionProbTrainer
+
+
+SEQUENCES = [["a", "b"], ["a", "b"], ["a"], ["c"]]
+
+
+def test_replay_marks_rejected_sequences():
+    fsm = PrefixTree.build(SEQUENCES).to_fsm(compact=True)
+    compiled = CompiledFSM(fsm)
+    flat, lengths = compiled.encode([["a", "b"], ["a", "x", "b"], [], ["c", "c"]])
+    path, final = compiled.replay(flat, lengths)
+
+    assert final.tolist() == [compiled.index[fsm.lookup(fsm.lookup(0, "a"), "b")], -1, compiled.start, -1]
+    # 被拒绝的序列不保留部分路径
+    assert path.tolist()[:3] == [0, 1, -1] and path.tolist()[3:5] == [-1, -1]
+
+
+def test_probabilities_and_accumulation():
+    for compact in (False, True):
+        fsm = PrefixTree.build(SEQUENCES).to_fsm(compact=compact)
+        trainer = TransitionProbTrainer(batch_size=2)
+        trainer.partial_fit(fsm, SEQUENCES[:2])
+        trainer.partial_fit(fsm, iter(SEQUENCES[2:] + [["z"]]))
+        trainer.apply(fsm)
+
+        assert (trainer.n_sequences, trainer.n_rejected) == (5, 1)
+        a = fsm.lookup(0, "a")
+        probs = {t.symbol: t.prob for t in fsm.transitions if t.src == 0}
+        assert probs == {"a": 0.75, "c": 0.25}
+        assert fsm.states[0].end_prob == 0.0
+        assert abs(fsm.states[a].end_prob - 1 / 3) < 1e-12
+
+        # 加法平滑: 出边 + 结束 共 3 个结果
+        TransitionProbTrainer(alpha=1.0).fit(fsm, SEQUENCES)
+        probs = {t.symbol: t.prob for t in fsm.transitions if t.src == 0}
+        assert np.isclose(probs["a"], 4 / 7) and np.isclose(fsm.states[0].end_prob, 1 / 7)
+
+
+def test_replay_simulates_nondeterministic_fsm():
+    # s0 --a--> s1 --b--> s2, 以及 s0 --a--> s3 --c--> s4
+    fsm = PrefixTree.build([["a", "b"], ["d", "c"]]).to_fsm()
+    fsm.add_transition(0, 3, "a")
+    compiled = CompiledFSM(fsm)
+    assert not compiled.deterministic
+
+    path, final, depth = compiled.replay(*compiled.encode([["a", "c"], ["a", "b"], ["a", "d"], ["a", "c", "x"]]),
+                                         return_depth=True)
+    assert final.tolist() == [compiled.index[4], compiled.index[2], -1, -1]
+    assert path.tolist()[:4] == [4, 3, 0, 1]
+    # 前沿 {s1, s3} 上没有 d 的转移; 第三条在 x 处偏离
+    assert depth.tolist() == [2, 2, 1, 2]